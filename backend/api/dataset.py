@@ -2,25 +2,49 @@
 # -*- coding: utf-8 -*-
 
 import os
-import uuid
+import copy
 import logging
-import yaml
 import json
 import time
 import shutil
+import zipfile
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Union
+from functools import partial
+from typing import Dict, Any, List, Optional, Tuple, Union
 from pathlib import Path
 
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Query, Response, Header
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, RedirectResponse
 from pydantic import BaseModel, Field, validator
-import aiofiles
 
-from backend.models.database import get_db, Job, File as DBFile
-from backend.models.schemas import JobCreate, JobResponse, JobStatus, FileResponse, StandardResponse
-from backend.services.job_service import create_job, get_job, get_all_jobs, add_file_to_job
-from backend.utils.file_utils import save_upload_file, get_file_path
+from backend.config.settings import settings as app_settings
+from backend.models.database import get_db, get_db_session, Job, File as DBFile
+from backend.models.schemas import JobCreate, JobResponse, JobStatus, StandardResponse, DatasetJobListResponse, ShotListResponse
+from backend.services.job_service import create_job, get_job, get_all_jobs, add_file_to_job, get_dataset_jobs_page
+from backend.utils.file_utils import get_file_path, UploadTooLargeError
+from backend.services.admission import get_admission_controller, admit_job
+from backend.services.job_events import job_event_response
+from backend.services.shot_service import query_shots, get_shot_image_source, resolve_shot_job_id
+from backend.services.dataset_export import iter_subset_archive, iter_partial_archive
+from backend.services.blob_store import get_blob_store
+from backend.services.object_storage import get_storage_backend, StorageError, BACKEND_LOCAL
+from backend.services.thumbnails import get_thumbnail_service, ThumbnailUnavailableError, THUMBNAIL_MEDIA_TYPE
+from backend.utils.async_db import run_db, run_in_session
+from backend.utils.async_fs import run_fs, path_exists, stat_file
+from backend.utils.pagination import InvalidCursorError
+from backend.utils.streaming import STREAM_PAGE_SIZE, iter_keyset_rows, ndjson_response
+from backend.utils.ttl_cache import TTLCache
+from backend.utils.settings_cache import CachedYamlFile
+from backend.services.result_cache import canonicalize_params
+from backend.utils.http_range import (
+    FileRangeResponse,
+    RangeNotSatisfiableError,
+    parse_range_header,
+    etag_matches,
+    if_range_matches,
+    make_etag,
+    http_date
+)
 import backend.job_processor as job_processor
 
 from backend.job_processor import (
@@ -28,7 +52,9 @@ from backend.job_processor import (
     get_job_status, 
     cancel_job, 
     JOB_STATUSES,
-    DATASET_DIR
+    DATASET_DIR,
+    get_result_file_hash,
+    get_result_storage_key
 )
 
 # ロギング設定
@@ -45,6 +71,19 @@ logger = logging.getLogger("dataset_api")
 # デフォルト設定ファイルパス
 DEFAULT_SETTINGS_PATH = "backend/dataset_setting_default.yaml"
 
+# 1ショットあたりの推定処理時間（秒、補正前）
+SECONDS_PER_SHOT = 0.5
+
+# データセットジョブ一覧のキャッシュ
+_dataset_job_list_cache = TTLCache(app_settings.DATASET_JOB_LIST_CACHE_SECONDS)
+
+# デフォルト設定ファイル（更新時刻が変わったときだけ読み直す）
+_default_settings_file = CachedYamlFile(DEFAULT_SETTINGS_PATH)
+
+# 検証済みパラメータと推定値の記憶（キーに設定ファイルの版を含むため、期限は上限数の管理のため）
+_dataset_params_cache = TTLCache(3600, max_entries=256)
+_dataset_estimate_cache = TTLCache(3600, max_entries=256)
+
 # ルーター作成
 router = APIRouter(
     prefix="/dataset",
@@ -133,10 +172,17 @@ class DatasetParams(BaseModel):
         
         return angle_count * len(expressions) * len(lighting) * len(distances)
     
+    def estimated_seconds(self, calibrated: bool = True) -> float:
+        """推定処理時間（秒）"""
+        seconds = self.calculate_total_shots() * SECONDS_PER_SHOT
+        if calibrated:
+            # 実測の処理時間に基づいて補正
+            seconds = get_admission_controller().calibrate(seconds)
+        return seconds
+    
     def estimated_time(self) -> float:
         """推定処理時間（分）"""
-        shots = self.calculate_total_shots()
-        return round(shots * 0.5 / 60, 1)  # 1ショット0.5秒と仮定
+        return round(self.estimated_seconds() / 60, 1)
     
     def estimated_size_mb(self) -> float:
         """推定サイズ（MB）"""
@@ -154,18 +200,9 @@ class DatasetParams(BaseModel):
 
 # デフォルト設定の読み込み
 def load_default_settings() -> Dict[str, Any]:
-    """デフォルト設定ファイルの読み込み"""
-    try:
-        if os.path.exists(DEFAULT_SETTINGS_PATH):
-            with open(DEFAULT_SETTINGS_PATH, 'r', encoding='utf-8') as f:
-                settings = yaml.safe_load(f)
-                return settings
-        else:
-            logger.warning(f"デフォルト設定ファイルが見つかりません: {DEFAULT_SETTINGS_PATH}")
-            return {}
-    except Exception as e:
-        logger.error(f"デフォルト設定の読み込みエラー: {str(e)}")
-        return {}
+    """デフォルト設定ファイルの読み込み（ファイルが更新された場合だけ読み直す）"""
+    default_settings, _ = _default_settings_file.load()
+    return copy.deepcopy(default_settings)
 
 # 設定のマージ
 def merge_settings(user_settings: Dict[str, Any], default_settings: Dict[str, Any]) -> Dict[str, Any]:
@@ -183,6 +220,176 @@ def merge_settings(user_settings: Dict[str, Any], default_settings: Dict[str, An
     
     return result
 
+# 推定値の計算（同じ設定の結果は再利用する）
+def estimate_dataset(params: DatasetParams) -> Dict[str, Any]:
+    """データセットのショット数・推定サイズ・推定処理時間を計算する
+
+    ショット数・サイズ・補正前の処理時間は設定を正規化したキーで記憶し、
+    実測に基づく補正（推定処理時間）だけを毎回適用する。
+
+    Args:
+        params: データセットパラメータ
+
+    Returns:
+        total_shots, estimated_size_mb, raw_estimated_seconds, estimated_time_minutes を含む辞書
+    """
+    def _compute() -> Dict[str, Any]:
+        return {
+            "total_shots": params.calculate_total_shots(),
+            "estimated_size_mb": params.estimated_size_mb(),
+            "raw_estimated_seconds": params.estimated_seconds(calibrated=False)
+        }
+
+    estimate = dict(_dataset_estimate_cache.get_or_load(canonicalize_params(params.dict()), _compute))
+    calibrated_seconds = get_admission_controller().calibrate(estimate["raw_estimated_seconds"])
+    estimate["estimated_time_minutes"] = round(calibrated_seconds / 60, 1)
+    return estimate
+
+def resolve_dataset_params(user_params: Dict[str, Any], use_minimal: Optional[bool]) -> Tuple[Dict[str, Any], DatasetParams]:
+    """ユーザー設定をデフォルト設定とマージして検証する（同じ入力の結果は再利用する）
+
+    キーはユーザー設定を正規化したJSONとデフォルト設定ファイルの版で、
+    設定ファイルが更新されると新しい内容でマージし直す。
+
+    Args:
+        user_params: ユーザーが指定したパラメータ
+        use_minimal: 最小構成を使用するか
+
+    Returns:
+        (検証済みのジョブパラメータ, データセットパラメータ) のタプル。ジョブパラメータは呼び出しごとの複製
+
+    Raises:
+        ValidationError: パラメータが不正な場合（結果は記憶しない）
+    """
+    default_settings, version = _default_settings_file.load()
+
+    def _resolve() -> Tuple[Dict[str, Any], DatasetParams]:
+        job_params = merge_settings(user_params, default_settings)
+        job_params['use_minimal'] = use_minimal
+        dataset_params = DatasetParams(**job_params)
+        return dataset_params.dict(), dataset_params
+
+    key = (canonicalize_params(user_params), use_minimal, version)
+    job_params, dataset_params = _dataset_params_cache.get_or_load(key, _resolve)
+    return copy.deepcopy(job_params), dataset_params
+
+# データセット生成ジョブの準備（パラメータの解析・検証と受付制御）
+def prepare_dataset_job(params: Optional[str], use_minimal: Optional[bool],
+                        reserve: bool = True) -> Tuple[Dict[str, Any], DatasetParams, float, Optional[str]]:
+    """データセット生成ジョブのパラメータを解析・検証し、受付制御を行う
+
+    アップロードを受け取る前に呼び出し、混雑時はファイルを読み込まずに429を返す。
+    reserve=True の場合は受付と同時に仮の枠を確保する。呼び出し元は enqueue_dataset_job に
+    トークンを渡し、最後に必ず get_admission_controller().release(トークン) を呼ぶこと。
+
+    Args:
+        params: JSON形式のパラメータ（省略可）
+        use_minimal: 最小構成を使用するか
+        reserve: 仮の枠を確保する場合はTrue（判定だけの場合はFalse）
+
+    Returns:
+        (検証済みのジョブパラメータ, データセットパラメータ, 補正前の推定処理時間（秒）, 仮の枠のトークン) のタプル
+
+    Raises:
+        HTTPException: パラメータが不正な場合（400）、混雑している場合（429）
+    """
+    # パラメータの解析
+    job_params = {}
+    use_minimal_param = use_minimal
+    
+    if params:
+        try:
+            user_params = json.loads(params)
+            # use_minimalパラメータを更新
+            if 'use_minimal' in user_params:
+                use_minimal_param = user_params['use_minimal']
+            job_params = user_params
+        except json.JSONDecodeError:
+            logger.error(f"パラメータのJSON解析エラー: {params}")
+            raise HTTPException(status_code=400, detail="パラメータの形式が無効です")
+    
+    # デフォルト設定とのマージとパラメータの検証
+    try:
+        job_params, dataset_params = resolve_dataset_params(job_params, use_minimal_param)
+    except Exception as e:
+        logger.error(f"パラメータ検証エラー: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"パラメータが無効です: {str(e)}")
+    
+    # 受付制御（アップロードを読み込む前に混雑時は429を返す）
+    raw_estimated_seconds = estimate_dataset(dataset_params)["raw_estimated_seconds"]
+    admission_token = admit_job(raw_estimated_seconds, reserve=reserve)
+    
+    return job_params, dataset_params, raw_estimated_seconds, admission_token
+
+# 保存済みのVRMファイルからデータセット生成ジョブを作成
+async def enqueue_dataset_job(file_path: str, filename: str, content_hash: str, job_params: Dict[str, Any],
+                              dataset_params: DatasetParams, raw_estimated_seconds: float,
+                              admission_token: Optional[str] = None) -> Dict[str, Any]:
+    """保存済みのVRMファイルでデータセット生成ジョブをキューに追加する
+
+    Args:
+        file_path: 保存済みのVRMファイルのパス
+        filename: クライアントが指定したファイル名
+        content_hash: VRMファイルのSHA-256ハッシュ
+        job_params: 検証済みのジョブパラメータ
+        dataset_params: データセットパラメータ
+        raw_estimated_seconds: 補正前の推定処理時間（秒）
+        admission_token: prepare_dataset_job で確保した仮の枠（ジョブを処理する場合に付け替える）
+
+    Returns:
+        ジョブ作成結果のレスポンス
+
+    Raises:
+        HTTPException: ジョブの追加に失敗した場合
+    """
+    # 合計ショット数とデータサイズの計算
+    estimate = estimate_dataset(dataset_params)
+    total_shots = estimate["total_shots"]
+    estimated_size = estimate["estimated_size_mb"]
+    estimated_time = estimate["estimated_time_minutes"]
+    
+    logger.info(f"データセット生成ジョブ作成: ファイル: {filename}, " +
+                 f"ショット数: {total_shots}, 推定サイズ: {estimated_size}MB, 推定時間: {estimated_time}分")
+    
+    # ジョブをキューに追加（同一VRM・同一設定のジョブがあれば結果を再利用）
+    try:
+        job_id = await run_db(
+            add_job,
+            "dataset", 
+            file_path, 
+            job_params,
+            content_hash=content_hash,
+            estimated_seconds=raw_estimated_seconds,
+            admission_token=admission_token
+        )
+    except Exception as e:
+        logger.error(f"ジョブの追加に失敗しました: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"ジョブの追加に失敗しました: {str(e)}")
+    
+    # 投入したジョブがすぐ一覧に表示されるようにする
+    _dataset_job_list_cache.clear()
+    
+    job_info = await run_db(get_job_status, job_id)
+    job_status = job_info.get("status", JOB_STATUSES["QUEUED"])
+    if job_status == JOB_STATUSES["COMPLETED"]:
+        message = "同一条件の既存データセットを再利用しました"
+    elif job_info.get("source_job_id"):
+        message = "同一条件の実行中ジョブに合流しました"
+    else:
+        message = "データセット生成ジョブがキューに追加されました"
+    
+    # レスポンス
+    return {
+        "job_id": job_id,
+        "filename": filename,
+        "status": job_status,
+        "source_job_id": job_info.get("source_job_id"),
+        "message": message,
+        "total_shots": total_shots,
+        "estimated_size_mb": estimated_size,
+        "estimated_time_minutes": estimated_time
+    }
+
 # データセット生成ジョブのキュー追加
 @router.post("/generate", status_code=202)
 async def generate_dataset(
@@ -203,84 +410,24 @@ async def generate_dataset(
         if not file.filename or not file.filename.lower().endswith('.vrm'):
             raise HTTPException(status_code=400, detail="VRM形式のファイルを選択してください")
         
-        # ファイルサイズのチェック（最大50MB）
-        content = await file.read()
-        await file.seek(0)  # ファイルポインタをリセット
-        
-        if len(content) > 50 * 1024 * 1024:  # 50MB
-            raise HTTPException(status_code=400, detail="ファイルサイズは50MB以下にしてください")
-        
-        # ジョブIDの生成
-        job_id = str(uuid.uuid4())
+        # パラメータの解析・検証と受付制御（受け付けた場合はアップロード中も枠を確保しておく）
+        job_params, dataset_params, raw_estimated_seconds, admission_token = prepare_dataset_job(params, use_minimal)
         
-        # アップロードディレクトリ確認
-        upload_dir = os.path.join("storage", "uploads")
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # ファイル保存
-        file_path = os.path.join(upload_dir, f"{job_id}_{file.filename}")
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            await out_file.write(content)
-        
-        # パラメータの解析
-        job_params = {}
-        use_minimal_param = use_minimal
-        
-        if params:
-            try:
-                user_params = json.loads(params)
-                # use_minimalパラメータを更新
-                if 'use_minimal' in user_params:
-                    use_minimal_param = user_params['use_minimal']
-                job_params = user_params
-            except json.JSONDecodeError:
-                logger.error(f"パラメータのJSON解析エラー: {params}")
-                raise HTTPException(status_code=400, detail="パラメータの形式が無効です")
-        
-        # デフォルト設定の読み込みとマージ
-        default_settings = load_default_settings()
-        job_params = merge_settings(job_params, default_settings)
-        
-        # use_minimalパラメータを設定
-        job_params['use_minimal'] = use_minimal_param
-        
-        # パラメータの検証
         try:
-            dataset_params = DatasetParams(**job_params)
-            job_params = dataset_params.dict()
-        except Exception as e:
-            logger.error(f"パラメータ検証エラー: {str(e)}")
-            raise HTTPException(status_code=400, detail=f"パラメータが無効です: {str(e)}")
-        
-        # 合計ショット数とデータサイズの計算
-        total_shots = dataset_params.calculate_total_shots()
-        estimated_size = dataset_params.estimated_size_mb()
-        estimated_time = dataset_params.estimated_time()
-        
-        logger.info(f"データセット生成ジョブ作成: {job_id}, ファイル: {file.filename}, " +
-                     f"ショット数: {total_shots}, 推定サイズ: {estimated_size}MB, 推定時間: {estimated_time}分")
-        
-        # ジョブをキューに追加
-        try:
-            job_id = add_job(
-                "dataset", 
-                file_path, 
-                job_params
+            # ファイル保存（チャンク単位で書き込み、サイズ上限の確認とハッシュ計算を同時に行う。
+            # 同じ内容のVRMはハッシュで保存済みのものを共有する）
+            try:
+                content_hash, file_path, _, _ = await get_blob_store().ingest_upload(file)
+            except UploadTooLargeError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            
+            return await enqueue_dataset_job(
+                file_path, file.filename, content_hash, job_params, dataset_params, raw_estimated_seconds,
+                admission_token
             )
-        except Exception as e:
-            logger.error(f"ジョブの追加に失敗しました: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"ジョブの追加に失敗しました: {str(e)}")
-        
-        # レスポンス
-        return {
-            "job_id": job_id,
-            "filename": file.filename,
-            "status": "queued",
-            "message": "データセット生成ジョブがキューに追加されました",
-            "total_shots": total_shots,
-            "estimated_size_mb": estimated_size,
-            "estimated_time_minutes": estimated_time
-        }
+        finally:
+            # ジョブに付け替えなかった仮の枠（アップロードの失敗・結果の再利用）を解放する
+            get_admission_controller().release(admission_token)
         
     except HTTPException:
         # HTTPExceptionはそのまま再送
@@ -289,28 +436,44 @@ async def generate_dataset(
         logger.error(f"データセット生成リクエスト処理エラー: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"サーバーエラー: {str(e)}")
 
+def _load_dataset_jobs_page(limit: int, cursor: Optional[str], status: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """データセットジョブ一覧の1ページ分をデータベースから取得する"""
+    with get_db_session() as db:
+        return get_dataset_jobs_page(db, limit=limit, cursor=cursor, status=status)
+
 # ジョブリストの取得
-@router.get("/jobs")
-async def get_dataset_jobs():
-    """データセット生成ジョブのリストを取得"""
+@router.get("/jobs", response_model=DatasetJobListResponse)
+async def get_dataset_jobs(
+    response: Response,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """データセット生成ジョブのリストを新しい順に取得
+
+    一覧表示に必要な列だけをSQLで絞り込んで取得し、DATASET_JOB_LIST_CACHE_SECONDS の間は
+    同じ条件の結果を再利用する（ジョブの投入・キャンセル時は破棄する）。
+    次ページのカーソルは next_cursor と X-Next-Cursor ヘッダーで返す。
+    """
     try:
-        # すべてのジョブを取得
-        all_jobs = get_job_status()
-        
-        # データセットジョブのみをフィルタリング
-        dataset_jobs = [
-            job for job in all_jobs 
-            if job.get("job_type") == "dataset"
-        ]
-        
-        return {
-            "jobs": dataset_jobs,
-            "count": len(dataset_jobs)
-        }
-        
+        jobs, next_cursor = await run_db(
+            _dataset_job_list_cache.get_or_load,
+            (limit, cursor, status),
+            partial(_load_dataset_jobs_page, limit, cursor, status)
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"ジョブリスト取得エラー: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"サーバーエラー: {str(e)}")
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return {
+        "jobs": jobs,
+        "count": len(jobs),
+        "next_cursor": next_cursor
+    }
 
 # 特定のジョブの詳細取得
 @router.get("/jobs/{job_id}")
@@ -318,10 +481,10 @@ async def get_dataset_job(job_id: str):
     """指定されたジョブの詳細情報を取得"""
     try:
         # ジョブ情報を取得
-        job_info = get_job_status(job_id)
+        job_info = await run_db(get_job_status, job_id)
         
         # ジョブが見つからない場合
-        if job_info.get("status") == JOB_STATUSES["not_found"]:
+        if job_info.get("status") == "not_found":
             raise HTTPException(status_code=404, detail="ジョブが見つかりません")
         
         # データセットジョブかどうかを確認
@@ -336,20 +499,39 @@ async def get_dataset_job(job_id: str):
         logger.error(f"ジョブ詳細取得エラー: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"サーバーエラー: {str(e)}")
 
-# データセットのダウンロード
+# ジョブの進捗配信
+@router.get("/jobs/{job_id}/events")
+async def get_dataset_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """指定されたジョブの進捗を Server-Sent Events で配信（再接続時は Last-Event-ID から再開）"""
+    response = await job_event_response(job_id, last_event_id)
+    if response is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return response
+
+# データセットのダウンロード（HEAD は GET と同じ処理で、OpenAPI には GET のみ載せる）
 @router.get("/download/{job_id}")
+@router.head("/download/{job_id}", include_in_schema=False)
 async def download_dataset(
     job_id: str,
-    response: Response,
-    range: Optional[str] = Header(None)
+    range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+    redirect: bool = True
 ):
-    """生成されたデータセットをダウンロード"""
+    """生成されたデータセットをダウンロード
+
+    成果物がS3互換のオブジェクトストレージにアップロード済みの場合は、署名付きURLへ 307 で
+    リダイレクトし、クライアントがストレージから直接取得する（redirect=false でAPIから配信）。
+    ETag は成果物のSHA-256から作る強いETagで、If-None-Match が一致すれば 304 を返す。
+    Range ヘッダーによる単一・複数範囲の取得に対応し、中断したダウンロードを途中から再開できる。
+    If-Range が現在のETag（または Last-Modified）と一致しない場合は範囲を無視して全体を返す。
+    """
     try:
         # ジョブ情報を取得
-        job_info = get_job_status(job_id)
+        job_info = await run_db(get_job_status, job_id)
         
         # ジョブが見つからない場合
-        if job_info.get("status") == JOB_STATUSES["not_found"]:
+        if job_info.get("status") == "not_found":
             raise HTTPException(status_code=404, detail="ジョブが見つかりません")
         
         # データセットジョブかどうかを確認
@@ -357,22 +539,60 @@ async def download_dataset(
             raise HTTPException(status_code=400, detail="指定されたジョブはデータセットジョブではありません")
         
         # ジョブが完了していることを確認
-        if job_info.get("status") != JOB_STATUSES["completed"]:
+        if job_info.get("status") != JOB_STATUSES["COMPLETED"]:
             raise HTTPException(status_code=400, detail="ジョブはまだ完了していません")
         
         # 結果ファイルパスの取得
         result_path = job_info.get("result_path")
-        if not result_path or not os.path.exists(result_path):
+        storage_key = await run_in_session(get_result_storage_key, job_id)
+        if storage_key:
+            backend = get_storage_backend()
+            if redirect and app_settings.STORAGE_REDIRECT_DOWNLOADS:
+                try:
+                    url = await run_fs(backend.presigned_url, storage_key, os.path.basename(storage_key))
+                except StorageError as e:
+                    logger.warning(f"署名付きURLを発行できないためAPIから配信します: {str(e)}")
+                    url = None
+                if url:
+                    return RedirectResponse(url, status_code=307, headers={"cache-control": "private, no-store"})
+            # ローカルの成果物が削除されていても、ローカルのオブジェクトストレージにあればそこから配信する
+            if backend.name == BACKEND_LOCAL and not await path_exists(result_path):
+                result_path = backend.local_path(storage_key)
+        
+        stat_result = await stat_file(result_path)
+        if stat_result is None:
             raise HTTPException(status_code=404, detail="データセットファイルが見つかりません")
         
-        # ファイル名の取得
-        file_name = os.path.basename(result_path)
+        etag = make_etag(await run_in_session(get_result_file_hash, job_id, result_path))
+        cache_headers = {
+            "etag": etag,
+            "last-modified": http_date(stat_result.st_mtime),
+            "cache-control": "private, no-cache"
+        }
+        
+        # 手元のコピーが最新であれば本文を送らない
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=cache_headers)
         
-        # ファイルのレスポンス
-        return FileResponse(
+        ranges = None
+        if range and if_range_matches(if_range, etag, stat_result.st_mtime):
+            try:
+                ranges = parse_range_header(range, stat_result.st_size)
+            except RangeNotSatisfiableError as e:
+                return Response(
+                    status_code=416,
+                    headers={**cache_headers, "content-range": f"bytes */{e.size}", "accept-ranges": "bytes"}
+                )
+        
+        return FileRangeResponse(
             result_path,
+            stat_result.st_size,
+            stat_result.st_mtime,
+            etag,
+            ranges=ranges,
             media_type="application/zip",
-            filename=file_name
+            filename=os.path.basename(result_path),
+            headers={"cache-control": cache_headers["cache-control"]}
         )
         
     except HTTPException:
@@ -381,16 +601,288 @@ async def download_dataset(
         logger.error(f"データセットダウンロードエラー: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"サーバーエラー: {str(e)}")
 
+# 条件に一致するショットだけのデータセットのダウンロード
+@router.get("/download/{job_id}/subset")
+async def download_dataset_subset(
+    job_id: str,
+    expression: Optional[str] = None,
+    lighting: Optional[str] = None,
+    distance: Optional[str] = None,
+    angle_min: Optional[int] = Query(None, ge=0, le=359),
+    angle_max: Optional[int] = Query(None, ge=0, le=359)
+):
+    """条件に一致するショットの画像と、絞り込んだ metadata.json だけを含むZIPをダウンロード
+
+    ZIPは要求ごとに組み立てながらストリーミングで送るため、サーバーに保存されず、
+    データセットの大きさによらずメモリ使用量は一定になる。サイズは事前に分からないため
+    Content-Length は返さず、Range にも対応しない。
+    絞り込み条件は /dataset/shots と同じ（angle_min > angle_max は 0° をまたぐ範囲）。
+    """
+    job_info = await run_db(get_job_status, job_id)
+    if job_info.get("status") == "not_found":
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    if job_info.get("job_type") != "dataset":
+        raise HTTPException(status_code=400, detail="指定されたジョブはデータセットジョブではありません")
+    if job_info.get("status") != JOB_STATUSES["COMPLETED"]:
+        raise HTTPException(status_code=400, detail="ジョブはまだ完了していません")
+
+    filters = {
+        "expression": expression,
+        "lighting": lighting,
+        "camera_distance": distance,
+        "angle_min": angle_min,
+        "angle_max": angle_max
+    }
+    # 結果を再利用したジョブはショットを持たないため、撮影した元ジョブのショットから組み立てる
+    shot_job_id = await run_in_session(resolve_shot_job_id, job_id)
+    shots, _ = await run_in_session(query_shots, job_id=shot_job_id, limit=1, **filters)
+    if not shots:
+        raise HTTPException(status_code=404, detail="条件に一致するショットがありません")
+
+    file_name = f"{job_id}_dataset_subset.zip"
+    return StreamingResponse(
+        iter_subset_archive(shot_job_id, job_info.get("result_path"), filters),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'}
+    )
+
+# 撮影中のデータセットのダウンロード
+@router.get("/download/{job_id}/partial")
+async def download_partial_dataset(
+    job_id: str,
+    follow: bool = False,
+    expression: Optional[str] = None,
+    lighting: Optional[str] = None,
+    distance: Optional[str] = None,
+    angle_min: Optional[int] = Query(None, ge=0, le=359),
+    angle_max: Optional[int] = Query(None, ge=0, le=359)
+):
+    """撮影済みのショットをZIPでダウンロード（ジョブの完了を待たない）
+
+    follow=true を指定すると、ジョブが終了するまで接続を保ち、新しく撮影されたショットを
+    同じZIPに追加し続ける。ZIPの最後に dataset/manifest.json を含め、partial（撮影途中の内容か）、
+    ジョブの状態、全体と収録済みのショット数を記録する。
+    絞り込み条件は /dataset/shots と同じ。
+    """
+    job_info = await run_db(get_job_status, job_id)
+    if job_info.get("status") == "not_found":
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    if job_info.get("job_type") != "dataset":
+        raise HTTPException(status_code=400, detail="指定されたジョブはデータセットジョブではありません")
+
+    filters = {
+        "expression": expression,
+        "lighting": lighting,
+        "camera_distance": distance,
+        "angle_min": angle_min,
+        "angle_max": angle_max
+    }
+    file_name = f"{job_id}_dataset_partial.zip"
+    return StreamingResponse(
+        iter_partial_archive(job_id, filters, follow=follow),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{file_name}"',
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+# ショット画像の送信単位（バイト）
+SHOT_IMAGE_CHUNK_SIZE = 64 * 1024
+
+def _get_archive_member_size(archive_path: str, member: str) -> Optional[int]:
+    """データセットZIP内のメンバーのサイズを返す（存在しない場合はNone）"""
+    try:
+        with zipfile.ZipFile(archive_path) as zf:
+            return zf.getinfo(member).file_size
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+def _iter_archive_member(archive_path: str, member: str):
+    """データセットZIP内のメンバーを展開しながら少しずつ読み出す"""
+    with zipfile.ZipFile(archive_path) as zf, zf.open(member) as f:
+        while True:
+            chunk = f.read(SHOT_IMAGE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+# ショットの検索
+@router.get("/shots", response_model=ShotListResponse)
+async def search_shots(
+    response: Response,
+    job_id: Optional[str] = None,
+    expression: Optional[str] = None,
+    lighting: Optional[str] = None,
+    distance: Optional[str] = None,
+    angle_min: Optional[int] = Query(None, ge=0, le=359),
+    angle_max: Optional[int] = Query(None, ge=0, le=359),
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    format: str = "json"
+):
+    """条件に一致するショットを新しい順に取得する
+
+    各ショットには個別の画像を取得する image_url が含まれる。
+    次ページのカーソルは X-Next-Cursor ヘッダーで返す。
+    format=ndjson を指定すると、cursor 以降の一致する全ショットを1行1件でストリーミングする。
+    angle_min が angle_max より大きい場合は 0° をまたぐ範囲として扱う。
+    """
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail=f"未対応の出力形式です: {format}")
+    
+    filters = {
+        "job_id": job_id,
+        "expression": expression,
+        "lighting": lighting,
+        "camera_distance": distance,
+        "angle_min": angle_min,
+        "angle_max": angle_max
+    }
+    page_size = STREAM_PAGE_SIZE if format == "ndjson" else limit
+    
+    try:
+        shots, next_cursor = await run_in_session(query_shots, limit=page_size, cursor=cursor, **filters)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if format == "ndjson":
+        # 先頭ページは取得済みのものを流し、以降はページ単位で読みながら返す
+        def _stream_shots():
+            yield from shots
+            if next_cursor:
+                yield from iter_keyset_rows(
+                    lambda db, page_cursor: query_shots(db, limit=STREAM_PAGE_SIZE, cursor=page_cursor, **filters),
+                    lambda shot: shot,
+                    cursor=next_cursor
+                )
+        return ndjson_response(_stream_shots())
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    return {
+        "shots": shots,
+        "count": len(shots),
+        "next_cursor": next_cursor
+    }
+
+# ショット画像の取得
+@router.get("/shots/{shot_id}/image")
+async def get_shot_image(shot_id: str):
+    """ショットの画像を1枚だけ返す
+
+    撮影時のファイルが残っていればそれを、なければデータセットZIPから該当する画像だけを展開して返す。
+    """
+    source = await run_in_session(get_shot_image_source, shot_id)
+    if not source:
+        raise HTTPException(status_code=404, detail="ショットが見つかりません")
+    
+    headers = {"Cache-Control": "public, max-age=86400"}
+    
+    if await path_exists(source["file_path"]):
+        return FileResponse(source["file_path"], media_type="image/png", headers=headers)
+    
+    archive_path = source["archive_path"]
+    size = await run_fs(_get_archive_member_size, archive_path, source["archive_member"]) if archive_path else None
+    if size is None:
+        raise HTTPException(status_code=404, detail="ショット画像が見つかりません")
+    
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(
+        _iter_archive_member(archive_path, source["archive_member"]),
+        media_type="image/png",
+        headers=headers
+    )
+
+# サムネイル・コンタクトシートのキャッシュ設定（サムネイルはショットごとに内容が変わらない）
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+async def _file_etag(path: str) -> Tuple[str, os.stat_result]:
+    """ファイルの更新時刻とサイズからETagを作成する"""
+    stat_result = await run_fs(os.stat, path)
+    return make_etag(f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"), stat_result
+
+# ショットのサムネイルの取得
+@router.get("/shots/{shot_id}/thumbnail")
+async def get_shot_thumbnail(shot_id: str, if_none_match: Optional[str] = Header(None)):
+    """ショットのサムネイル（長辺 THUMBNAIL_SIZE px のJPEG）を返す
+
+    撮影時にバックグラウンドで作成したものを返し、まだない場合はその場で作成する。
+    ショットの画像は撮影後に変わらないため、長期間キャッシュできるヘッダーを付ける。
+    """
+    try:
+        path = await run_fs(get_thumbnail_service().get_thumbnail, shot_id)
+    except ThumbnailUnavailableError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if path is None:
+        raise HTTPException(status_code=404, detail="ショットが見つかりません")
+    
+    etag, stat_result = await _file_etag(path)
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": etag}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=THUMBNAIL_MEDIA_TYPE, headers=headers, stat_result=stat_result)
+
+def _get_dataset_job_status(db, job_id: str) -> Optional[str]:
+    """データセットジョブの状態を返す（データセットジョブでない場合はNone）"""
+    job = db.query(Job.status, Job.job_type).filter(Job.job_id == job_id).first()
+    if not job or job.job_type != "dataset":
+        return None
+    return job.status
+
+async def _contact_sheet_response(job_id: str, if_none_match: Optional[str], as_index: bool) -> Response:
+    """コンタクトシート（画像または索引）のレスポンスを作成する
+
+    撮影が終わったジョブのコンタクトシートは変わらないため長期間キャッシュさせ、
+    撮影中のジョブは ETag で更新の有無を確認させる。結果を再利用したジョブでは、
+    ショットを撮影した元ジョブが終わっているか（索引の finished）で判断する。
+    """
+    if await run_in_session(_get_dataset_job_status, job_id) is None:
+        raise HTTPException(status_code=404, detail="データセットジョブが見つかりません")
+    try:
+        # 作成されていない場合はその場で作成するため、ファイル操作用のスレッドプールで実行する
+        sheet = await run_fs(get_thumbnail_service().get_contact_sheet, job_id)
+    except ThumbnailUnavailableError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if sheet is None:
+        raise HTTPException(status_code=404, detail="ショットがまだありません")
+    
+    sheet_path, index = sheet
+    etag, stat_result = await _file_etag(sheet_path)
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if index.get("finished") else "no-cache",
+        "ETag": etag
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if as_index:
+        return JSONResponse(content=index, headers=headers)
+    return FileResponse(sheet_path, media_type=THUMBNAIL_MEDIA_TYPE, headers=headers, stat_result=stat_result)
+
+# ジョブのコンタクトシートの取得
+@router.get("/jobs/{job_id}/contact-sheet")
+async def get_contact_sheet(job_id: str, if_none_match: Optional[str] = Header(None)):
+    """ジョブの全ショットのサムネイルを1枚に並べたコンタクトシート（JPEG）を返す"""
+    return await _contact_sheet_response(job_id, if_none_match, as_index=False)
+
+# コンタクトシートの索引の取得
+@router.get("/jobs/{job_id}/contact-sheet/index")
+async def get_contact_sheet_index(job_id: str, if_none_match: Optional[str] = Header(None)):
+    """コンタクトシート上の各ショットの位置（shot_id → x, y, width, height）を返す"""
+    return await _contact_sheet_response(job_id, if_none_match, as_index=True)
+
 # ジョブのキャンセル
 @router.post("/jobs/{job_id}/cancel")
 async def cancel_dataset_job(job_id: str):
     """指定されたデータセット生成ジョブをキャンセル"""
     try:
         # ジョブ情報を取得
-        job_info = get_job_status(job_id)
+        job_info = await run_db(get_job_status, job_id)
         
         # ジョブが見つからない場合
-        if job_info.get("status") == JOB_STATUSES["not_found"]:
+        if job_info.get("status") == "not_found":
             raise HTTPException(status_code=404, detail="ジョブが見つかりません")
         
         # データセットジョブかどうかを確認
@@ -398,16 +890,17 @@ async def cancel_dataset_job(job_id: str):
             raise HTTPException(status_code=400, detail="指定されたジョブはデータセットジョブではありません")
         
         # すでに完了またはエラーの場合
-        if job_info.get("status") in [JOB_STATUSES["completed"], JOB_STATUSES["error"], JOB_STATUSES["cancelled"]]:
+        if job_info.get("status") in [JOB_STATUSES["COMPLETED"], JOB_STATUSES["ERROR"], JOB_STATUSES["CANCELLED"]]:
             return {
                 "success": False,
                 "message": f"ジョブはすでに {job_info.get('status')} 状態のためキャンセルできません"
             }
         
         # ジョブをキャンセル
-        success = cancel_job(job_id)
+        result = await run_db(cancel_job, job_id)
         
-        if success:
+        if result.get("success"):
+            _dataset_job_list_cache.clear()
             logger.info(f"データセットジョブがキャンセルされました: {job_id}")
             return {
                 "success": True,
@@ -417,7 +910,7 @@ async def cancel_dataset_job(job_id: str):
             logger.error(f"データセットジョブのキャンセルに失敗しました: {job_id}")
             return {
                 "success": False,
-                "message": "ジョブのキャンセルに失敗しました"
+                "message": result.get("message", "ジョブのキャンセルに失敗しました")
             }
         
     except HTTPException:
@@ -431,14 +924,12 @@ async def cancel_dataset_job(job_id: str):
 async def calculate_dataset_info(params: DatasetParams):
     """データセット設定に基づく情報計算"""
     try:
-        total_shots = params.calculate_total_shots()
-        estimated_size = params.estimated_size_mb()
-        estimated_time = params.estimated_time()
+        estimate = estimate_dataset(params)
         
         return {
-            "total_shots": total_shots,
-            "estimated_size_mb": estimated_size,
-            "estimated_time_minutes": estimated_time
+            "total_shots": estimate["total_shots"],
+            "estimated_size_mb": estimate["estimated_size_mb"],
+            "estimated_time_minutes": estimate["estimated_time_minutes"]
         }
         
     except Exception as e:
@@ -3,6 +3,15 @@
 
 from fastapi import APIRouter
 
+from backend.services.admission import get_admission_controller
+from backend.services.retention import get_retention_service
+from backend.services.upload_sessions import get_upload_session_manager
+from backend.services.job_events import get_job_event_bus
+from backend.services.thumbnails import get_thumbnail_service
+from backend.services.loop_monitor import get_loop_lag_monitor
+from backend.services.blob_store import get_blob_store
+from backend.services.object_storage import storage_stats
+
 # ルーターの作成
 router = APIRouter(
     prefix="/api/health",
@@ -15,4 +24,15 @@ async def health_check():
     """
     API健康チェックエンドポイント
     """
-    return {"status": "healthy", "message": "API is running"} 
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "message": "API is running",
+        "admission": get_admission_controller().stats(),
+        "retention": get_retention_service().stats(),
+        "uploads": get_upload_session_manager().stats(),
+        "job_events": get_job_event_bus().stats(),
+        "thumbnails": get_thumbnail_service().stats(),
+        "event_loop": get_loop_lag_monitor().stats(),
+        "blobs": get_blob_store().stats(),
+        "object_storage": storage_stats()
+    } 
\ No newline at end of file
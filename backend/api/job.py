@@ -1,20 +1,23 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks, Response, Header
 from sqlalchemy.orm import Session
-import os
 import json
 import uuid
-from datetime import datetime
-import shutil
 from typing import List, Optional, Dict, Any
 import logging
 
-from backend.models.database import get_db, Job, File as DBFile, EvaluationReport
+from backend.models.database import get_db, Job, EvaluationReport
 from backend.models.schemas import JobCreate, JobResponse, JobStatus, FileResponse, StandardResponse
-from backend.services.job_service import create_job, get_job, get_all_jobs, update_job_status
-from backend.utils.file_utils import save_upload_file, get_file_path, UPLOAD_DIR
+from backend.services.job_service import create_job as create_job_record, get_job, get_jobs_page, count_jobs, update_job_status, add_file_to_job
+from backend.utils.file_utils import get_file_path, UploadTooLargeError
+from backend.services.admission import get_admission_controller, admit_job
+from backend.services.job_events import job_event_response
+from backend.config.settings import settings
+from backend.utils.async_db import run_db, run_in_session
+from backend.services.blob_store import get_blob_store, remove_unreferenced_blob
+from backend.utils.pagination import InvalidCursorError
 import backend.job_processor as job_processor
 
 # ロギングの設定
@@ -30,8 +33,7 @@ router = APIRouter(
 @router.post("/upload", response_model=StandardResponse)
 async def upload_vrm(
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    file: UploadFile = File(...)
 ):
     """VRMファイルをアップロードしてジョブを作成するエンドポイント"""
     try:
@@ -42,25 +44,15 @@ async def upload_vrm(
                 message="VRMファイル (.vrm) のみアップロード可能です",
             )
         
-        # ジョブの作成
+        # ファイルの保存（チャンク単位で書き込み、上限を超えた時点で中断。同じ内容は1つだけ保存する）
         job_id = str(uuid.uuid4())
-        job = create_job(db, job_id=job_id)
+        content_hash, file_path, size, _ = await get_blob_store().ingest_upload(file)
         
-        # ファイルの保存
-        file_path = os.path.join(UPLOAD_DIR, job_id, os.path.basename(file.filename))
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # ジョブの作成
+        await run_in_session(create_job_record, job_id=job_id, file_path=file_path, content_hash=content_hash)
         
         # ファイル情報をDBに保存
-        db_file = DBFile(
-            job_id=job_id, 
-            file_type="upload",
-            file_path=file_path
-        )
-        db.add(db_file)
-        db.commit()
+        await run_in_session(add_file_to_job, job_id, "upload", file_path, file.filename, size, content_hash)
         
         # バックグラウンドでジョブ処理を開始する例（本番環境ではキューに送信）
         # background_tasks.add_task(process_job, job_id)
@@ -72,7 +64,6 @@ async def upload_vrm(
         )
     
     except Exception as e:
-        db.rollback()
         return StandardResponse(
             success=False,
             message=f"アップロードエラー: {str(e)}",
@@ -88,12 +79,20 @@ def get_job_details(job_id: str, db: Session = Depends(get_db)):
 
 @router.get("/", response_model=List[JobResponse])
 def get_jobs(
-    skip: int = 0, 
+    response: Response,
     limit: int = 10, 
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """ジョブの一覧を取得するエンドポイント"""
-    jobs = get_all_jobs(db, skip=skip, limit=limit)
+    """ジョブの一覧を取得するエンドポイント（次ページのカーソルは X-Next-Cursor ヘッダーで返す）"""
+    try:
+        jobs, next_cursor = get_jobs_page(db, limit=limit, cursor=cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    response.headers["X-Total-Count"] = str(count_jobs(db))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return jobs
 
 @router.get("/{job_id}/status", response_model=JobStatus)
@@ -135,8 +134,7 @@ async def create_job(
     learning_rate: float = Form(0.0001),
     resolution: int = Form(512),
     use_advanced_features: bool = Form(False),
-    animation_frames: int = Form(0),
-    db: Session = Depends(get_db)
+    animation_frames: int = Form(0)
 ):
     """
     VRMファイルをアップロードして新しいジョブを作成する
@@ -145,133 +143,106 @@ async def create_job(
     if not file.filename.lower().endswith(".vrm"):
         raise HTTPException(status_code=400, detail="VRMファイル形式のみ受け付けています")
     
-    # ファイルサイズのチェック (50MB上限)
-    file_size_limit = 50 * 1024 * 1024  # 50MB
-    file_content = await file.read()
-    file_size = len(file_content)
-    
-    if file_size > file_size_limit:
-        raise HTTPException(status_code=400, detail=f"ファイルサイズは50MB以下である必要があります（現在: {file_size / (1024 * 1024):.2f}MB）")
-    
-    # ファイルを保存する
-    job_id = str(uuid.uuid4())
-    os.makedirs(os.path.join(UPLOAD_DIR, job_id), exist_ok=True)
-    file_path = os.path.join(UPLOAD_DIR, job_id, file.filename)
+    # 受付制御（混雑時はアップロードを読み込む前に429を返す。受け付けた場合はアップロード中も枠を確保しておく）
+    admission_token = admit_job(settings.ADMISSION_DEFAULT_JOB_SECONDS)
     
     try:
-        with open(file_path, "wb") as f:
-            f.write(file_content)
-        
-        # 変換パラメータ
-        params = {
-            "rank": rank,
-            "alpha": alpha,
-            "iterations": iterations,
-            "batch_size": batch_size,
-            "learning_rate": learning_rate,
-            "resolution": resolution,
-            "use_advanced_features": use_advanced_features,
-            "animation_frames": animation_frames
-        }
-        
-        # ジョブの記録
-        new_job = Job(
-            job_id=job_id,
-            status="queued",
-            file_path=file_path,
-            job_parameters=json.dumps(params),
-            submission_time=datetime.now()
-        )
-        
-        db.add(new_job)
-        db.commit()
-        
-        # ジョブプロセッサにジョブを追加
-        success = job_processor.add_job(job_id, file_path, params)
-        
-        if not success:
-            raise HTTPException(status_code=500, detail="ジョブの登録に失敗しました")
-        
-        return {
-            "job_id": job_id,
-            "status": "queued",
-            "message": "ジョブがキューに追加されました"
-        }
-        
-    except Exception as e:
-        logger.error(f"ジョブ作成エラー: {str(e)}")
-        # アップロード済みのファイルを削除
-        if os.path.exists(file_path):
+        # ファイルを保存する（チャンク単位で書き込み、サイズ上限の確認とハッシュ計算を同時に行う。
+        # 同じ内容のファイルはハッシュで保存済みのものを共有する）
+        try:
+            content_hash, file_path, _, created = await get_blob_store().ingest_upload(file)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+        try:
+            # 変換パラメータ
+            params = {
+                "rank": rank,
+                "alpha": alpha,
+                "iterations": iterations,
+                "batch_size": batch_size,
+                "learning_rate": learning_rate,
+                "resolution": resolution,
+                "use_advanced_features": use_advanced_features,
+                "animation_frames": animation_frames
+            }
+            
+            # ジョブの記録とジョブプロセッサへの追加
+            job_id = await run_db(job_processor.add_job, "lora", file_path, params, content_hash=content_hash,
+                                  admission_token=admission_token)
+            
+            return {
+                "job_id": job_id,
+                "status": "queued",
+                "message": "ジョブがキューに追加されました"
+            }
+            
+        except Exception as e:
+            logger.error(f"ジョブ作成エラー: {str(e)}")
+            # アップロード済みのファイルを削除（同じ内容の別のジョブが参照している場合は残す）
             try:
-                os.remove(file_path)
-            except:
+                await run_in_session(remove_unreferenced_blob, file_path, created)
+            except Exception:
                 pass
-        
-        raise HTTPException(status_code=500, detail=f"ジョブ作成中にエラーが発生しました: {str(e)}")
+            
+            raise HTTPException(status_code=500, detail=f"ジョブ作成中にエラーが発生しました: {str(e)}")
+    finally:
+        # ジョブに付け替えなかった仮の枠（アップロードの失敗・結果の再利用）を解放する
+        get_admission_controller().release(admission_token)
 
 @router.get("", response_model=List[Dict[str, Any]])
-async def get_jobs(db: Session = Depends(get_db)):
+async def get_jobs(response: Response, limit: int = 100, cursor: Optional[str] = None):
     """
-    すべてのジョブのリストを取得する
+    ジョブのリストを新しい順に取得する（次ページのカーソルは X-Next-Cursor ヘッダーで返す）
     """
     try:
-        # メモリ内ジョブデータを優先して取得
-        jobs = job_processor.get_all_jobs()
+        try:
+            page = await run_db(job_processor.get_all_jobs, limit=limit, cursor=cursor)
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # データベースから足りないジョブ情報を補完
-        if not jobs:
-            db_jobs = db.query(Job).order_by(Job.submission_time.desc()).all()
-            jobs = []
-            
-            for job in db_jobs:
-                job_data = {
-                    "job_id": job.job_id,
-                    "status": job.status,
-                    "submission_time": job.submission_time.isoformat(),
-                    "progress": 0,
-                    "message": ""
-                }
-                
-                # ジョブプロセッサからの情報で補完
-                job_progress = job_processor.get_job_progress(job.job_id)
-                if job_progress["status"] != "not_found":
-                    job_data["progress"] = job_progress["progress"]
-                    job_data["message"] = job_progress["message"]
-                    job_data["status"] = job_progress["status"]
-                
-                jobs.append(job_data)
+        response.headers["X-Total-Count"] = str(page.get("total", 0))
+        if page.get("next_cursor"):
+            response.headers["X-Next-Cursor"] = page["next_cursor"]
         
-        return jobs
+        return page.get("jobs", [])
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"ジョブリスト取得エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"ジョブリスト取得中にエラーが発生しました: {str(e)}")
 
+def _get_job_from_db(db: Session, job_id: str) -> Optional[Dict[str, Any]]:
+    """データベースからジョブの基本情報を組み立てる（スレッドプール上で実行）"""
+    job = db.query(Job).filter(Job.job_id == job_id).first()
+    if not job:
+        return None
+    
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "submission_time": job.submission_time.isoformat(),
+        "file_path": job.file_path,
+        "params": json.loads(job.job_parameters) if job.job_parameters else {},
+        "files": []
+    }
+
 @router.get("/{job_id}", response_model=Dict[str, Any])
-async def get_job(job_id: str, db: Session = Depends(get_db)):
+async def get_job(job_id: str):
     """
     特定のジョブの詳細情報を取得する
     """
     try:
         # メモリ内ジョブデータを優先
-        job_data = job_processor.get_job(job_id)
+        job_data = await run_db(job_processor.get_job_status, job_id)
         
         # ジョブが見つからない場合はデータベースから検索
         if job_data["status"] == "not_found":
-            job = db.query(Job).filter(Job.job_id == job_id).first()
+            job_data = await run_in_session(_get_job_from_db, job_id)
             
-            if not job:
+            if not job_data:
                 raise HTTPException(status_code=404, detail=f"ジョブID {job_id} が見つかりません")
-            
-            # 基本的なジョブ情報
-            job_data = {
-                "job_id": job.job_id,
-                "status": job.status,
-                "submission_time": job.submission_time.isoformat(),
-                "file_path": job.file_path,
-                "params": json.loads(job.job_parameters) if job.job_parameters else {},
-                "files": []
-            }
         
         return job_data
     
@@ -281,13 +252,23 @@ async def get_job(job_id: str, db: Session = Depends(get_db)):
         logger.error(f"ジョブ詳細取得エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"ジョブ詳細取得中にエラーが発生しました: {str(e)}")
 
+@router.get("/{job_id}/events")
+async def get_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    特定のジョブの進捗を Server-Sent Events で配信する（再接続時は Last-Event-ID から再開）
+    """
+    response = await job_event_response(job_id, last_event_id)
+    if response is None:
+        raise HTTPException(status_code=404, detail=f"ジョブID {job_id} が見つかりません")
+    return response
+
 @router.get("/{job_id}/progress", response_model=Dict[str, Any])
 async def get_job_progress(job_id: str):
     """
     特定のジョブの進捗状況を取得する
     """
     try:
-        progress_data = job_processor.get_job_progress(job_id)
+        progress_data = await run_db(job_processor.get_job_status, job_id)
         
         if progress_data["status"] == "not_found":
             raise HTTPException(status_code=404, detail=f"ジョブID {job_id} が見つかりません")
@@ -300,34 +281,35 @@ async def get_job_progress(job_id: str):
         logger.error(f"ジョブ進捗取得エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"ジョブ進捗取得中にエラーが発生しました: {str(e)}")
 
+def _get_job_status_value(db: Session, job_id: str) -> Optional[str]:
+    """ジョブのステータスのみを取得する（スレッドプール上で実行）"""
+    row = db.query(Job.status).filter(Job.job_id == job_id).first()
+    return row.status if row else None
+
 @router.delete("/{job_id}", response_model=Dict[str, Any])
-async def cancel_job(job_id: str, db: Session = Depends(get_db)):
+async def cancel_job(job_id: str):
     """
     特定のジョブをキャンセルする
     """
     try:
         # ジョブの存在確認
-        job = db.query(Job).filter(Job.job_id == job_id).first()
+        job_status = await run_in_session(_get_job_status_value, job_id)
         
-        if not job:
+        if not job_status:
             raise HTTPException(status_code=404, detail=f"ジョブID {job_id} が見つかりません")
         
         # 処理済みのジョブはキャンセル不可
-        if job.status not in ["queued", "processing"]:
+        if job_status not in ["queued", "processing"]:
             return {
                 "job_id": job_id,
-                "status": job.status,
-                "message": f"ステータスが {job.status} のジョブはキャンセルできません"
+                "status": job_status,
+                "message": f"ステータスが {job_status} のジョブはキャンセルできません"
             }
         
-        # ジョブのキャンセル処理
-        success = job_processor.cancel_job(job_id)
+        # ジョブのキャンセル処理（データベースのステータスもジョブプロセッサが更新する）
+        result = await run_db(job_processor.cancel_job, job_id)
         
-        if success:
-            # データベースのステータス更新
-            job.status = "cancelled"
-            db.commit()
-            
+        if result.get("success"):
             return {
                 "job_id": job_id,
                 "status": "cancelled",
@@ -336,8 +318,8 @@ async def cancel_job(job_id: str, db: Session = Depends(get_db)):
         else:
             return {
                 "job_id": job_id,
-                "status": job.status,
-                "message": "ジョブのキャンセルに失敗しました"
+                "status": job_status,
+                "message": result.get("message", "ジョブのキャンセルに失敗しました")
             }
     
     except HTTPException:
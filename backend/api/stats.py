@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from backend.models.database import get_db
+from backend.services.job_service import get_job_counters
+
+# ルーターの作成
+router = APIRouter(
+    prefix="/api/stats",
+    tags=["stats"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/jobs")
+def get_job_stats(job_type: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    ジョブタイプ・ステータス別のジョブ件数を取得する
+
+    集計テーブルを参照するため、ジョブの履歴件数に関わらず一定時間で応答する。
+    """
+    by_type = get_job_counters(db, job_type)
+
+    totals = {}
+    for statuses in by_type.values():
+        for status, count in statuses.items():
+            totals[status] = totals.get(status, 0) + count
+
+    return {
+        "by_type": by_type,
+        "totals": totals,
+        "total": sum(totals.values())
+    }
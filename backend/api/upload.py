@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+from typing import Dict, Any, Optional, Union
+
+from fastapi import APIRouter, HTTPException, Request, Header
+from pydantic import BaseModel, Field
+
+from backend.api.dataset import prepare_dataset_job, enqueue_dataset_job
+from backend.services.upload_sessions import (
+    get_upload_session_manager,
+    parse_content_range,
+    UploadSessionNotFoundError,
+    InvalidChunkRangeError,
+    UploadIncompleteError,
+    ChecksumMismatchError
+)
+from backend.utils.file_utils import max_upload_bytes
+from backend.utils.async_fs import run_fs
+from backend.utils.async_db import run_in_session
+from backend.services.blob_store import get_blob_store, normalize_suffix, remove_unreferenced_blob
+from backend.services.admission import get_admission_controller
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# ルーター作成
+router = APIRouter(
+    prefix="/api/uploads",
+    tags=["uploads"],
+    responses={404: {"description": "Not found"}},
+)
+
+class UploadSessionCreate(BaseModel):
+    """分割アップロードの開始リクエスト"""
+    filename: str
+    size: int = Field(..., gt=0)
+    chunk_size: Optional[int] = None
+    params: Optional[Union[str, Dict[str, Any]]] = None  # /dataset/generate の params と同じ
+    use_minimal: Optional[bool] = False
+
+class UploadSessionComplete(BaseModel):
+    """分割アップロードの完了リクエスト"""
+    sha256: Optional[str] = None  # クライアントが計算したファイル全体のSHA-256
+
+def _get_session(upload_id: str):
+    """アップロードセッションを取得する（存在しない場合は404）"""
+    try:
+        return get_upload_session_manager().get(upload_id)
+    except UploadSessionNotFoundError:
+        raise HTTPException(status_code=404, detail="アップロードセッションが見つからないか、期限が切れています")
+
+@router.post("", status_code=201)
+async def create_upload_session(request: UploadSessionCreate):
+    """分割アップロードを開始する
+
+    ジョブのパラメータ検証と受付制御はこの時点で行い、受け付けられない場合はデータを送らせずに返す。
+    各チャンクは PUT /api/uploads/{upload_id} に Content-Range ヘッダー付きで送信する（並列送信可）。
+    """
+    if not request.filename.lower().endswith('.vrm'):
+        raise HTTPException(status_code=400, detail="VRM形式のファイルを選択してください")
+
+    params = json.dumps(request.params) if isinstance(request.params, dict) else request.params
+    # アップロードは複数のリクエストにまたがるため、ここでは判定だけを行い、枠は完了時に確保する
+    prepare_dataset_job(params, request.use_minimal, reserve=False)
+
+    try:
+        session = get_upload_session_manager().create(
+            request.filename,
+            request.size,
+            max_upload_bytes(),
+            chunk_size=request.chunk_size,
+            metadata={"params": params, "use_minimal": request.use_minimal}
+        )
+    except InvalidChunkRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = session.to_dict()
+    result["upload_url"] = f"{router.prefix}/{session.upload_id}"
+    return result
+
+@router.get("/{upload_id}")
+async def get_upload_session(upload_id: str):
+    """分割アップロードの状況（未受信のチャンク）を取得する
+
+    通信が途切れた場合は missing_chunks のチャンクだけを送り直せばよい。
+    """
+    return _get_session(upload_id).to_dict()
+
+@router.put("/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, content_range: Optional[str] = Header(None)):
+    """チャンクを1つ受信する
+
+    Content-Range: bytes 開始-終了/全体 で範囲を指定する。範囲はチャンクの境界に合わせること。
+    受信済みのチャンクを送り直した場合は何もせずに成功を返す。
+    """
+    session = _get_session(upload_id)
+
+    try:
+        start, end, total = parse_content_range(content_range)
+        if total != session.size:
+            raise InvalidChunkRangeError(f"全体サイズが一致しません: {total}（期待値: {session.size}）")
+        index = session.chunk_index(start, end)
+    except InvalidChunkRangeError as e:
+        raise HTTPException(status_code=416, detail=str(e))
+
+    # 本文は宣言された範囲の長さまでしか読まない
+    expected = end - start
+    buffer = bytearray()
+    async for data in request.stream():
+        buffer.extend(data)
+        if len(buffer) > expected:
+            raise HTTPException(status_code=400, detail=f"本文が Content-Range の長さ（{expected}バイト）を超えています")
+
+    try:
+        written = await run_fs(session.write_chunk, index, bytes(buffer))
+    except InvalidChunkRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    state = session.to_dict()
+    return {
+        "upload_id": upload_id,
+        "chunk": index,
+        "written": written,
+        "received_chunks": state["received_chunks"],
+        "total_chunks": state["total_chunks"],
+        "complete": state["complete"]
+    }
+
+@router.post("/{upload_id}/complete", status_code=202)
+async def complete_upload(upload_id: str, request: Optional[UploadSessionComplete] = None):
+    """分割アップロードを完了し、/dataset/generate と同じ手順でデータセット生成ジョブを作成する
+
+    sha256 を指定した場合は受信データと照合し、一致しなければセッションを破棄する。
+    受付制御で拒否された場合（429）はセッションを残すため、後で完了をやり直せる。
+    """
+    session = _get_session(upload_id)
+
+    job_params, dataset_params, raw_estimated_seconds, admission_token = prepare_dataset_job(
+        session.metadata.get("params"), session.metadata.get("use_minimal")
+    )
+
+    try:
+        # 受信済みのファイルはブロブストアの一時領域へ移動してから、ハッシュで保存する
+        blob_store = get_blob_store()
+        temp_path = blob_store.new_temp_path()
+        try:
+            session, content_hash = await run_fs(
+                get_upload_session_manager().finalize, upload_id, temp_path, request.sha256 if request else None
+            )
+        except UploadSessionNotFoundError:
+            raise HTTPException(status_code=404, detail="アップロードセッションが見つからないか、すでに完了しています")
+        except UploadIncompleteError as e:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": str(e), "missing_chunks": e.missing_chunks}
+            )
+        except ChecksumMismatchError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        _, file_path, created = await run_fs(blob_store.put_file, temp_path, content_hash, normalize_suffix(session.filename))
+        try:
+            return await enqueue_dataset_job(
+                file_path, session.filename, content_hash, job_params, dataset_params, raw_estimated_seconds,
+                admission_token
+            )
+        except Exception:
+            # 保存したファイルを削除（同じ内容の別のジョブが参照している場合は残す）
+            try:
+                await run_in_session(remove_unreferenced_blob, file_path, created)
+            except Exception:
+                pass
+            raise
+    finally:
+        # ジョブに付け替えなかった仮の枠（完了の失敗・結果の再利用）を解放する
+        get_admission_controller().release(admission_token)
+
+@router.delete("/{upload_id}")
+async def abort_upload(upload_id: str):
+    """分割アップロードを中止し、受信済みのデータを破棄する"""
+    if not get_upload_session_manager().discard(upload_id):
+        raise HTTPException(status_code=404, detail="アップロードセッションが見つかりません")
+    return {"success": True, "upload_id": upload_id}
@@ -3,7 +3,12 @@
 
 import os
 from typing import Optional
-from pydantic import BaseSettings
+
+try:
+    # pydantic v2 では BaseSettings は pydantic-settings に分離されている
+    from pydantic_settings import BaseSettings
+except ImportError:
+    from pydantic import BaseSettings
 
 class Settings(BaseSettings):
     """アプリケーション設定"""
@@ -15,28 +20,100 @@ class Settings(BaseSettings):
     
     # データベース設定
     DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 10  # コネクションプールのサイズ
+    DB_MAX_OVERFLOW: int = 20  # プールを超えて作成できる接続数
+    DB_BUSY_TIMEOUT_MS: int = 30000  # ロック解除を待つ時間（ミリ秒）
+    DB_CACHE_SIZE_KB: int = 16384  # 接続ごとのページキャッシュ（KB）
+    DB_MMAP_SIZE_MB: int = 256  # メモリマップするサイズ（MB）
+    DB_EXECUTOR_WORKERS: int = 8  # 非同期ハンドラーからDB処理を実行するスレッド数
+    
+    # 非同期I/O設定
+    FS_EXECUTOR_WORKERS: int = 8  # 非同期ハンドラーからファイル操作を実行するスレッド数
+    LOOP_LAG_INTERVAL_SECONDS: float = 0.5  # イベントループの遅延を計測する間隔（秒）
+    LOOP_LAG_WARN_MS: float = 100.0  # イベントループの遅延を警告する閾値（ミリ秒）
     
     # ストレージ設定
     STORAGE_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "storage")
     UPLOAD_DIR: str = os.path.join(STORAGE_DIR, "uploads")
     RESULT_DIR: str = os.path.join(STORAGE_DIR, "results")
     LOG_DIR: str = os.path.join(STORAGE_DIR, "logs")
+    BLOB_STORE_DIR: str = os.path.join(STORAGE_DIR, "blobs")  # 入力ファイルをSHA-256で保存するストア
     
     # アップロード設定
     MAX_UPLOAD_SIZE_MB: int = 50  # 最大アップロードサイズ（MB）
     ALLOWED_EXTENSIONS: list = [".vrm"]
+    UPLOAD_SESSION_DIR: str = os.path.join(STORAGE_DIR, "temp", "uploads")  # 分割アップロード中のファイル
+    UPLOAD_CHUNK_SIZE_MB: int = 5  # 分割アップロードの既定のチャンクサイズ（MB）
+    UPLOAD_SESSION_TTL_SECONDS: int = 24 * 3600  # 分割アップロードを再開できる期間（秒）
     
     # ジョブ設定
     JOB_TIMEOUT_SECONDS: int = 3600  # ジョブタイムアウト（秒）
+    JOB_STALL_TIMEOUT_SECONDS: int = 600  # 進捗が止まったとみなすまでの時間（秒）
+    JOB_MAX_RETRIES: int = 1  # 進捗停止時に再キューイングする最大回数
+    MAX_CONCURRENT_JOBS: int = 2  # 同時に実行するジョブ数（ワーカースロット数）
+    WATCHDOG_INTERVAL_SECONDS: int = 15  # ウォッチドッグの監視間隔（秒）
+    
+    # ジョブイベント（進捗配信）設定
+    JOB_EVENT_BUFFER_SIZE: int = 50  # ジョブごとに再送用に保持するイベント数
+    JOB_EVENT_MAX_JOBS: int = 1000  # イベントを保持するジョブ数の上限
+    JOB_EVENT_HEARTBEAT_SECONDS: int = 15  # 接続維持のコメントを送る間隔（秒）
+    JOB_EVENT_RETRY_MS: int = 3000  # クライアントの再接続間隔（ミリ秒）
+    DATASET_JOB_LIST_CACHE_SECONDS: float = 2.0  # データセットジョブ一覧の結果を再利用する時間（秒）
+    DATASET_FOLLOW_POLL_SECONDS: int = 2  # 撮影中のデータセットを追跡する際に新しいショットを確認する間隔（秒）
+    
+    # 受付制御設定
+    ADMISSION_MAX_QUEUE_DEPTH: int = 50  # 受け付ける未完了ジョブ数の上限
+    ADMISSION_MAX_BACKLOG_SECONDS: int = 4 * 3600  # 処理待ちの推定時間の上限（秒）
+    ADMISSION_DEFAULT_JOB_SECONDS: int = 60  # 推定できないジョブの処理時間（秒）
+    
+    # ショットキャッシュ設定
+    SHOT_CACHE_DIR: str = os.path.join(STORAGE_DIR, "cache", "shots")
+    SHOT_CACHE_MAX_MB: int = 2048  # キャッシュの最大サイズ（MB）
+    
+    # サムネイル・コンタクトシート設定
+    THUMBNAIL_DIR: str = os.path.join(STORAGE_DIR, "cache", "thumbnails")
+    THUMBNAIL_WORKERS: int = 2  # サムネイルを作成するスレッド数
+    THUMBNAIL_SIZE: int = 256  # サムネイルの長辺（px）
+    THUMBNAIL_QUALITY: int = 80  # サムネイルとコンタクトシートのJPEG品質
+    CONTACT_SHEET_TILE_SIZE: int = 64  # コンタクトシートの1マスの大きさ（px）
+    CONTACT_SHEET_COLUMNS: int = 32  # コンタクトシートの列数
+    
+    # 保持期間・アーカイブ設定
+    RETENTION_ENABLED: bool = True
+    RETENTION_DAYS: int = 30  # 終了したジョブをアーカイブするまでの日数
+    RETENTION_INTERVAL_SECONDS: int = 6 * 3600  # 保持期間の処理と保守処理の実行間隔（秒）
+    RETENTION_BATCH_SIZE: int = 200  # 1トランザクションでアーカイブするジョブ数
+    RETENTION_ARTIFACT_ACTION: str = "delete"  # 成果物の扱い: "delete"（削除）または "archive"（退避）
+    ARCHIVE_DIR: str = os.path.join(STORAGE_DIR, "archive")  # 成果物の退避先
+    ARCHIVE_DATABASE_PATH: Optional[str] = None  # アーカイブDBのパス（省略時は database/lora_platform_archive.db）
+    VACUUM_PAGES_PER_RUN: int = 2000  # 1回の増分VACUUMで解放するページ数
+    
+    # オブジェクトストレージ設定（成果物の保存先）
+    STORAGE_BACKEND: str = "local"  # "local"（ローカルディスク）または "s3"（S3互換: AWS S3 / MinIO など）
+    OBJECT_STORAGE_DIR: str = os.path.join(STORAGE_DIR, "objects")  # local の場合の保存先
+    STORAGE_PUBLISH_WORKERS: int = 2  # 成果物を同時にアップロードするジョブ数
+    STORAGE_REDIRECT_DOWNLOADS: bool = True  # 署名付きURLを発行できる場合はダウンロードをリダイレクトする
+    S3_BUCKET: Optional[str] = None
+    S3_PREFIX: str = ""  # オブジェクトキーの先頭に付けるパス
+    S3_ENDPOINT_URL: Optional[str] = None  # MinIO などのエンドポイント（例: http://localhost:9000）
+    S3_REGION: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    S3_FORCE_PATH_STYLE: bool = False  # MinIO などバケット名をパスで指定する場合はTrue
+    S3_MULTIPART_THRESHOLD_MB: int = 16  # これを超えるファイルはマルチパートでアップロードする（MB）
+    S3_MULTIPART_CHUNK_MB: int = 8  # マルチパートの1パートの大きさ（MB）
+    S3_MAX_CONCURRENCY: int = 8  # マルチパートを並列に送信するスレッド数
+    S3_PRESIGN_SECONDS: int = 900  # 署名付きURLの有効期間（秒）
     
     # GCPサービス設定（本番環境用）
     GCP_PROJECT_ID: Optional[str] = None
     GCP_BUCKET_NAME: Optional[str] = None
-    USE_GCP: bool = False  # ローカル環境ではFalse
+    USE_GCP: bool = False  # ローカル環境ではFalse（Trueの場合は GCP_BUCKET_NAME を S3 互換 API で利用する）
     
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
+        extra = "ignore"
 
 # 設定のインスタンス
 settings = Settings()
@@ -26,6 +26,11 @@ import tempfile
 import random
 import pyppeteer
 
+from backend.services.result_cache import compute_file_hash
+from backend.services.shot_cache import ShotCache, get_shot_cache
+from backend.utils.file_utils import read_png_size
+from backend.services.job_watchdog import get_job_watchdog
+
 # ロギング設定
 os.makedirs("storage/logs", exist_ok=True)
 logging.basicConfig(
@@ -45,6 +50,10 @@ CHROMIUM_VERSION_FILE = os.path.join(CHROMIUM_STORAGE_DIR, "version_info.json")
 CHROMIUM_CHECK_INTERVAL_DAYS = 7  # 1週間ごとにアップデートを確認
 CHROMIUM_FALLBACK_REVISION = "1095492"  # 安定バージョンのフォールバック
 
+# ショットキャッシュのキーに含めるレンダラーのバージョン
+# VRMビューワーや撮影処理を変更した場合は更新して古いキャッシュを無効化する
+RENDERER_VERSION = "vrm-viewer-1"
+
 # ストレージパス設定
 UPLOAD_DIR = "storage/uploads"
 DATASET_DIR = "storage/datasets"
@@ -122,6 +131,17 @@ class DatasetGenerator:
             logger.error(f"ブラウザ起動エラー: {str(e)}")
             raise Exception(f"ブラウザ起動エラー: {str(e)}")
 
+    def _register_browser_process(self, job_id: str):
+        """起動したブラウザのプロセスをウォッチドッグに登録する
+
+        Args:
+            job_id (str): ジョブID
+        """
+        process = getattr(self.browser, "process", None)
+        if process is not None and getattr(process, "pid", None):
+            get_job_watchdog().register_browser(job_id, process.pid)
+            logger.info(f"ブラウザプロセスを登録しました: PID {process.pid}")
+
     async def _navigate_to_viewer(self, vrm_file_path: str, job_id: str):
         """VRMビューワーページに移動する
 
@@ -262,40 +282,103 @@ class DatasetGenerator:
             logger.error(f"スクリーンショット撮影エラー: {str(e)}")
             raise Exception(f"スクリーンショット撮影に失敗しました: {str(e)}")
 
-    def _collect_screenshots(self, job_id: str) -> List[str]:
+    def _plan_captures(self, vrm_file_path: str, settings: Dict[str, Any], expressions: List[str],
+                       lightings: List[str], distances: List[str], angles: List[int],
+                       vrm_hash: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[Tuple]]:
+        """撮影計画を立てる
+
+        ショットキャッシュにある組み合わせはデータセットディレクトリに配置し、
+        キャッシュにない組み合わせだけを撮影対象として返す。
+
+        Args:
+            vrm_file_path (str): VRMファイルのパス
+            settings (Dict[str, Any]): 生成設定
+            expressions (List[str]): 表情リスト
+            lightings (List[str]): ライティングリスト
+            distances (List[str]): カメラ距離リスト
+            angles (List[int]): 角度リスト
+            vrm_hash (Optional[str]): VRMファイルのSHA-256（ジョブに記録済みのもの。Noneの場合はここで計算する）
+
+        Returns:
+            Tuple[List[Dict[str, Any]], List[Tuple]]: (キャッシュから配置したショット情報, 撮影対象の (表情, ライティング, 距離, 角度, キー))
+        """
+        shot_cache = get_shot_cache()
+        if vrm_hash is None:
+            vrm_hash = compute_file_hash(vrm_file_path)
+        resolution = str((settings.get("output") or {}).get("resolution", "512x512"))
+        
+        cached_shots = []
+        pending_shots = []
+        for expr in expressions:
+            for light in lightings:
+                for dist in distances:
+                    for angle in angles:
+                        key = ShotCache.make_key(vrm_hash, expr, light, dist, angle, resolution, RENDERER_VERSION)
+                        filename = f"{expr}_{light}_{dist}_{angle}.png"
+                        filepath = os.path.join(self.dataset_dir, filename)
+                        if shot_cache.get(key, filepath):
+                            size = read_png_size(filepath)
+                            cached_shots.append({
+                                "file_name": filename,
+                                "file_path": filepath,  # 撮影中のみ存在する。一時ディレクトリの削除後はZIPから取得する
+                                "expression": expr,
+                                "lighting": light,
+                                "camera_distance": dist,
+                                "angle": angle,
+                                "width": size[0] if size else None,
+                                "height": size[1] if size else None
+                            })
+                        else:
+                            pending_shots.append((expr, light, dist, angle, key))
+        
+        return cached_shots, pending_shots
+
+    def _store_captures(self, pending_shots: List[Tuple]) -> None:
+        """撮影したショットをショットキャッシュに登録する
+
+        Args:
+            pending_shots (List[Tuple]): 撮影対象の (表情, ライティング, 距離, 角度, キー)
+        """
+        shot_cache = get_shot_cache()
+        for expr, light, dist, angle, key in pending_shots:
+            filepath = os.path.join(self.dataset_dir, f"{expr}_{light}_{dist}_{angle}.png")
+            if os.path.exists(filepath):
+                shot_cache.put(key, filepath)
+
+    def _collect_screenshots(self, job_id: str, allow_dummy: bool = True) -> List[str]:
         """撮影したスクリーンショットを収集する
 
         Args:
             job_id (str): ジョブID
+            allow_dummy (bool): スクリーンショットが見つからない場合にダミーを作成するか
 
         Returns:
             List[str]: スクリーンショットファイルのリスト
         """
-        # スクリーンショットディレクトリ
-        screenshot_dir = os.path.join("backend/temp/screenshots", job_id)
+        # スクリーンショットディレクトリの候補（APIが保存するディレクトリを含む）
+        candidate_dirs = [
+            os.path.join("backend/temp/screenshots", job_id),
+            os.path.join(os.getcwd(), "backend/temp/screenshots", job_id),
+            os.path.join("storage/temp/screenshots", job_id)
+        ]
         
-        # ディレクトリが存在しない場合は代替パスを試す
-        if not os.path.exists(screenshot_dir):
-            logger.warning(f"相対パスのスクリーンショットディレクトリが見つかりません: {screenshot_dir}")
-            
-            # 絶対パスを試す
-            alt_screenshot_dir = os.path.join(os.getcwd(), "backend/temp/screenshots", job_id)
-            if os.path.exists(alt_screenshot_dir):
-                logger.info(f"代替パスのスクリーンショットディレクトリを使用します: {alt_screenshot_dir}")
-                screenshot_dir = alt_screenshot_dir
-            else:
-                # APIエンドポイントからのスクリーンショットディレクトリを試す
-                api_screenshot_dir = os.path.join("storage/temp/screenshots", job_id)
-                if os.path.exists(api_screenshot_dir):
-                    logger.info(f"APIスクリーンショットディレクトリを使用します: {api_screenshot_dir}")
-                    screenshot_dir = api_screenshot_dir
-                else:
-                    # どのディレクトリも見つからない場合は空のリストを返す
-                    logger.error(f"すべてのパスを試しましたが、スクリーンショットディレクトリが見つかりません")
-                    logger.info("テスト用のダミースクリーンショットを作成します")
-                    
-                    # テスト用にダミーデータを生成
-                    return self._create_dummy_screenshots()
+        # PNGが保存されている最初のディレクトリを使用
+        screenshot_dir = None
+        for dir_path in candidate_dirs:
+            if os.path.isdir(dir_path) and any(name.endswith(".png") for name in os.listdir(dir_path)):
+                screenshot_dir = dir_path
+                break
+        
+        if screenshot_dir is None:
+            logger.error(f"すべてのパスを試しましたが、スクリーンショットが見つかりません")
+            if not allow_dummy:
+                return []
+            logger.info("テスト用のダミースクリーンショットを作成します")
+            
+            # テスト用にダミーデータを生成
+            return self._create_dummy_screenshots()
+        
+        logger.info(f"スクリーンショットディレクトリを使用します: {screenshot_dir}")
         
         # スクリーンショットファイルの収集
         screenshot_files = []
@@ -329,7 +412,8 @@ class DatasetGenerator:
         logger.info(f"ダミースクリーンショットを作成しました: {len(dummy_files)}枚")
         return dummy_files
 
-    async def _generate_dataset_async(self, vrm_file_path: str, job_id: str, settings: Dict[str, Any], progress_callback: Optional[Callable] = None):
+    async def _generate_dataset_async(self, vrm_file_path: str, job_id: str, settings: Dict[str, Any], progress_callback: Optional[Callable] = None,
+                                      vrm_hash: Optional[str] = None):
         """データセットを非同期で生成する
 
         Args:
@@ -337,6 +421,7 @@ class DatasetGenerator:
             job_id (str): ジョブID
             settings (Dict[str, Any]): 生成設定
             progress_callback (Optional[Callable], optional): 進捗コールバック
+            vrm_hash (Optional[str], optional): VRMファイルのSHA-256（ショットキャッシュのキーに使用）
 
         Returns:
             str: 生成されたデータセットのZIPファイルパス
@@ -370,18 +455,6 @@ class DatasetGenerator:
                 "screenshots": []
             }
             
-            # ブラウザのセットアップ
-            if progress_callback:
-                progress_callback({"status": "ブラウザをセットアップしています", "progress": 5}, "ブラウザをセットアップしています")
-            
-            await self._set_up_browser()
-            
-            # VRMビューワーへの移動
-            if progress_callback:
-                progress_callback({"status": "VRMビューワーを読み込んでいます", "progress": 10}, "VRMビューワーを読み込んでいます")
-            
-            await self._navigate_to_viewer(vrm_file_path, job_id)
-            
             # 最小設定を使用する場合
             use_minimal = settings.get("use_minimal", False)
             
@@ -403,41 +476,71 @@ class DatasetGenerator:
             self.total_shots = len(expressions) * len(lightings) * len(distances) * len(angles)
             logger.info(f"総ショット数: {self.total_shots}")
             
-            if progress_callback:
+            # 撮影計画: ショットキャッシュにあるものはキャッシュから配置し、ないものだけを撮影する
+            cached_shots, pending_shots = self._plan_captures(
+                vrm_file_path, settings, expressions, lightings, distances, angles, vrm_hash=vrm_hash
+            )
+            cached_files = [shot["file_name"] for shot in cached_shots]
+            self.metadata["cached_shots"] = len(cached_files)
+            logger.info(f"ショットキャッシュ: ヒット {len(cached_files)}件, 撮影対象 {len(pending_shots)}件")
+            
+            # キャッシュから配置したショットを呼び出し元に通知（ショット検索用に記録される）
+            if cached_shots and progress_callback:
                 progress_callback({
-                    "status": "スクリーンショットを撮影しています", 
-                    "progress": 15,
-                    "total_shots": self.total_shots
-                }, "スクリーンショットを撮影しています")
+                    "status": "キャッシュ済みのショットを配置しました",
+                    "progress": 5,
+                    "shots": cached_shots
+                }, "キャッシュ済みのショットを配置しました")
             
             # スクリーンショットの撮影
-            self.current_shot = 0
+            self.current_shot = len(cached_files)
             base_progress = 15
             progress_per_shot = 70 / self.total_shots  # 15%から85%までを使用
             
-            for expr in expressions:
-                for light in lightings:
-                    for dist in distances:
-                        for angle in angles:
-                            filename = await self._take_screenshot(expr, light, dist, angle)
-                            
-                            # 進捗の更新
-                            if progress_callback:
-                                current_progress = base_progress + (self.current_shot * progress_per_shot)
-                                progress_callback({
-                                    "status": "スクリーンショットを撮影しています",
-                                    "progress": int(current_progress),
-                                    "current_shot": self.current_shot,
-                                    "total_shots": self.total_shots,
-                                    "filename": filename
-                                }, f"スクリーンショット撮影中 ({self.current_shot}/{self.total_shots})")
+            if pending_shots:
+                # ブラウザのセットアップ
+                if progress_callback:
+                    progress_callback({"status": "ブラウザをセットアップしています", "progress": 5}, "ブラウザをセットアップしています")
+                
+                await self._set_up_browser()
+                self._register_browser_process(job_id)
+                
+                # VRMビューワーへの移動
+                if progress_callback:
+                    progress_callback({"status": "VRMビューワーを読み込んでいます", "progress": 10}, "VRMビューワーを読み込んでいます")
+                
+                await self._navigate_to_viewer(vrm_file_path, job_id)
+                
+                if progress_callback:
+                    progress_callback({
+                        "status": "スクリーンショットを撮影しています", 
+                        "progress": int(base_progress + self.current_shot * progress_per_shot),
+                        "total_shots": self.total_shots
+                    }, "スクリーンショットを撮影しています")
+                
+                for expr, light, dist, angle, _ in pending_shots:
+                    filename = await self._take_screenshot(expr, light, dist, angle)
+                    
+                    # 進捗の更新
+                    if progress_callback:
+                        current_progress = base_progress + (self.current_shot * progress_per_shot)
+                        progress_callback({
+                            "status": "スクリーンショットを撮影しています",
+                            "progress": int(current_progress),
+                            "current_shot": self.current_shot,
+                            "total_shots": self.total_shots,
+                            "filename": filename
+                        }, f"スクリーンショット撮影中 ({self.current_shot}/{self.total_shots})")
             
             # スクリーンショットの収集
             if progress_callback:
                 progress_callback({"status": "スクリーンショットを集めています", "progress": 85}, "スクリーンショットを集めています")
             
-            screenshot_files = self._collect_screenshots(job_id)
-            self.metadata["screenshots"] = screenshot_files
+            screenshot_files = self._collect_screenshots(job_id, allow_dummy=not cached_files) if pending_shots else []
+            self.metadata["screenshots"] = sorted(set(cached_files) | set(screenshot_files))
+            
+            # 新しく撮影したショットをキャッシュに登録
+            self._store_captures(pending_shots)
             
             # メタデータファイルの作成
             if progress_callback:
@@ -508,7 +611,8 @@ def run_async_in_thread(coro):
         logger.error(f"非同期処理エラー: {str(e)}")
         raise e
 
-def generate_dataset(job_id: str, vrm_file_path: str, settings: Dict[str, Any], progress_callback: Optional[Callable] = None) -> str:
+def generate_dataset(job_id: str, vrm_file_path: str, settings: Dict[str, Any], progress_callback: Optional[Callable] = None,
+                     vrm_hash: Optional[str] = None) -> str:
     """データセットを生成する
 
     Args:
@@ -516,6 +620,7 @@ def generate_dataset(job_id: str, vrm_file_path: str, settings: Dict[str, Any],
         vrm_file_path (str): VRMファイルのパス
         settings (Dict[str, Any]): 生成設定
         progress_callback (Optional[Callable], optional): 進捗コールバック関数
+        vrm_hash (Optional[str], optional): VRMファイルのSHA-256（ジョブの content_hash。Noneの場合はファイルから計算する）
 
     Returns:
         str: 生成されたデータセットのZIPファイルパス
@@ -527,10 +632,15 @@ def generate_dataset(job_id: str, vrm_file_path: str, settings: Dict[str, Any],
     
     try:
         # スレッド内で非同期処理を実行
-        zip_path = run_async_in_thread(
-            generator._generate_dataset_async(vrm_file_path, job_id, settings, progress_callback)
+        temp_zip_path = run_async_in_thread(
+            generator._generate_dataset_async(vrm_file_path, job_id, settings, progress_callback, vrm_hash=vrm_hash)
         )
         
+        # 一時ディレクトリはクリーンアップで削除されるため、成果物をデータセットディレクトリへ移動
+        os.makedirs(DATASET_DIR, exist_ok=True)
+        zip_path = os.path.abspath(os.path.join(DATASET_DIR, os.path.basename(temp_zip_path)))
+        shutil.move(temp_zip_path, zip_path)
+        
         logger.info(f"データセット生成完了: {zip_path}")
         return zip_path
     except Exception as e:
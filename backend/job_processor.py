@@ -12,10 +12,19 @@ import traceback
 import signal
 from queue import Queue, Empty
 from typing import Dict, List, Optional, Any, Tuple
+from sqlalchemy.orm import joinedload
 from backend.models.database import SessionLocal, Job, File, DatasetMetadata, DatasetShot, init_db, get_db_session
 import shutil
 import zipfile
 from backend.dataset_generator import generate_dataset as generate_vrm_dataset
+from backend.services.result_cache import make_result_key, compute_file_hash
+from backend.services.job_watchdog import get_job_watchdog, EXPIRED_TIMEOUT, EXPIRED_STALLED
+from backend.services.admission import get_admission_controller
+from backend.services.thumbnails import get_thumbnail_service
+from backend.services.object_storage import publish_result_async
+from backend.config.settings import settings
+from backend.services import job_service
+from backend.utils.pagination import InvalidCursorError
 
 # グローバル変数
 _processor = None
@@ -68,6 +77,13 @@ for directory in [UPLOAD_DIR, DATASET_DIR, RESULTS_DIR, TEMP_DIR]:
 # ジョブキューとジョブデータ
 job_queue = Queue()
 active_processors = {}
+_result_key_lock = threading.Lock()
+
+# ワーカースロット（同時実行数の上限）
+_job_slots = threading.BoundedSemaphore(settings.MAX_CONCURRENT_JOBS)
+_slot_lock = threading.Lock()
+_job_retries: Dict[str, int] = {}  # job_id -> 進捗停止による再実行回数
+_job_started_at: Dict[str, float] = {}  # job_id -> 再実行前の最初の開始時刻（time.monotonic）
 is_shutdown = False
 
 # 以下はJobProcessorクラスのままで
@@ -262,30 +278,62 @@ class JobProcessor:
             logger.error(f"データセット生成に失敗しました: {str(e)}")
             raise Exception(f"データセット生成に失敗しました: {str(e)}")
 
-def add_job(job_type: str, file_path: str, parameters: Dict[str, Any] = None) -> str:
-    """新しいジョブをデータベースに追加"""
+def add_job(job_type: str, file_path: str, parameters: Dict[str, Any] = None,
+            content_hash: Optional[str] = None, estimated_seconds: Optional[float] = None,
+            admission_token: Optional[str] = None) -> str:
+    """新しいジョブをデータベースに追加
+    
+    content_hash が指定された場合は、入力ハッシュと正規化パラメータから
+    結果キャッシュキーを生成し、同一条件のジョブがあれば再利用する。
+    完了済みのジョブがあればその成果物を指して即座に完了し、
+    実行中のジョブがあればそのジョブに合流して新たな処理は開始しない。
+    実際に処理するジョブは estimated_seconds（補正前の推定処理時間）とともに
+    受付制御のバックログに登録する。admission_token（受付時に確保した仮の枠）が
+    指定された場合はその枠をジョブに付け替える。再利用した場合の仮の枠は呼び出し元が解放する。
+    """
     if parameters is None:
         parameters = {}
         
     job_id = str(uuid.uuid4())
+    result_key = make_result_key(job_type, content_hash, parameters) if content_hash else None
     
     try:
         # ログは残しますが、デバッグログを整理
         logger.info(f"ジョブを追加します: タイプ={job_type}, ファイル={file_path}")
         
-        # DB接続とジョブ追加
-        with get_db_session() as session:
+        # DB接続とジョブ追加（同一キーの同時登録を防ぐためロックを取得）
+        with _result_key_lock, get_db_session() as session:
+            reusable_job = _find_reusable_job(session, result_key) if result_key else None
+            reused = (reusable_job.job_id, reusable_job.status) if reusable_job is not None else None
+            now = datetime.datetime.now()
+            
             # ジョブエントリの作成
             new_job = Job(
                 job_id=job_id,
                 job_type=job_type,
                 status="queued",
-                submission_time=datetime.datetime.now(),
+                submission_time=now,
                 file_path=file_path,
                 job_parameters=parameters,
                 progress=0,
-                message="キューに追加されました"
+                message="キューに追加されました",
+                content_hash=content_hash,
+                result_key=result_key
             )
+            
+            if reusable_job is not None:
+                # 再利用したジョブも他のジョブを指している場合があるため、撮影した元ジョブを記録する
+                new_job.source_job_id = reusable_job.source_job_id or reusable_job.job_id
+                if reusable_job.status == "completed":
+                    # 完了済みの成果物を指して即座に完了させる
+                    new_job.status = "completed"
+                    new_job.start_time = now
+                    new_job.end_time = now
+                    new_job.progress = 100
+                    new_job.result_path = reusable_job.result_path
+                    new_job.message = "同一条件の既存の結果を再利用しました"
+                else:
+                    new_job.message = "同一条件の実行中ジョブに合流しました"
             session.add(new_job)
             
             # ファイルエントリの作成
@@ -301,10 +349,15 @@ def add_job(job_type: str, file_path: str, parameters: Dict[str, Any] = None) ->
                 file_path=file_path,
                 file_size=file_size,
                 mime_type="application/octet-stream",  # デフォルト値
-                created_at=datetime.datetime.now()
+                created_at=now
             )
             session.add(new_file)
             
+            if new_job.status == "completed":
+                session.add(_build_result_file(
+                    job_id, new_job.result_path, *_find_result_record(session, reusable_job.job_id)
+                ))
+            
             # データセットジョブの場合はメタデータも追加
             if job_type == "dataset":
                 metadata = DatasetMetadata(
@@ -322,7 +375,15 @@ def add_job(job_type: str, file_path: str, parameters: Dict[str, Any] = None) ->
             
             session.commit()
         
-        # キューにジョブを追加
+        if reused is not None:
+            logger.info(f"結果キャッシュにヒットしました: {job_id} -> {reused[0]} ({reused[1]})")
+            return job_id
+        
+        # 受付制御のバックログに登録してキューにジョブを追加
+        if admission_token:
+            get_admission_controller().rebind(admission_token, job_id, estimated_seconds)
+        else:
+            get_admission_controller().reserve(job_id, estimated_seconds)
         processor = _get_processor()
         if processor:
             processor.add_job(job_type, file_path, parameters)
@@ -338,23 +399,158 @@ def add_job(job_type: str, file_path: str, parameters: Dict[str, Any] = None) ->
             logger.error(traceback.format_exc())
         raise
 
+def _find_reusable_job(session, result_key: str) -> Optional[Job]:
+    """結果キャッシュキーが一致する再利用可能なジョブを検索
+    
+    完了済みで成果物が存在するジョブを優先し、なければ
+    実行中（待機中を含む）の元ジョブを返す。
+    """
+    completed_jobs = session.query(Job).filter(
+        Job.result_key == result_key,
+        Job.status == "completed"
+    ).order_by(Job.submission_time.desc()).all()
+    
+    for job in completed_jobs:
+        if job.result_path and os.path.exists(job.result_path):
+            return job
+    
+    return session.query(Job).filter(
+        Job.result_key == result_key,
+        Job.status.in_(["queued", "processing"]),
+        Job.source_job_id.is_(None)
+    ).order_by(Job.submission_time.asc()).first()
+
+def _find_followers(db, source_job_id: str) -> List[Job]:
+    """元ジョブに合流している未完了のジョブを投入順に取得"""
+    return db.query(Job).filter(
+        Job.source_job_id == source_job_id,
+        Job.status.in_(["queued", "processing"])
+    ).order_by(Job.submission_time.asc()).all()
+
+def _build_result_file(job_id: str, result_path: str, content_hash: Optional[str] = None,
+                       storage_key: Optional[str] = None) -> File:
+    """結果ファイルのエントリを作成
+    
+    content_hash は成果物のSHA-256（ダウンロード時のETag）。結果を共有するジョブでは
+    元ジョブのハッシュとオブジェクトストレージ上のキーを引き継ぎ、成果物を読み直さない。
+    """
+    file_name = os.path.basename(result_path)
+    file_size = os.path.getsize(result_path) if os.path.exists(result_path) else 0
+    
+    return File(
+        job_id=job_id,
+        file_type="result",
+        file_path=result_path,
+        file_name=file_name,
+        file_size=file_size,
+        mime_type="application/zip",
+        content_hash=content_hash,
+        storage_key=storage_key
+    )
+
+def _find_result_record(db, job_id: str) -> Tuple[Optional[str], Optional[str]]:
+    """ジョブの結果ファイルに記録済みのSHA-256とオブジェクトストレージ上のキーを取得"""
+    row = db.query(File.content_hash, File.storage_key).filter(
+        File.job_id == job_id, File.file_type == "result"
+    ).first()
+    return (row.content_hash, row.storage_key) if row else (None, None)
+
+def get_result_storage_key(db, job_id: str) -> Optional[str]:
+    """ジョブの成果物のオブジェクトストレージ上のキーを取得（アップロード前の場合はNone）"""
+    return _find_result_record(db, job_id)[1]
+
+def get_result_file_hash(db, job_id: str, result_path: str) -> str:
+    """ジョブの成果物のSHA-256を取得する（ダウンロードのETagに使用）
+
+    記録済みのハッシュはファイルサイズが一致する場合だけ使う。記録がない（以前のバージョンで
+    作成された）成果物はここで一度だけ計算し、同じ成果物を共有するジョブの行にも保存する。
+
+    Args:
+        db: データベースセッション
+        job_id: ジョブID
+        result_path: 成果物のパス
+
+    Returns:
+        16進数表記のSHA-256ハッシュ
+    """
+    file_size = os.path.getsize(result_path)
+    row = db.query(File.content_hash, File.file_size).filter(
+        File.job_id == job_id, File.file_type == "result"
+    ).first()
+    if row and row.content_hash and row.file_size == file_size:
+        return row.content_hash
+
+    content_hash = compute_file_hash(result_path)
+    db.query(File).filter(File.file_path == result_path, File.file_type == "result").update(
+        {File.content_hash: content_hash, File.file_size: file_size}, synchronize_session=False
+    )
+    db.commit()
+    return content_hash
+
+def _settle_followers(db, source_job: Job) -> None:
+    """元ジョブの終了に合わせて合流中のジョブを更新
+    
+    完了・エラーの場合は同じ結果を反映し、キャンセルの場合は
+    最初に合流したジョブを新しい元ジョブとして処理を開始する。
+    """
+    followers = _find_followers(db, source_job.job_id)
+    
+    if not followers:
+        return
+    
+    now = datetime.datetime.now()
+    promoted_job_id = None
+    
+    if source_job.status == "completed":
+        for follower in followers:
+            follower.status = "completed"
+            follower.start_time = follower.start_time or now
+            follower.end_time = now
+            follower.progress = 100
+            follower.result_path = source_job.result_path
+            follower.message = "同一条件のジョブの結果を再利用しました"
+            if source_job.result_path:
+                db.add(_build_result_file(
+                    follower.job_id, source_job.result_path, *_find_result_record(db, source_job.job_id)
+                ))
+    elif source_job.status == "error":
+        for follower in followers:
+            follower.status = "error"
+            follower.end_time = now
+            follower.message = source_job.message
+            follower.error_message = source_job.error_message
+    else:
+        # キャンセルされた場合は合流先を付け替えて処理を引き継ぐ
+        promoted = followers[0]
+        promoted.source_job_id = None
+        promoted.message = "キューに追加されました"
+        promoted_job_id = promoted.job_id
+        for follower in followers[1:]:
+            follower.source_job_id = promoted_job_id
+    
+    db.commit()
+    logger.info(f"合流中のジョブを更新しました: {source_job.job_id} -> {len(followers)}件")
+    
+    if promoted_job_id:
+        # 元ジョブの枠はキャンセル時に解放済みのため、引き継いだジョブの枠を確保する
+        get_admission_controller().reserve(promoted_job_id)
+        _process_job_async(promoted_job_id)
+
 def get_job_status(job_id: str) -> Dict[str, Any]:
     """指定されたジョブIDのステータスを取得"""
     try:
         db = SessionLocal()
         try:
-            job = db.query(Job).filter(Job.job_id == job_id).first()
+            # データセットジョブのメタデータは同じクエリで JOIN して取得
+            job = db.query(Job).options(joinedload(Job.dataset_metadata)).filter(Job.job_id == job_id).first()
             
             if not job:
                 return {"status": "not_found", "message": "ジョブが見つかりません"}
             
             result = job.to_dict()
             
-            # データセットジョブの場合はメタデータも取得
-            if job.job_type == "dataset":
-                metadata = db.query(DatasetMetadata).filter(DatasetMetadata.job_id == job_id).first()
-                if metadata:
-                    result["metadata"] = metadata.to_dict()
+            if job.job_type == "dataset" and job.dataset_metadata:
+                result["metadata"] = job.dataset_metadata.to_dict()
             
             return result
         except Exception as e:
@@ -366,33 +562,41 @@ def get_job_status(job_id: str) -> Dict[str, Any]:
         logger.error(f"ジョブステータスの取得中にエラーが発生しました: {str(e)}")
         return {"status": "error", "message": f"エラー: {str(e)}"}
 
-def get_all_jobs(limit: int = 100, offset: int = 0, status: Optional[str] = None) -> List[Dict[str, Any]]:
-    """全てのジョブを取得、またはステータスでフィルタリング"""
+def get_all_jobs(limit: int = 100, cursor: Optional[str] = None, status: Optional[str] = None,
+                 job_type: Optional[str] = None) -> Dict[str, Any]:
+    """ジョブの一覧を新しい順にカーソル単位で取得、またはステータスでフィルタリング
+    
+    総件数はステータス別件数のキャッシュから求め、一覧取得のたびに
+    COUNT(*) を実行しない。
+    
+    Raises:
+        InvalidCursorError: カーソルの形式が不正な場合
+    """
     try:
         db = SessionLocal()
         try:
-            query = db.query(Job)
-            
-            if status:
-                query = query.filter(Job.status == status)
-            
-            total = query.count()
-            jobs = query.order_by(Job.submission_time.desc()).offset(offset).limit(limit).all()
+            jobs, next_cursor = job_service.get_jobs_page(
+                db, limit=limit, cursor=cursor, status=status, job_type=job_type
+            )
             
             return {
-                "total": total,
-                "offset": offset,
+                "total": job_service.count_jobs(db, status=status, job_type=job_type),
                 "limit": limit,
+                "next_cursor": next_cursor,
                 "jobs": [job.to_dict() for job in jobs]
             }
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logger.error(f"ジョブ一覧の取得中にデータベースエラーが発生しました: {str(e)}")
-            return {"total": 0, "offset": offset, "limit": limit, "jobs": []}
+            return {"total": 0, "limit": limit, "next_cursor": None, "jobs": []}
         finally:
             db.close()
+    except InvalidCursorError:
+        raise
     except Exception as e:
         logger.error(f"ジョブ一覧の取得中にエラーが発生しました: {str(e)}")
-        return {"total": 0, "offset": offset, "limit": limit, "jobs": []}
+        return {"total": 0, "limit": limit, "next_cursor": None, "jobs": []}
 
 def update_job_status(job_id: str, status: str, progress: int = None, message: str = None, 
                      result_path: str = None, error_message: str = None, detailed_error: str = None,
@@ -420,6 +624,7 @@ def update_job_status(job_id: str, status: str, progress: int = None, message: s
             # その他のフィールドの更新
             if progress is not None:
                 job.progress = progress
+                get_job_watchdog().touch(job_id)
             if message:
                 job.message = message
             if result_path:
@@ -439,6 +644,19 @@ def update_job_status(job_id: str, status: str, progress: int = None, message: s
             
             db.commit()
             logger.info(f"ジョブステータスが更新されました: {job_id}, ステータス: {status}, 進捗: {progress}")
+            
+            if status in ["completed", "error", "cancelled"]:
+                _job_retries.pop(job_id, None)
+                _job_started_at.pop(job_id, None)
+                # 完了したジョブは実測の処理時間で推定時間を補正する
+                actual_seconds = None
+                if status == "completed" and job.start_time and job.end_time:
+                    actual_seconds = (job.end_time - job.start_time).total_seconds()
+                get_admission_controller().release(job_id, actual_seconds)
+            
+            # 終了状態になった元ジョブに合流しているジョブを更新
+            if status in ["completed", "error", "cancelled"] and job.result_key and not job.source_job_id:
+                _settle_followers(db, job)
         except Exception as e:
             db.rollback()
             logger.error(f"ジョブステータス更新中にデータベースエラーが発生しました: {str(e)}")
@@ -466,6 +684,9 @@ def cancel_job(job_id: str) -> Dict[str, Any]:
                 job.end_time = datetime.datetime.now()
                 job.message = "ジョブがキャンセルされました"
                 db.commit()
+                get_admission_controller().release(job_id)
+                if job.result_key and not job.source_job_id:
+                    _settle_followers(db, job)
                 return {"success": True, "message": "ジョブがキャンセルされました"}
             
             # 処理中のジョブはプロセッサに通知
@@ -480,6 +701,9 @@ def cancel_job(job_id: str) -> Dict[str, Any]:
                 job.end_time = datetime.datetime.now()
                 job.message = "ジョブがキャンセルされました（非アクティブ）"
                 db.commit()
+                get_admission_controller().release(job_id)
+                if job.result_key and not job.source_job_id:
+                    _settle_followers(db, job)
                 return {"success": True, "message": "非アクティブなジョブがキャンセルされました"}
                 
         except Exception as e:
@@ -492,41 +716,113 @@ def cancel_job(job_id: str) -> Dict[str, Any]:
         logger.error(f"ジョブキャンセル中にエラーが発生しました: {str(e)}")
         return {"success": False, "message": f"エラー: {str(e)}"}
 
-def add_dataset_shot(job_id: str, file_name: str, file_path: str, expression: str, 
-                   lighting: str, camera_distance: str, angle: int, width: int, height: int) -> None:
+# ショット情報として記録する項目
+DATASET_SHOT_FIELDS = ('file_name', 'file_path', 'expression', 'lighting', 'camera_distance', 'angle', 'width', 'height')
+
+def add_dataset_shot(job_id: str, file_name: str, file_path: Optional[str], expression: str, 
+                   lighting: str, camera_distance: str, angle: int, width: Optional[int], height: Optional[int]) -> None:
     """データセットの個別のショット情報をデータベースに追加"""
+    add_dataset_shots(job_id, [{
+        "file_name": file_name,
+        "file_path": file_path,
+        "expression": expression,
+        "lighting": lighting,
+        "camera_distance": camera_distance,
+        "angle": angle,
+        "width": width,
+        "height": height
+    }])
+
+def add_dataset_shots(job_id: str, shots: List[Dict[str, Any]]) -> int:
+    """データセットのショット情報をまとめてデータベースに追加
+    
+    同じジョブに同じファイル名のショットが登録済みの場合は、撮影時のファイルパスと
+    画像サイズだけを補完する（撮影APIの再送やキャッシュ配置との重複を防ぐ）。
+    
+    Args:
+        job_id: ジョブID
+        shots: file_name, file_path, expression, lighting, camera_distance, angle, width, height を含む辞書のリスト
+        
+    Returns:
+        新たに追加したショット数
+    """
+    if not shots:
+        return 0
+    
     try:
         db = SessionLocal()
         try:
-            shot = DatasetShot(
-                job_id=job_id,
-                file_name=file_name,
-                file_path=file_path,
-                expression=expression,
-                lighting=lighting,
-                camera_distance=camera_distance,
-                angle=angle,
-                width=width,
-                height=height
-            )
-            db.add(shot)
+            existing = {
+                shot.file_name: shot
+                for shot in db.query(DatasetShot).filter(DatasetShot.job_id == job_id).all()
+            }
+            
+            added = 0
+            thumbnail_shot_ids = []  # 撮影時のファイルが登録されたショット（サムネイルの作成対象）
+            for data in shots:
+                shot = existing.get(data["file_name"])
+                if shot:
+                    if not shot.file_path and data.get("file_path"):
+                        thumbnail_shot_ids.append(shot.shot_id)
+                    shot.file_path = shot.file_path or data.get("file_path")
+                    shot.width = shot.width or data.get("width")
+                    shot.height = shot.height or data.get("height")
+                    continue
+                
+                shot = DatasetShot(shot_id=str(uuid.uuid4()), job_id=job_id,
+                                   **{field: data.get(field) for field in DATASET_SHOT_FIELDS})
+                db.add(shot)
+                existing[shot.file_name] = shot
+                if shot.file_path:
+                    thumbnail_shot_ids.append(shot.shot_id)
+                added += 1
             
             # メタデータの完了ショット数を更新
-            metadata = db.query(DatasetMetadata).filter(DatasetMetadata.job_id == job_id).first()
-            if metadata:
-                metadata.completed_shots += 1
+            if added:
+                metadata = db.query(DatasetMetadata).filter(DatasetMetadata.job_id == job_id).first()
+                if metadata:
+                    metadata.completed_shots = (metadata.completed_shots or 0) + added
             
             db.commit()
+            
+            # サムネイルとコンタクトシートはバックグラウンドで作成する（撮影を待たせない）
+            get_thumbnail_service().enqueue_shots(job_id, thumbnail_shot_ids)
+            return added
         except Exception as e:
             db.rollback()
             logger.error(f"データセットショット追加中にデータベースエラーが発生しました: {str(e)}")
+            return 0
         finally:
             db.close()
     except Exception as e:
         logger.error(f"データセットショット追加中にエラーが発生しました: {str(e)}")
+        return 0
 
 def _process_job(job_id: str) -> None:
-    """ジョブを処理する内部関数"""
+    """ジョブを処理する内部関数
+    
+    ワーカースロットは呼び出し元（ジョブキューの処理ループ）が確保済み。
+    終了時（またはウォッチドッグによる回収時）にスロットをプールへ返却する。
+    """
+    processor_data = {"cancel_requested": False, "reclaimed": False, "slot_released": False}
+    try:
+        _execute_job(job_id, processor_data)
+    finally:
+        # 回収済みの場合、監視情報は再実行中のスレッドのものなので残す
+        if not processor_data["reclaimed"]:
+            get_job_watchdog().untrack_job(job_id)
+        _release_slot(processor_data)
+
+def _release_slot(processor_data: Dict[str, Any]) -> None:
+    """ワーカースロットを一度だけ返却する"""
+    with _slot_lock:
+        if processor_data.get("slot_released"):
+            return
+        processor_data["slot_released"] = True
+    _job_slots.release()
+
+def _execute_job(job_id: str, processor_data: Dict[str, Any]) -> None:
+    """スロット確保後にジョブを実行する"""
     try:
         # ジョブ情報を取得
         db = SessionLocal()
@@ -537,14 +833,20 @@ def _process_job(job_id: str) -> None:
                 logger.error(f"処理対象のジョブが見つかりません: {job_id}")
                 return
             
+            # スロット待ちの間にキャンセル等された場合は処理しない
+            if job.status != "queued":
+                logger.info(f"待機中でなくなったジョブの処理をスキップします: {job_id}, ステータス: {job.status}")
+                return
+            
             # ジョブ情報の取得
             job_type = job.job_type
             file_path = job.file_path
+            vrm_hash = job.content_hash
             parameters = json.loads(job.job_parameters) if isinstance(job.job_parameters, str) else job.job_parameters
             
-            # キャンセル要求をモニタリングするための辞書を作成
-            processor_data = {"cancel_requested": False}
+            # キャンセル要求をモニタリングするための辞書を登録し、ウォッチドッグの監視を開始
             active_processors[job_id] = processor_data
+            get_job_watchdog().track_job(job_id, started_at=_job_started_at.get(job_id))
             
             # ジョブの開始
             update_job_status(job_id, "processing", 0, "処理を開始しています")
@@ -553,38 +855,41 @@ def _process_job(job_id: str) -> None:
             if job_type == "lora":
                 result_path = _convert_vrm_to_lora(job_id, file_path, parameters, processor_data)
             elif job_type == "dataset":
-                result_path = _generate_dataset(job_id, file_path, parameters, processor_data)
+                result_path = _generate_dataset(job_id, file_path, parameters, processor_data, vrm_hash)
             else:
                 raise ValueError(f"未対応のジョブタイプです: {job_type}")
             
+            # ウォッチドッグに回収されたジョブの結果は反映しない
+            if processor_data["reclaimed"]:
+                logger.info(f"回収済みのジョブの結果を破棄します: {job_id}")
             # 処理が完了した場合
-            if processor_data["cancel_requested"]:
+            elif processor_data["cancel_requested"]:
                 update_job_status(job_id, "cancelled", 100, "ジョブがキャンセルされました")
             else:
                 # 結果ファイルのエントリを作成
+                content_hash = None
                 if result_path:
-                    file_name = os.path.basename(result_path)
-                    file_size = os.path.getsize(result_path) if os.path.exists(result_path) else 0
-                    
-                    new_file = File(
-                        job_id=job_id,
-                        file_type="result",
-                        file_path=result_path,
-                        file_name=file_name,
-                        file_size=file_size,
-                        mime_type="application/zip"
-                    )
-                    db.add(new_file)
+                    content_hash = compute_file_hash(result_path) if os.path.exists(result_path) else None
+                    db.add(_build_result_file(job_id, result_path, content_hash))
                     db.commit()
                 
                 update_job_status(job_id, "completed", 100, "処理が完了しました", result_path=result_path)
                 logger.info(f"ジョブが完了しました: {job_id}, 結果: {result_path}")
                 
+                # 成果物をオブジェクトストレージへアップロード（完了までのダウンロードはローカルから配信）
+                if result_path:
+                    publish_result_async(job_id, result_path, content_hash)
+                
         except JobCancelledError:
+            if processor_data["reclaimed"]:
+                return
             update_job_status(job_id, "cancelled", progress=None, message="ジョブがキャンセルされました")
             logger.info(f"ジョブがキャンセルされました: {job_id}")
             
         except DatasetGenerationError as e:
+            if processor_data["reclaimed"]:
+                logger.info(f"回収済みのジョブのエラーを破棄します: {job_id} - {str(e)}")
+                return
             error_message = str(e)
             detailed_error = traceback.format_exc()
             update_job_status(
@@ -597,6 +902,9 @@ def _process_job(job_id: str) -> None:
             logger.debug(detailed_error)
             
         except Exception as e:
+            if processor_data["reclaimed"]:
+                logger.info(f"回収済みのジョブのエラーを破棄します: {job_id} - {str(e)}")
+                return
             error_message = str(e)
             detailed_error = traceback.format_exc()
             update_job_status(
@@ -609,8 +917,8 @@ def _process_job(job_id: str) -> None:
             logger.debug(detailed_error)
             
         finally:
-            # 完了したらアクティブプロセッサから削除
-            if job_id in active_processors:
+            # 完了したらアクティブプロセッサから削除（再実行中の別スレッドの登録は残す）
+            if active_processors.get(job_id) is processor_data:
                 del active_processors[job_id]
             db.close()
     
@@ -627,6 +935,41 @@ def _process_job(job_id: str) -> None:
         except:
             pass
 
+def _reclaim_job(job_id: str, reason: str, started_at: float) -> None:
+    """ウォッチドッグが期限切れと判断したジョブを回収する
+    
+    ブラウザのプロセスツリーはウォッチドッグが終了済み。ここでは実行中のスレッドを
+    切り離してワーカースロットを返却し、進捗停止なら再キューイング、
+    実行時間超過または再試行回数超過ならエラー状態にする。
+    再キューイングしたジョブの実行時間は最初の開始時刻から数える。
+    """
+    processor_data = active_processors.pop(job_id, None)
+    if processor_data is None:
+        return
+    
+    processor_data["reclaimed"] = True
+    processor_data["cancel_requested"] = True
+    
+    retries = _job_retries.get(job_id, 0)
+    if reason == EXPIRED_STALLED and retries < settings.JOB_MAX_RETRIES:
+        _job_retries[job_id] = retries + 1
+        _job_started_at[job_id] = started_at
+        update_job_status(job_id, "queued", 0, f"進捗が停止したため再実行します（{retries + 1}回目）")
+        _release_slot(processor_data)
+        _process_job_async(job_id)
+        logger.warning(f"進捗が停止したジョブを再キューイングしました: {job_id}")
+        return
+    
+    _job_retries.pop(job_id, None)
+    watchdog = get_job_watchdog()
+    if reason == EXPIRED_TIMEOUT:
+        error_message = f"ジョブが制限時間（{watchdog.timeout_seconds}秒）を超えました"
+    else:
+        error_message = f"ジョブの進捗が {watchdog.stall_seconds}秒以上停止しました"
+    update_job_status(job_id, "error", message="ジョブがタイムアウトしました", error_message=error_message)
+    _release_slot(processor_data)
+    logger.warning(f"期限切れのジョブをエラー状態にしました: {job_id}, 理由: {reason}")
+
 def _convert_vrm_to_lora(job_id: str, file_path: str, parameters: Dict[str, Any], processor_data: Dict[str, bool]) -> str:
     """VRMファイルからLoRAモデルを生成"""
     # この関数の実装はプロジェクトの要件に応じて行う
@@ -656,8 +999,12 @@ def _convert_vrm_to_lora(job_id: str, file_path: str, parameters: Dict[str, Any]
     
     return result_path
 
-def _generate_dataset(job_id: str, file_path: str, parameters: Dict[str, Any], processor_data: Dict[str, bool]) -> str:
-    """データセット生成ジョブの処理"""
+def _generate_dataset(job_id: str, file_path: str, parameters: Dict[str, Any], processor_data: Dict[str, bool],
+                      vrm_hash: Optional[str] = None) -> str:
+    """データセット生成ジョブの処理
+
+    vrm_hash はアップロード時に計算済みのVRMのSHA-256（jobs.content_hash）で、ショットキャッシュのキーに使う。
+    """
     logger.info(f"データセット生成ジョブを開始: {job_id}, ファイル: {file_path}")
     
     try:
@@ -683,6 +1030,10 @@ def _generate_dataset(job_id: str, file_path: str, parameters: Dict[str, Any], p
                 progress=progress,
                 message=message
             )
+            
+            # ショットキャッシュから配置したショットを記録（撮影したショットは撮影APIが記録する）
+            if isinstance(progress_data, dict) and progress_data.get("shots"):
+                add_dataset_shots(job_id, progress_data["shots"])
         
         # use_minimalが設定にあれば、settingsに含める
         if 'use_minimal' in parameters:
@@ -696,7 +1047,8 @@ def _generate_dataset(job_id: str, file_path: str, parameters: Dict[str, Any], p
             job_id=job_id,
             vrm_file_path=file_path,
             settings=parameters,
-            progress_callback=progress_update_callback
+            progress_callback=progress_update_callback,
+            vrm_hash=vrm_hash
         )
         
         return result_path
@@ -750,6 +1102,13 @@ def process_jobs() -> None:
             except Empty:
                 continue
             
+            # ワーカースロットを確保してからスレッドを起動する（スレッド数を同時実行数までに抑える）
+            acquired = False
+            while not acquired and not is_shutdown:
+                acquired = _job_slots.acquire(timeout=1)
+            if not acquired:
+                break
+            
             # ジョブを処理
             logger.info(f"ジョブの処理を開始します: {job_id}")
             threading.Thread(target=_process_job, args=(job_id,)).start()
@@ -772,11 +1131,21 @@ def init_job_processor() -> None:
             Job.status.in_(["queued", "processing"])
         ).all()
         
+        # 再起動で元ジョブが失われた合流中のジョブは単独のジョブとして扱う
+        queued_job_ids = {job.job_id for job in incomplete_jobs if job.status == "queued"}
+        for job in incomplete_jobs:
+            if job.source_job_id and job.source_job_id not in queued_job_ids:
+                job.source_job_id = None
+        
         # 未完了のジョブを再キューイングまたはエラー状態に更新
         for job in incomplete_jobs:
+            if job.status == "queued" and job.source_job_id:
+                # 待機中の元ジョブに合流しているジョブは元ジョブの終了を待つ
+                continue
             if job.status == "queued":
                 # キューに追加
                 job_queue.put(job.job_id)
+                get_admission_controller().reserve(job.job_id)
                 logger.info(f"未完了のキュー済みジョブを再キューイングしました: {job.job_id}")
             else:
                 # 処理中だったジョブはエラー状態に更新
@@ -792,8 +1161,9 @@ def init_job_processor() -> None:
     finally:
         db.close()
     
-    # ジョブ処理スレッドの開始
+    # ジョブ処理スレッドとウォッチドッグの開始
     threading.Thread(target=process_jobs, daemon=True).start()
+    get_job_watchdog().start(_reclaim_job)
     logger.info("ジョブプロセッサが初期化されました")
 
 def shutdown_job_processor() -> None:
@@ -801,6 +1171,7 @@ def shutdown_job_processor() -> None:
     global is_shutdown
     logger.info("ジョブプロセッサをシャットダウンしています...")
     is_shutdown = True
+    get_job_watchdog().stop()
     
     # アクティブなプロセッサにキャンセル要求を送信
     for job_id, processor_data in active_processors.items():
@@ -815,8 +1186,8 @@ def _get_processor():
     return _processor
 
 def _process_job_async(job_id: str):
-    """非同期でジョブを処理するスレッドを開始"""
-    threading.Thread(target=_process_job, args=(job_id,)).start()
+    """ジョブキューに追加し、空いたワーカースロットで非同期に処理する"""
+    job_queue.put(job_id)
 
 # 起動時に自動初期化
 if __name__ == "__main__":
@@ -1,23 +1,39 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks, Request, Query
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, BackgroundTasks, Request, Query, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse, RedirectResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 import uuid
 import asyncio
 import os
 from fastapi.staticfiles import StaticFiles
 import backend.job_processor as job_processor
-from backend.models.database import create_tables, get_db, engine, Base
-from backend.services.job_service import create_job, get_job, get_all_jobs, add_file_to_job
-from backend.utils.file_utils import save_upload_file
+from backend.models.database import create_tables, engine, Base
+from backend.models.schemas import JobSummary
+from backend.services.job_service import create_job, get_job_detail, get_job_summaries_page, count_jobs, add_file_to_job
+from backend.utils.file_utils import read_png_size, UploadTooLargeError
+from backend.services.admission import get_admission_controller, admit_job
+from backend.services.retention import get_retention_service
+from backend.services.thumbnails import get_thumbnail_service
+from backend.services.blob_store import get_blob_store
+from backend.services.upload_sessions import get_upload_session_manager
+from backend.services.object_storage import shutdown_publisher
+from backend.services.job_events import job_event_response
+from backend.config.settings import settings
+from backend.utils.async_db import run_db, run_in_session, shutdown_db_executor
+from backend.utils.async_fs import run_fs, find_first_existing, write_file_atomic, shutdown_fs_executor
+from backend.services.loop_monitor import get_loop_lag_monitor
+from backend.utils.pagination import InvalidCursorError
+from backend.utils.streaming import STREAM_PAGE_SIZE, iter_keyset_rows, ndjson_response
 from backend.api import job as job_api
 from backend.api import health as health_api
 from backend.api import dataset as dataset_api
+from backend.api import stats as stats_api
+from backend.api import upload as upload_api
 import logging
 import time
 import base64
@@ -102,6 +118,8 @@ JOBS = [
 app.include_router(health_api.router)
 app.include_router(job_api.router)
 app.include_router(dataset_api.router)
+app.include_router(stats_api.router)
+app.include_router(upload_api.router)
 
 # ジョブプロセッサの初期化
 job_processor.init_job_processor()
@@ -114,12 +132,18 @@ async def startup_event():
     """
     logger.info("アプリケーションを起動しています...")
     
+    # イベントループの遅延の計測を開始（ブロッキング処理の混入を検出する）
+    get_loop_lag_monitor().start()
+    
     # ストレージディレクトリの確認
     for dir_name in ["uploads", "datasets", "logs", "results", "temp", "chromium"]:
         dir_path = os.path.join(STORAGE_DIR, dir_name)
         os.makedirs(dir_path, exist_ok=True)
         logger.info(f"ストレージディレクトリの確認: {dir_path}")
     
+    # 前回の起動で残った期限切れの書きかけの分割アップロードを削除
+    get_upload_session_manager()
+    
     # Chromium管理システムの初期化
     try:
         from backend.dataset_generator import initialize_chromium_environment
@@ -130,6 +154,10 @@ async def startup_event():
         logger.error(f"Chromium初期化中にエラーが発生: {str(e)}")
         logger.info("エラーを無視して続行します")
     
+    # 終了済みジョブのアーカイブとデータベース保守の定期実行を開始
+    if settings.RETENTION_ENABLED:
+        get_retention_service().start()
+    
     logger.info("アプリケーションの起動が完了しました")
 
 @app.on_event("shutdown")
@@ -141,6 +169,17 @@ async def shutdown_event():
     # ジョブプロセッサの停止
     if hasattr(job_processor, "job_processor") and job_processor.job_processor is not None:
         job_processor.job_processor.stop_processor()
+    # 保持期間の処理を停止
+    get_retention_service().stop()
+    # サムネイル作成用スレッドプールの停止
+    get_thumbnail_service().shutdown()
+    # 成果物のアップロード用スレッドプールの停止
+    shutdown_publisher()
+    # イベントループの遅延の計測を停止
+    get_loop_lag_monitor().stop()
+    # データベース用・ファイル操作用スレッドプールの停止
+    shutdown_db_executor()
+    shutdown_fs_executor()
     logger.info("アプリケーションのシャットダウンが完了しました")
 
 @app.exception_handler(Exception)
@@ -183,69 +222,67 @@ def get_job_mock(job_id: str):
     raise HTTPException(status_code=404, detail="Job not found")
 
 # 実際のAPI実装
-@app.get("/api/jobs", tags=["jobs"])
-async def get_jobs_real(skip: int = 0, limit: int = 10, db = Depends(get_db)):
-    """すべてのジョブを取得する
+@app.get("/api/jobs", tags=["jobs"], response_model=List[JobSummary])
+async def get_jobs_real(response: Response, limit: int = 10, cursor: Optional[str] = None,
+                        status: Optional[str] = None, format: str = "json"):
+    """ジョブを新しい順に取得する
+
+    次ページのカーソルは X-Next-Cursor ヘッダー、総件数は X-Total-Count ヘッダーで返す。
+    format=ndjson を指定すると、cursor 以降の全ジョブを1行1件のNDJSONでストリーミングする
+    （limit は無視される）。
 
     Args:
-        skip: スキップするレコード数
+        response: レスポンス（ヘッダー設定用）
         limit: 取得するレコード数
-        db: データベースセッション
+        cursor: 前ページの X-Next-Cursor（先頭ページは省略）
+        status: ステータスで絞り込む場合に指定
+        format: 出力形式（json または ndjson）
 
     Returns:
         ジョブのリスト
     """
-    jobs = get_all_jobs(db, skip=skip, limit=limit)
-    return [
-        {
-            "job_id": job.job_id,
-            "status": job.status,
-            "submission_time": job.submission_time.isoformat(),
-            "start_time": job.start_time.isoformat() if job.start_time else None,
-            "end_time": job.end_time.isoformat() if job.end_time else None,
-            "error_message": job.error_message,
-        }
-        for job in jobs
-    ]
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail=f"未対応の出力形式です: {format}")
+
+    page_size = STREAM_PAGE_SIZE if format == "ndjson" else limit
+    try:
+        jobs, next_cursor = await run_in_session(get_job_summaries_page, limit=page_size, cursor=cursor, status=status)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "ndjson":
+        # 先頭ページは取得済みのものを流し、以降はページ単位で読みながら返す
+        def _stream_jobs():
+            yield from jobs
+            if next_cursor:
+                yield from iter_keyset_rows(
+                    lambda db, page_cursor: get_job_summaries_page(db, limit=STREAM_PAGE_SIZE, cursor=page_cursor, status=status),
+                    lambda job: job,
+                    cursor=next_cursor
+                )
+        return ndjson_response(_stream_jobs())
+    
+    response.headers["X-Total-Count"] = str(await run_in_session(count_jobs, status=status))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    return jobs
 
 @app.get("/api/jobs/{job_id}", tags=["jobs"])
-async def get_job_real(job_id: str, db = Depends(get_db)):
+async def get_job_real(job_id: str):
     """特定のジョブを取得する
 
     Args:
         job_id: ジョブID
-        db: データベースセッション
 
     Returns:
         ジョブの詳細情報
     """
-    job = get_job(db, job_id)
-    if not job:
+    job_detail = await run_in_session(get_job_detail, job_id)
+    if not job_detail:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return {
-        "job_id": job.job_id,
-        "status": job.status,
-        "submission_time": job.submission_time.isoformat(),
-        "start_time": job.start_time.isoformat() if job.start_time else None,
-        "end_time": job.end_time.isoformat() if job.end_time else None,
-        "error_message": job.error_message,
-        "files": [
-            {
-                "file_id": file.file_id,
-                "file_type": file.file_type,
-                "file_path": file.file_path,
-                "created_at": file.created_at.isoformat(),
-            }
-            for file in job.files
-        ],
-        "report": {
-            "report_id": job.report.report_id,
-            "evaluation_score": job.report.evaluation_score,
-            "report_data": job.report.report_data,
-            "created_at": job.report.created_at.isoformat(),
-        } if job.report else None,
-    }
+    return job_detail
 
 @app.get("/api/jobs/{job_id}/status", tags=["jobs"])
 async def get_job_status(job_id: str):
@@ -257,9 +294,28 @@ async def get_job_status(job_id: str):
     Returns:
         ジョブの処理状況
     """
-    status = await job_processor.check_job_status(job_id)
+    status = await run_db(job_processor.get_job_status, job_id)
     return status
 
+@app.get("/api/jobs/{job_id}/events", tags=["jobs"])
+async def get_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """ジョブの進捗を Server-Sent Events で配信する
+
+    状態が変わるたびに /status と同じ形式の一部（status, progress, message など）を送り、
+    ジョブが終了するとストリームを閉じる。再接続時は Last-Event-ID 以降のイベントから再開する。
+
+    Args:
+        job_id: ジョブID
+        last_event_id: 最後に受信したイベントID（ブラウザが自動で送る）
+
+    Returns:
+        イベントストリーム
+    """
+    response = await job_event_response(job_id, last_event_id)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return response
+
 @app.post("/api/jobs/{job_id}/process", tags=["jobs"])
 async def process_job(job_id: str, background_tasks: BackgroundTasks):
     """ジョブの処理を開始する
@@ -287,24 +343,22 @@ async def cancel_job(job_id: str):
     Returns:
         キャンセル結果
     """
-    success = job_processor.cancel_job(job_id)
-    if not success:
-        raise HTTPException(status_code=400, detail="Failed to cancel job")
+    result = await run_db(job_processor.cancel_job, job_id)
+    if not result.get("success"):
+        raise HTTPException(status_code=400, detail=result.get("message", "Failed to cancel job"))
     
     return {"success": True, "message": "Job cancelled", "job_id": job_id}
 
 @app.post("/api/upload", tags=["upload"])
 async def upload_file(
     file: UploadFile = File(...),
-    job_parameters: Optional[str] = Form(None),
-    db = Depends(get_db)
+    job_parameters: Optional[str] = Form(None)
 ):
     """VRMファイルをアップロードして処理ジョブを作成する
 
     Args:
         file: アップロードするVRMファイル
         job_parameters: ジョブパラメータ（JSON文字列）
-        db: データベースセッション
 
     Returns:
         作成されたジョブID
@@ -325,14 +379,24 @@ async def upload_file(
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Invalid job parameters: {str(e)}")
     
-    # ジョブ作成
-    db_job = create_job(db, job_id=job_id, job_parameters=parameters)
+    # 受付制御（混雑時は429を返してクライアント側で再試行させる）。
+    # このエンドポイントはジョブを記録するだけで処理を開始しないため、枠はアップロードの間だけ確保する
+    admission_token = admit_job(settings.ADMISSION_DEFAULT_JOB_SECONDS)
+    
+    # ファイル保存（チャンク単位で書き込み、上限を超えた時点で中断）
+    try:
+        content_hash, file_path, size, _ = await get_blob_store().ingest_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        get_admission_controller().release(admission_token)
     
-    # ファイル保存
-    file_path = await save_upload_file(file, job_id)
+    # ジョブ作成（入力ファイルはハッシュで保存したブロブを参照する）
+    db_job = await run_in_session(create_job, job_id=job_id, job_parameters=parameters,
+                                  file_path=file_path, content_hash=content_hash)
     
     # ファイル情報を保存
-    add_file_to_job(db, job_id, "upload", file_path)
+    await run_in_session(add_file_to_job, job_id, "upload", file_path, file.filename, size, content_hash)
     
     # ジョブを自動的に処理キューに登録（オプション）
     # job_processor.submit_job(job_id)
@@ -355,61 +419,67 @@ class ScreenshotData(BaseModel):
 # VRMファイルを返すエンドポイント
 @app.get("/vrm/{filename}")
 async def get_vrm_file(filename: str):
-    # 1. アップロードディレクトリから探す
-    vrm_path = os.path.join(STORAGE_DIR, "uploads", filename)
-    if os.path.exists(vrm_path):
-        logger.info(f"VRMファイルをアップロードディレクトリから提供: {vrm_path}")
-        return FileResponse(vrm_path)
+    # ハッシュで保存したブロブ（{sha256}.vrm）は探索せずにパスが決まり、内容も変わらない
+    blob_path = await run_fs(get_blob_store().find, filename)
+    if blob_path:
+        return FileResponse(blob_path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
     
-    # 2. job_idが含まれている場合はファイル名から元のファイル名を抽出して探す
+    # 以前の保存形式のファイル
+    # 探索順: 1. アップロードディレクトリ 2. job_id_filename.vrm の元のファイル名 3. プロジェクトルート
+    vrm_path = os.path.join(STORAGE_DIR, "uploads", filename)
+    alt_path = os.path.join(os.getcwd(), filename)
+    candidates = [vrm_path]
     if '_' in filename:
-        parts = filename.split('_', 1)
-        if len(parts) > 1:
-            original_filename = parts[1]  # job_id_filename.vrm からfilenameを抽出
-            original_path = os.path.join(STORAGE_DIR, "uploads", original_filename)
-            if os.path.exists(original_path):
-                logger.info(f"VRMファイルをオリジナル名で提供: {original_path}")
-                return FileResponse(original_path)
+        candidates.append(os.path.join(STORAGE_DIR, "uploads", filename.split('_', 1)[1]))
+    candidates.append(alt_path)
     
-    # 3. プロジェクトルートから探す
-    alt_path = os.path.join(os.getcwd(), filename)
-    if os.path.exists(alt_path):
-        logger.info(f"VRMファイルをプロジェクトルートから提供: {alt_path}")
-        return FileResponse(alt_path)
+    # 存在確認はまとめてスレッドプールで行う（イベントループを止めない）
+    found_path = await run_fs(find_first_existing, candidates)
+    if found_path:
+        logger.info(f"VRMファイルを提供: {found_path}")
+        return FileResponse(found_path)
     
-    # 4. エラー - ログに詳細を出力
+    # エラー - ログに詳細を出力
     logger.error(f"VRMファイル {filename} が見つかりません。検索パス: {vrm_path}, {alt_path}")
     raise HTTPException(status_code=404, detail=f"VRMファイル {filename} が見つかりません")
 
+def _write_screenshot(filepath: str, data_url: str) -> Optional[Tuple[int, int]]:
+    """Base64データURLのPNGを展開してファイルに書き込み、画像サイズを返す（run_fs から呼び出す）"""
+    _, base64_data = data_url.split(",", 1)
+    image_data = base64.b64decode(base64_data)
+    write_file_atomic(filepath, image_data)
+    return read_png_size(image_data)
+
 # スクリーンショット保存用のAPIエンドポイント
 @app.post("/api/screenshot")
 async def save_screenshot(data: ScreenshotData, job_id: str = Query(...)):
     try:
         # ジョブの存在確認
-        job = job_processor.get_job(job_id)
-        if not job:
+        job = await run_db(job_processor.get_job_status, job_id)
+        if job.get("status") == "not_found":
             raise HTTPException(status_code=404, detail=f"ジョブID {job_id} が見つかりません")
         
-        # ジョブディレクトリ作成
-        job_dir = os.path.join(SCREENSHOT_DIR, job_id)
-        os.makedirs(job_dir, exist_ok=True)
-        
-        # Base64データURLからPNGデータを抽出
-        _, base64_data = data.screenshot.split(",", 1)
-        image_data = base64.b64decode(base64_data)
-        
         # ファイル名生成 (expression_lighting_distance_angle.png)
         filename = f"{data.expression}_{data.lighting}_{data.distance}_{data.angle}.png"
-        filepath = os.path.join(job_dir, filename)
+        filepath = os.path.join(SCREENSHOT_DIR, job_id, filename)
         
-        # ファイル書き込み
-        with open(filepath, "wb") as f:
-            f.write(image_data)
+        # Base64の展開とファイル書き込み（ジョブディレクトリの作成を含む）はスレッドプールで行う
+        size = await run_fs(_write_screenshot, filepath, data.screenshot)
         
-        # 進捗更新 (イベントとして処理される)
-        job_processor.update_job_progress(job_id, {"captured": filename})
+        # ショット情報を記録（ショット検索APIから参照される）
+        try:
+            angle = int(float(data.angle))
+        except ValueError:
+            angle = None
+        await run_db(
+            job_processor.add_dataset_shot,
+            job_id, filename, filepath, data.expression, data.lighting, data.distance, angle,
+            size[0] if size else None, size[1] if size else None
+        )
         
         return {"success": True, "filename": filename}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"スクリーンショット保存エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"スクリーンショット保存に失敗しました: {str(e)}")
@@ -1,15 +1,21 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from sqlalchemy import Column, String, Float, Integer, ForeignKey, DateTime, Text, create_engine, Index, Boolean
+from sqlalchemy import Column, String, Float, Integer, ForeignKey, DateTime, Text, create_engine, Index, Boolean, text, event
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy.dialects.sqlite import JSON
 import os
 import datetime
 import uuid
 import json
 import logging
+from collections import defaultdict
+from typing import Optional, Dict, Tuple
+
+from backend.config.settings import settings
 
 # ロギング設定
 logger = logging.getLogger(__name__)
@@ -19,8 +25,57 @@ DB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.ab
 os.makedirs(DB_DIR, exist_ok=True)
 DB_PATH = os.path.join(DB_DIR, 'lora_platform.db')
 
+def create_db_engine(database_url: Optional[str] = None):
+    """SQLite用に調整したエンジンを作成する
+    
+    接続ごとにWALモード・synchronous=NORMAL・ビジータイムアウト・mmap・
+    キャッシュサイズのPRAGMAを設定し、ジョブ処理スレッドとAPIハンドラーから
+    同時に利用できるようスレッド間で共有するコネクションプールを構成する。
+    WALモードでは読み取りが書き込み中のトランザクションにブロックされない。
+    
+    Args:
+        database_url: データベースURL（省略時は設定値またはローカルのSQLiteファイル）
+        
+    Returns:
+        SQLAlchemyエンジン
+    """
+    database_url = database_url or settings.DATABASE_URL or f'sqlite:///{DB_PATH}'
+    
+    if not database_url.startswith("sqlite"):
+        return create_engine(database_url, pool_size=settings.DB_POOL_SIZE, max_overflow=settings.DB_MAX_OVERFLOW)
+    
+    db_engine = create_engine(
+        database_url,
+        connect_args={
+            "check_same_thread": False,  # プール経由で複数スレッドから利用する
+            "timeout": settings.DB_BUSY_TIMEOUT_MS / 1000
+        },
+        poolclass=QueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=30
+    )
+    
+    @event.listens_for(db_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """接続ごとにSQLiteのPRAGMAを設定"""
+        cursor = dbapi_connection.cursor()
+        try:
+            # 新規作成時のみ有効（既存DBは保守処理で一度だけ VACUUM して切り替える）
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={int(settings.DB_BUSY_TIMEOUT_MS)}")
+            cursor.execute(f"PRAGMA cache_size=-{int(settings.DB_CACHE_SIZE_KB)}")
+            cursor.execute(f"PRAGMA mmap_size={int(settings.DB_MMAP_SIZE_MB) * 1024 * 1024}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        finally:
+            cursor.close()
+    
+    return db_engine
+
 # SQLAlchemyエンジンとベースクラスの作成
-engine = create_engine(f'sqlite:///{DB_PATH}')
+engine = create_db_engine()
 Base = declarative_base()
 
 # セッションファクトリー
@@ -67,6 +122,9 @@ class Job(Base):
     job_parameters = Column(JSON, nullable=True)  # ジョブのパラメータ
     error_message = Column(Text, nullable=True)  # エラーメッセージ
     detailed_error = Column(Text, nullable=True)  # 詳細なエラー情報（トレースバックなど）
+    content_hash = Column(String, nullable=True)  # 入力ファイルのSHA-256ハッシュ
+    result_key = Column(String, nullable=True)  # 結果キャッシュキー（入力ハッシュ＋正規化パラメータ）
+    source_job_id = Column(String, nullable=True)  # 結果を共有する元ジョブのID
     
     # リレーションシップ
     files = relationship("File", back_populates="job", cascade="all, delete-orphan")
@@ -76,9 +134,17 @@ class Job(Base):
     
     # インデックス
     __table_args__ = (
-        Index('idx_job_status', status),
-        Index('idx_job_type', job_type),
-        Index('idx_job_submission_time', submission_time),
+        # 一覧取得（投入日時の降順＋ジョブIDのキーセット）をフィルタ条件ごとにインデックスで解決する
+        Index('idx_job_submission_order', submission_time, job_id),
+        Index('idx_job_status_submission', status, submission_time, job_id),
+        Index('idx_job_type_submission', job_type, submission_time, job_id),
+        Index('idx_job_type_status_submission', job_type, status, submission_time, job_id),
+        # 結果キャッシュの再利用判定と合流中ジョブの検索
+        # （同一キーの行は少ないため、ステータスは投入日時順に読みながら絞り込む）
+        Index('idx_job_result_key_submission', result_key, submission_time),
+        Index('idx_job_source_submission', source_job_id, submission_time),
+        # 共有する入力ファイル（ブロブ）の参照確認
+        Index('idx_job_file_path', file_path),
     )
     
     def to_dict(self):
@@ -95,7 +161,9 @@ class Job(Base):
             "progress": self.progress,
             "message": self.message,
             "parameters": json.loads(self.job_parameters) if isinstance(self.job_parameters, str) else self.job_parameters,
-            "error_message": self.error_message
+            "error_message": self.error_message,
+            "content_hash": self.content_hash,
+            "source_job_id": self.source_job_id
         }
 
 # ファイルモデル
@@ -109,6 +177,8 @@ class File(Base):
     file_name = Column(String, nullable=True)  # オリジナルのファイル名
     file_size = Column(Integer, nullable=True)  # ファイルサイズ（バイト）
     mime_type = Column(String, nullable=True)  # MIMEタイプ
+    content_hash = Column(String, nullable=True)  # ファイルのSHA-256ハッシュ（ダウンロード時のETag）
+    storage_key = Column(String, nullable=True)  # オブジェクトストレージ上のキー（アップロード済みの場合）
     created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
     
     # リレーションシップ
@@ -116,8 +186,10 @@ class File(Base):
     
     # インデックス
     __table_args__ = (
-        Index('idx_file_job_id', job_id),
+        Index('idx_file_job_type', job_id, file_type),
         Index('idx_file_type', file_type),
+        Index('idx_file_path', file_path),
+        Index('idx_file_storage_key', storage_key),
     )
     
     def to_dict(self):
@@ -130,6 +202,8 @@ class File(Base):
             "file_name": self.file_name,
             "file_size": self.file_size,
             "mime_type": self.mime_type,
+            "content_hash": self.content_hash,
+            "storage_key": self.storage_key,
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
 
@@ -234,9 +308,12 @@ class DatasetShot(Base):
     
     # インデックス
     __table_args__ = (
-        Index('idx_shot_job_id', job_id),
+        Index('idx_shot_job_attributes', job_id, expression, lighting, camera_distance, angle),
         Index('idx_shot_expression', expression),
         Index('idx_shot_angle', angle),
+        # ショット一覧の並び順（新しい順）
+        Index('idx_shot_created', created_at, shot_id),
+        Index('idx_shot_job_created', job_id, created_at, shot_id),
     )
     
     def to_dict(self):
@@ -255,6 +332,108 @@ class DatasetShot(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
 
+# ジョブ件数の集計モデル
+class JobStatusCounter(Base):
+    """ジョブタイプ・ステータス別のジョブ件数
+
+    jobs テーブルを変更するトランザクション内で after_flush フックにより更新し、
+    ダッシュボードの件数表示で jobs 全体を COUNT(*) しないようにする。
+    """
+    __tablename__ = "job_status_counters"
+
+    job_type = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        """集計情報を辞書として返す"""
+        return {
+            "job_type": self.job_type,
+            "status": self.status,
+            "count": self.count
+        }
+
+# 件数の増減を加算する UPSERT（SQLite 3.24 以降）
+_UPSERT_JOB_STATUS_COUNTER = text(
+    "INSERT INTO job_status_counters (job_type, status, count) VALUES (:job_type, :status, :delta) "
+    "ON CONFLICT (job_type, status) DO UPDATE SET count = count + excluded.count"
+)
+
+@event.listens_for(Job.status, "set", active_history=True)
+@event.listens_for(Job.job_type, "set", active_history=True)
+def _load_previous_job_state(target, value, oldvalue, initiator):
+    """変更前の値を必ずロードさせ、フラッシュ時に減算する集計キーを特定できるようにする"""
+    pass
+
+def _previous_job_key(job: Job) -> Tuple[str, str]:
+    """フラッシュ前の (job_type, status) を取得"""
+    state = sa_inspect(job)
+    values = []
+    for name in ("job_type", "status"):
+        history = state.attrs[name].history
+        if history.deleted:
+            values.append(history.deleted[0])
+        elif history.unchanged:
+            values.append(history.unchanged[0])
+        else:
+            values.append(getattr(job, name))
+    return values[0] or "lora", values[1] or "queued"
+
+@event.listens_for(SessionLocal, "after_flush")
+def _update_job_status_counters(session, flush_context):
+    """フラッシュされたジョブの追加・削除・ステータス変更を集計テーブルに反映"""
+    deltas: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    for obj in session.new:
+        if isinstance(obj, Job):
+            deltas[(obj.job_type or "lora", obj.status or "queued")] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Job):
+            deltas[_previous_job_key(obj)] -= 1
+
+    for obj in session.dirty:
+        if not isinstance(obj, Job) or obj in session.deleted:
+            continue
+        state = sa_inspect(obj)
+        if not (state.attrs.status.history.has_changes() or state.attrs.job_type.history.has_changes()):
+            continue
+        deltas[_previous_job_key(obj)] -= 1
+        deltas[(obj.job_type or "lora", obj.status or "queued")] += 1
+
+    apply_job_status_deltas(session.connection(), deltas)
+
+def apply_job_status_deltas(conn, deltas: Dict[Tuple[str, str], int]) -> None:
+    """(job_type, status) ごとの増減を集計テーブルに加算する
+
+    ORMを経由せずに jobs を変更する処理（アーカイブなど）は、
+    同じトランザクション内でこの関数を呼んで集計を合わせること。
+
+    Args:
+        conn: トランザクション中のコネクション
+        deltas: (job_type, status) -> 増減数
+    """
+    params = [
+        {"job_type": job_type, "status": status, "delta": delta}
+        for (job_type, status), delta in deltas.items()
+        if delta
+    ]
+    if params:
+        conn.execute(_UPSERT_JOB_STATUS_COUNTER, params)
+
+def rebuild_job_status_counters(conn) -> None:
+    """jobs テーブルから集計テーブルを再構築する
+
+    Args:
+        conn: トランザクション中のコネクション
+    """
+    conn.execute(text("DELETE FROM job_status_counters"))
+    conn.execute(text(
+        "INSERT INTO job_status_counters (job_type, status, count) "
+        "SELECT COALESCE(job_type, 'lora'), status, COUNT(*) FROM jobs "
+        "GROUP BY COALESCE(job_type, 'lora'), status"
+    ))
+
 # モデルの作成（必要な場合）
 def create_tables():
     """テーブルを作成"""
@@ -264,6 +443,17 @@ def create_tables():
     except Exception as e:
         logger.error(f"データベーステーブル作成中にエラーが発生しました: {str(e)}")
 
+# 複合インデックスに置き換えた単一カラムのインデックス
+OBSOLETE_INDEXES = [
+    "idx_job_status",
+    "idx_job_type",
+    "idx_job_submission_time",
+    "idx_job_result_key",
+    "idx_job_source_job_id",
+    "idx_file_job_id",
+    "idx_shot_job_id",
+]
+
 # マイグレーション関数
 def run_migrations():
     """データベースマイグレーションを実行"""
@@ -278,46 +468,48 @@ def run_migrations():
             
             if "job_type" not in jobs_columns:
                 # 既存のテーブルを変更するためのDDLを実行
-                with engine.connect() as conn:
-                    conn.execute("ALTER TABLE jobs ADD COLUMN job_type TEXT DEFAULT 'lora'")
+                with engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE jobs ADD COLUMN job_type TEXT DEFAULT 'lora'"))
                     logger.info("jobs テーブルに job_type カラムを追加しました")
             
             if "progress" not in jobs_columns:
-                with engine.connect() as conn:
-                    conn.execute("ALTER TABLE jobs ADD COLUMN progress INTEGER DEFAULT 0")
+                with engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE jobs ADD COLUMN progress INTEGER DEFAULT 0"))
                     logger.info("jobs テーブルに progress カラムを追加しました")
                     
             if "message" not in jobs_columns:
-                with engine.connect() as conn:
-                    conn.execute("ALTER TABLE jobs ADD COLUMN message TEXT")
+                with engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE jobs ADD COLUMN message TEXT"))
                     logger.info("jobs テーブルに message カラムを追加しました")
                     
             if "result_path" not in jobs_columns:
-                with engine.connect() as conn:
-                    conn.execute("ALTER TABLE jobs ADD COLUMN result_path TEXT")
+                with engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE jobs ADD COLUMN result_path TEXT"))
                     logger.info("jobs テーブルに result_path カラムを追加しました")
                     
             if "file_path" not in jobs_columns:
-                with engine.connect() as conn:
-                    conn.execute("ALTER TABLE jobs ADD COLUMN file_path TEXT")
+                with engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE jobs ADD COLUMN file_path TEXT"))
                     logger.info("jobs テーブルに file_path カラムを追加しました")
                     
             if "detailed_error" not in jobs_columns:
-                with engine.connect() as conn:
-                    conn.execute("ALTER TABLE jobs ADD COLUMN detailed_error TEXT")
+                with engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE jobs ADD COLUMN detailed_error TEXT"))
                     logger.info("jobs テーブルに detailed_error カラムを追加しました")
+            
+            for column_name in ["content_hash", "result_key", "source_job_id"]:
+                if column_name not in jobs_columns:
+                    with engine.begin() as conn:
+                        conn.execute(text(f"ALTER TABLE jobs ADD COLUMN {column_name} TEXT"))
+                        logger.info(f"jobs テーブルに {column_name} カラムを追加しました")
         
-        # 既存のテーブルにインデックスを追加
-        try:
-            with engine.connect() as conn:
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_job_status ON jobs(status)")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_job_type ON jobs(job_type)")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_job_submission_time ON jobs(submission_time)")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_file_job_id ON files(job_id)")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_file_type ON files(file_type)")
-                logger.info("既存のテーブルにインデックスを追加しました")
-        except Exception as e:
-            logger.warning(f"インデックス作成中にエラーが発生しました（既に存在する可能性があります）: {str(e)}")
+        if "files" in inspector.get_table_names():
+            files_columns = [col["name"] for col in inspector.get_columns("files")]
+            for column_name in ["content_hash", "storage_key"]:
+                if column_name not in files_columns:
+                    with engine.begin() as conn:
+                        conn.execute(text(f"ALTER TABLE files ADD COLUMN {column_name} TEXT"))
+                        logger.info(f"files テーブルに {column_name} カラムを追加しました")
         
         # 新しいテーブルを作成
         if "dataset_metadata" not in inspector.get_table_names():
@@ -328,6 +520,29 @@ def run_migrations():
             DatasetShot.__table__.create(engine)
             logger.info("dataset_shots テーブルを作成しました")
         
+        # 既存のテーブルにモデルで定義したインデックスを追加し、置き換え済みのものを削除
+        try:
+            with engine.begin() as conn:
+                for table in (Job.__table__, File.__table__, DatasetShot.__table__):
+                    for index in table.indexes:
+                        index.create(conn, checkfirst=True)
+                for index_name in OBSOLETE_INDEXES:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+            logger.info("既存のテーブルのインデックスを更新しました")
+        except Exception as e:
+            logger.warning(f"インデックス更新中にエラーが発生しました: {str(e)}")
+        
+        # ジョブ件数の集計テーブルを作成し、jobs テーブルとの差分をなくす
+        if "job_status_counters" not in inspector.get_table_names():
+            JobStatusCounter.__table__.create(engine)
+            logger.info("job_status_counters テーブルを作成しました")
+        try:
+            with engine.begin() as conn:
+                rebuild_job_status_counters(conn)
+            logger.info("ジョブ件数の集計テーブルを再構築しました")
+        except Exception as e:
+            logger.warning(f"ジョブ件数の集計テーブルの再構築中にエラーが発生しました: {str(e)}")
+        
         logger.info("データベースマイグレーションが完了しました")
         
     except Exception as e:
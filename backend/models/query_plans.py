@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""主要クエリの実行計画チェック
+
+job_processor.py と services/job_service.py の主要なクエリを一時データベースで実行し、
+発行されたSQLの EXPLAIN QUERY PLAN がインデックスを使っていること、
+テーブルの全件走査や一時B-treeによるソートを含まないことを確認する。
+
+使い方:
+    python -m backend.models.query_plans
+"""
+
+import os
+import re
+import sys
+import logging
+import tempfile
+import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from sqlalchemy import create_engine, event, func, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from backend.models.database import Base, Job, File, DatasetMetadata, DatasetShot
+from backend.services import job_service, shot_service
+from backend.services.retention import select_expired_job_ids
+from backend.services.blob_store import find_referenced_blobs
+from backend.services.object_storage import find_referenced_objects
+from backend.utils.pagination import encode_cursor
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# インデックスを使わない全件走査（"SCAN jobs" / 旧形式 "SCAN TABLE jobs"）
+FULL_SCAN_PATTERN = re.compile(r"^SCAN (TABLE )?\w+$")
+# ORDER BY / GROUP BY のための一時B-tree
+TEMP_BTREE_PATTERN = re.compile(r"USE TEMP B-TREE")
+
+# 実行計画の確認用に投入するジョブ数（統計情報を実運用に近づけるため）
+SEED_JOB_COUNT = 2000
+
+def _seed_jobs(plan_engine, count: int = SEED_JOB_COUNT) -> None:
+    """完了済みが大半を占める実運用に近い分布でジョブを投入し、統計情報を収集する"""
+    statuses = ["completed"] * 16 + ["error", "cancelled", "queued", "processing"]
+    now = datetime.datetime.now()
+    rows = [
+        {
+            "job_id": f"seed-{i:06d}",
+            "job_type": "dataset" if i % 3 else "lora",
+            "status": statuses[i % len(statuses)],
+            "submission_time": now - datetime.timedelta(minutes=i),
+            "progress": 0,
+            "result_key": f"{i % 200:064x}",  # 同一条件での再投入を想定して1キーあたり10件
+            "source_job_id": f"seed-{i - 1:06d}" if i % 10 == 0 else None
+        }
+        for i in range(count)
+    ]
+    with plan_engine.begin() as conn:
+        conn.execute(Job.__table__.insert(), rows)
+        conn.execute(text("ANALYZE"))
+
+def _sample_cursor() -> str:
+    """2ページ目以降の取得に使うカーソル"""
+    return encode_cursor(datetime.datetime.now(), "00000000-0000-0000-0000-000000000000")
+
+def _find_reusable_job(db: Session) -> Any:
+    from backend.job_processor import _find_reusable_job as find_reusable_job
+    return find_reusable_job(db, "0" * 64)
+
+def _find_followers(db: Session) -> Any:
+    from backend.job_processor import _find_followers as find_followers
+    return find_followers(db, "source-job")
+
+# チェック対象のクエリ（名前, セッションを受け取ってクエリを実行する関数）
+HOT_QUERIES: List[Tuple[str, Callable[[Session], Any]]] = [
+    ("ジョブ一覧（先頭ページ）",
+     lambda db: job_service.get_jobs_page(db, limit=50)),
+    ("ジョブ一覧（カーソル指定）",
+     lambda db: job_service.get_jobs_page(db, limit=50, cursor=_sample_cursor())),
+    ("ジョブ一覧（ステータス指定）",
+     lambda db: job_service.get_jobs_page(db, limit=50, cursor=_sample_cursor(), status="queued")),
+    ("ジョブ一覧（ジョブタイプ指定）",
+     lambda db: job_service.get_jobs_page(db, limit=50, cursor=_sample_cursor(), job_type="dataset")),
+    ("ジョブ一覧（ジョブタイプ・ステータス指定）",
+     lambda db: job_service.get_jobs_page(db, limit=50, cursor=_sample_cursor(), job_type="dataset", status="completed")),
+    ("ジョブ取得",
+     lambda db: job_service.get_job(db, "job-id")),
+    ("結果キャッシュの再利用判定",
+     _find_reusable_job),
+    ("合流中ジョブの取得",
+     _find_followers),
+    ("保持期間を過ぎたジョブの抽出",
+     lambda db: select_expired_job_ids(db.connection(), datetime.datetime.now() - datetime.timedelta(days=30), 200)),
+    ("未完了ジョブの復旧",
+     lambda db: db.query(Job).filter(Job.status.in_(["queued", "processing"])).all()),
+    ("データセットメタデータの取得",
+     lambda db: db.query(DatasetMetadata).filter(DatasetMetadata.job_id == "job-id").first()),
+    ("ジョブのファイル取得（種別指定）",
+     lambda db: db.query(File).filter(File.job_id == "job-id", File.file_type == "result").all()),
+    ("データセットショットの検索",
+     lambda db: db.query(DatasetShot).filter(
+         DatasetShot.job_id == "job-id",
+         DatasetShot.expression == "Happy",
+         DatasetShot.lighting == "Normal",
+         DatasetShot.camera_distance == "Close-up",
+         DatasetShot.angle == 90
+     ).all()),
+    ("ショット一覧",
+     lambda db: shot_service.query_shots(db, limit=50, cursor=_sample_cursor())),
+    ("ショット一覧（ジョブ指定）",
+     lambda db: shot_service.query_shots(db, job_id="job-id", limit=50, cursor=_sample_cursor())),
+    ("ショットを所有するジョブの解決",
+     lambda db: shot_service.resolve_shot_job_id(db, "job-id")),
+    ("コンタクトシートの鮮度確認（ショット数）",
+     lambda db: db.query(func.count(DatasetShot.shot_id)).filter(DatasetShot.job_id == "job-id").scalar()),
+    ("ショット画像の取得",
+     lambda db: shot_service.get_shot_image_source(db, "shot-id")),
+    ("撮影中のショットの追跡",
+     lambda db: shot_service.query_new_shots(db, "job-id", since=datetime.datetime.now(), limit=200)),
+    ("データセットジョブ一覧",
+     lambda db: job_service.get_dataset_jobs_page(db, limit=50, cursor=_sample_cursor())),
+    ("データセットジョブ一覧（ステータス指定）",
+     lambda db: job_service.get_dataset_jobs_page(db, limit=50, cursor=_sample_cursor(), status="completed")),
+    ("ブロブの参照確認",
+     lambda db: find_referenced_blobs(db.connection(), ["/blobs/ab/ab.vrm", "/blobs/cd/cd.vrm"])),
+    ("オブジェクトストレージ上の成果物の参照確認",
+     lambda db: find_referenced_objects(db.connection(), ["results/ab/a.zip", "results/cd/c.zip"])),
+    ("成果物のオブジェクトキーの取得",
+     lambda db: db.query(File.content_hash, File.storage_key).filter(
+         File.job_id == "job-id", File.file_type == "result"
+     ).first()),
+]
+
+def find_plan_violations(plan_details: List[str]) -> List[str]:
+    """実行計画から全件走査・一時B-treeソート・インデックス未使用を検出する
+
+    Args:
+        plan_details: EXPLAIN QUERY PLAN の detail 列
+
+    Returns:
+        検出した問題の一覧（問題がなければ空）
+    """
+    violations = []
+    for detail in plan_details:
+        if FULL_SCAN_PATTERN.match(detail):
+            violations.append(f"全件走査: {detail}")
+        if TEMP_BTREE_PATTERN.search(detail):
+            violations.append(f"一時B-treeによるソート: {detail}")
+    if not any("USING" in detail for detail in plan_details):
+        violations.append("インデックスを使用していません")
+    return violations
+
+def check_query_plans() -> List[Dict[str, Any]]:
+    """主要クエリの実行計画を一時データベースで確認する
+
+    Returns:
+        クエリごとの name, sql, plan, violations を含む辞書のリスト
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        plan_engine = create_engine(f"sqlite:///{os.path.join(temp_dir, 'plans.db')}")
+        Base.metadata.create_all(bind=plan_engine)
+        _seed_jobs(plan_engine)
+        PlanSession = sessionmaker(bind=plan_engine)
+
+        captured: List[Tuple[str, Any]] = []
+
+        @event.listens_for(plan_engine, "before_cursor_execute")
+        def _capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                captured.append((statement, parameters))
+
+        raw_connection = plan_engine.raw_connection()
+        try:
+            for name, run_query in HOT_QUERIES:
+                captured.clear()
+                db = PlanSession()
+                try:
+                    run_query(db)
+                finally:
+                    db.close()
+
+                for statement, parameters in captured:
+                    cursor = raw_connection.cursor()
+                    cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                    plan = [row[-1] for row in cursor.fetchall()]
+                    cursor.close()
+                    results.append({
+                        "name": name,
+                        "sql": " ".join(statement.split()),
+                        "plan": plan,
+                        "violations": find_plan_violations(plan)
+                    })
+        finally:
+            raw_connection.close()
+            plan_engine.dispose()
+
+    return results
+
+def main() -> int:
+    """実行計画を表示し、問題があれば終了コード1を返す"""
+    results = check_query_plans()
+    failed = 0
+    for result in results:
+        status = "NG" if result["violations"] else "OK"
+        print(f"[{status}] {result['name']}")
+        for detail in result["plan"]:
+            print(f"    {detail}")
+        if result["violations"]:
+            failed += 1
+            print(f"    SQL: {result['sql']}")
+            for violation in result["violations"]:
+                print(f"    -> {violation}")
+
+    print(f"\n{len(results)} 件中 {failed} 件のクエリに問題があります" if failed else f"\n{len(results)} 件のクエリはすべてインデックスを使用しています")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
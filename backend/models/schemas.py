@@ -27,6 +27,35 @@ class JobResponse(JobBase):
     class Config:
         from_attributes = True
 
+class JobSummary(BaseModel):
+    """ジョブ一覧の1件分（一覧表示用の列だけ）"""
+    job_id: str
+    job_type: Optional[str] = None
+    status: str
+    submission_time: datetime
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    error_message: Optional[str] = None
+
+class DatasetJobSummary(BaseModel):
+    """データセットジョブ一覧の1件分"""
+    job_id: str
+    status: str
+    progress: Optional[int] = None
+    message: Optional[str] = None
+    submission_time: datetime
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    error_message: Optional[str] = None
+    total_shots: Optional[int] = None
+    completed_shots: Optional[int] = None
+
+class DatasetJobListResponse(BaseModel):
+    """データセットジョブ一覧のレスポンス"""
+    jobs: List[DatasetJobSummary]
+    count: int
+    next_cursor: Optional[str] = None
+
 class JobStatus(BaseModel):
     """ジョブステータス取得用スキーマ"""
     job_id: str
@@ -54,6 +83,29 @@ class FileResponse(FileBase):
     class Config:
         from_attributes = True
 
+# ショット関連のスキーマ
+
+class ShotSummary(BaseModel):
+    """ショット検索結果の1件分（ファイルの保存先パスは含めない）"""
+    shot_id: str
+    job_id: str
+    file_name: str
+    expression: Optional[str] = None
+    lighting: Optional[str] = None
+    camera_distance: Optional[str] = None
+    angle: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    created_at: datetime
+    image_url: str
+    thumbnail_url: str
+
+class ShotListResponse(BaseModel):
+    """ショット検索のレスポンス"""
+    shots: List[ShotSummary]
+    count: int
+    next_cursor: Optional[str] = None
+
 # 評価レポート関連のスキーマ
 
 class EvaluationReportBase(BaseModel):
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+import uuid
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+from fastapi import HTTPException
+
+from backend.config.settings import settings
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# グローバル変数
+_controller = None
+_controller_lock = threading.Lock()
+
+# 実測値で推定時間を補正する際の平滑化係数と補正倍率の範囲
+CALIBRATION_ALPHA = 0.2
+CALIBRATION_MIN = 0.1
+CALIBRATION_MAX = 20.0
+
+class AdmissionController:
+    """キューの深さと推定バックログ時間に基づく受付制御
+
+    受け付けたジョブの推定処理時間（補正前）を保持し、ジョブの完了時に
+    実測の処理時間との比率から補正倍率を更新する。上限を超える投入は
+    拒否し、バックログが解消するまでの目安を Retry-After として返す。
+    """
+
+    def __init__(self, max_queue_depth: int, max_backlog_seconds: int, worker_slots: int):
+        self.max_queue_depth = max_queue_depth
+        self.max_backlog_seconds = max_backlog_seconds
+        self.worker_slots = max(1, worker_slots)
+        self._pending: Dict[str, float] = {}  # job_id -> 補正前の推定処理時間（秒）
+        self._calibration = 1.0
+        self._samples = 0
+        self._lock = threading.Lock()
+
+    def calibration_factor(self) -> float:
+        """推定処理時間の補正倍率（実測 / 推定）"""
+        with self._lock:
+            return self._calibration
+
+    def calibrate(self, estimated_seconds: float) -> float:
+        """補正前の推定処理時間を実測に基づいて補正する"""
+        return estimated_seconds * self.calibration_factor()
+
+    def queue_depth(self) -> int:
+        """受け付け済みで未完了のジョブ数"""
+        with self._lock:
+            return len(self._pending)
+
+    def backlog_seconds(self) -> float:
+        """未完了のジョブをすべて処理し終えるまでの推定時間（秒）"""
+        with self._lock:
+            return sum(self._pending.values()) * self._calibration / self.worker_slots
+
+    def check(self, estimated_seconds: float) -> Dict[str, Any]:
+        """新しいジョブを受け付けられるか判定する（枠は確保しない）
+
+        Args:
+            estimated_seconds: 新しいジョブの補正前の推定処理時間（秒）
+
+        Returns:
+            admitted（受付可否）, retry_after（再試行までの秒数）, message を含む辞書
+        """
+        with self._lock:
+            return self._decide(estimated_seconds)
+
+    def try_reserve(self, token: str, estimated_seconds: float) -> Dict[str, Any]:
+        """受け付けられるか判定し、受け付ける場合は同じロックの中で仮の枠を確保する
+
+        判定と確保の間に他のリクエストが割り込まないため、アップロード中の同時投入が
+        まとめて判定を通過することはない。確保した枠はジョブの登録時に rebind で
+        ジョブIDへ付け替え、登録しなかった場合は release で解放する。
+
+        Args:
+            token: 仮の枠を識別する文字列
+            estimated_seconds: 新しいジョブの補正前の推定処理時間（秒）
+
+        Returns:
+            check と同じ辞書
+        """
+        with self._lock:
+            decision = self._decide(estimated_seconds)
+            if decision["admitted"]:
+                self._pending[token] = float(estimated_seconds)
+            return decision
+
+    def _decide(self, estimated_seconds: float) -> Dict[str, Any]:
+        """受付可否を判定する（self._lock を取得した状態で呼び出す）"""
+        depth = len(self._pending)
+        backlog = sum(self._pending.values()) * self._calibration / self.worker_slots
+        incoming = estimated_seconds * self._calibration / self.worker_slots
+
+        if depth >= self.max_queue_depth:
+            # 1ジョブ分が捌けるまでの時間を目安にする
+            wait_seconds = backlog / depth if depth else 1
+            message = f"キューが混雑しています（待機中 {depth} 件）"
+        elif backlog + incoming > self.max_backlog_seconds:
+            wait_seconds = backlog + incoming - self.max_backlog_seconds
+            message = f"処理待ちの推定時間が上限を超えています（約 {int(backlog / 60)} 分）"
+        else:
+            return {"admitted": True, "retry_after": 0, "message": "受付可能です"}
+
+        retry_after = int(min(max(math.ceil(wait_seconds), 1), 3600))
+        logger.warning(f"ジョブの受付を拒否しました: {message}, Retry-After: {retry_after}秒")
+        return {"admitted": False, "retry_after": retry_after, "message": message}
+
+    def reserve(self, job_id: str, estimated_seconds: Optional[float] = None) -> None:
+        """受け付けたジョブをバックログに追加する
+
+        Args:
+            job_id: ジョブID
+            estimated_seconds: 補正前の推定処理時間（秒）。省略時はデフォルト値
+        """
+        if estimated_seconds is None:
+            estimated_seconds = settings.ADMISSION_DEFAULT_JOB_SECONDS
+        with self._lock:
+            self._pending[job_id] = float(estimated_seconds)
+
+    def rebind(self, token: str, job_id: str, estimated_seconds: Optional[float] = None) -> None:
+        """仮の枠を登録したジョブに付け替える（枠がない場合は新たに確保する）
+
+        Args:
+            token: try_reserve で確保した仮の枠
+            job_id: ジョブID
+            estimated_seconds: 補正前の推定処理時間（秒）。省略時は仮の枠の値
+        """
+        with self._lock:
+            reserved_seconds = self._pending.pop(token, None)
+            if estimated_seconds is None:
+                estimated_seconds = reserved_seconds or settings.ADMISSION_DEFAULT_JOB_SECONDS
+            self._pending[job_id] = float(estimated_seconds)
+
+    def release(self, job_id: str, actual_seconds: Optional[float] = None) -> None:
+        """終了したジョブをバックログから除き、実測時間で補正倍率を更新する
+
+        Args:
+            job_id: ジョブID
+            actual_seconds: 実際の処理時間（秒）。完了した場合のみ指定
+        """
+        with self._lock:
+            estimated_seconds = self._pending.pop(job_id, None)
+            if not estimated_seconds or actual_seconds is None or actual_seconds <= 0:
+                return
+
+            ratio = min(max(actual_seconds / estimated_seconds, CALIBRATION_MIN), CALIBRATION_MAX)
+            if self._samples == 0:
+                self._calibration = ratio
+            else:
+                self._calibration = (1 - CALIBRATION_ALPHA) * self._calibration + CALIBRATION_ALPHA * ratio
+            self._samples += 1
+            logger.info(f"推定処理時間の補正倍率を更新しました: {self._calibration:.2f} (サンプル数: {self._samples})")
+
+    def stats(self) -> Dict[str, Any]:
+        """受付制御の状態を返す"""
+        with self._lock:
+            return {
+                "queue_depth": len(self._pending),
+                "backlog_seconds": round(sum(self._pending.values()) * self._calibration / self.worker_slots, 1),
+                "calibration_factor": round(self._calibration, 3),
+                "calibration_samples": self._samples,
+                "max_queue_depth": self.max_queue_depth,
+                "max_backlog_seconds": self.max_backlog_seconds
+            }
+
+def get_admission_controller() -> AdmissionController:
+    """プロセス共通の受付制御を取得"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(
+                max_queue_depth=settings.ADMISSION_MAX_QUEUE_DEPTH,
+                max_backlog_seconds=settings.ADMISSION_MAX_BACKLOG_SECONDS,
+                worker_slots=settings.MAX_CONCURRENT_JOBS
+            )
+        return _controller
+
+def admit_job(estimated_seconds: float, reserve: bool = True) -> Optional[str]:
+    """ジョブの受付制御を行い、混雑時は429を送出する
+
+    reserve=True の場合は判定と同時に仮の枠を確保し、そのトークンを返す。呼び出し元は
+    add_job に admission_token として渡し、最後に必ず release(トークン) を呼ぶこと
+    （ジョブに付け替え済みの場合は何もしない）。
+
+    Args:
+        estimated_seconds: 新しいジョブの補正前の推定処理時間（秒）
+        reserve: 仮の枠を確保する場合はTrue（判定だけの場合はFalse）
+
+    Returns:
+        仮の枠のトークン（reserve=False の場合はNone）
+
+    Raises:
+        HTTPException: 受け付けられない場合（429、Retry-After ヘッダー付き）
+    """
+    controller = get_admission_controller()
+    token = f"admission-{uuid.uuid4()}" if reserve else None
+    admission = controller.try_reserve(token, estimated_seconds) if reserve else controller.check(estimated_seconds)
+    if not admission["admitted"]:
+        raise HTTPException(
+            status_code=429,
+            detail=admission["message"],
+            headers={"Retry-After": str(admission["retry_after"])}
+        )
+    return token
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import time
+import uuid
+import logging
+import threading
+from typing import Optional, Dict, Any, Iterable, Set, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.config.settings import settings
+from backend.models.database import Job, File
+from backend.services.result_cache import compute_file_hash
+from backend.utils.async_fs import run_fs
+from backend.utils.file_utils import stream_upload_to_file
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# グローバル変数
+_blob_store = None
+_blob_store_lock = threading.Lock()
+
+# 書き込み途中のファイルを置くディレクトリ（ストアと同じファイルシステム上に置き、移動を原子的にする）
+TEMP_DIR_NAME = "tmp"
+
+# この時間より古い書きかけのファイルは異常終了の残骸とみなして削除する（秒）
+STALE_TEMP_SECONDS = 24 * 3600
+
+# ブロブのファイル名（ハッシュ＋拡張子）
+BLOB_NAME_PATTERN = re.compile(r"^([0-9a-f]{64})(\.[A-Za-z0-9]{1,10})?$")
+
+def normalize_suffix(filename: Optional[str]) -> str:
+    """クライアントのファイル名からブロブの拡張子を決める（小文字に揃える）"""
+    suffix = os.path.splitext(filename or "")[1].lower()
+    return suffix if re.fullmatch(r"\.[a-z0-9]{1,10}", suffix) else ""
+
+class BlobStore:
+    """SHA-256をキーとするコンテンツアドレス型のファイルストア
+
+    ファイルは {root}/{ハッシュ先頭2文字}/{ハッシュ}{拡張子} に1つだけ保存し、同じ内容の
+    アップロードは保存済みのファイルを共有する。ジョブは jobs.content_hash と file_path で
+    ブロブを参照するため、ハッシュが分かれば探索せずにパスが決まる。
+    削除はジョブの保持期間の処理が行い、参照が残っているブロブは削除しない。
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.temp_dir = os.path.join(self.root, TEMP_DIR_NAME)
+        self._lock = threading.Lock()
+        # 取り込み時の存在確認・配置と、取り込みに失敗したブロブの削除を直列化する
+        self._ref_lock = threading.Lock()
+        # 保存後に別の取り込みが同じ内容として共有したブロブ（取り込みの失敗時にも削除しない）
+        self._shared: Set[str] = set()
+        self.stored = 0
+        self.deduplicated = 0
+        self.bytes_saved = 0
+
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self._remove_stale_temp_files()
+
+    def _remove_stale_temp_files(self) -> None:
+        """異常終了で残った書きかけのファイルを削除する"""
+        threshold = time.time() - STALE_TEMP_SECONDS
+        for entry in os.scandir(self.temp_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < threshold:
+                    os.remove(entry.path)
+            except OSError:
+                continue
+
+    def blob_path(self, content_hash: str, suffix: str = "") -> str:
+        """ハッシュに対応するブロブのパス（存在するかは確認しない）"""
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}{suffix}")
+
+    def find(self, blob_name: str) -> Optional[str]:
+        """ブロブのファイル名（ハッシュ＋拡張子）からパスを返す（存在しない場合はNone）"""
+        match = BLOB_NAME_PATTERN.match(blob_name)
+        if not match:
+            return None
+        path = self.blob_path(match.group(1), match.group(2) or "")
+        return path if os.path.isfile(path) else None
+
+    def contains(self, path: Optional[str]) -> bool:
+        """パスがこのストアのブロブか"""
+        if not path:
+            return False
+        path = os.path.abspath(path)
+        return path.startswith(self.root + os.sep) and not path.startswith(self.temp_dir + os.sep)
+
+    def new_temp_path(self) -> str:
+        """書き込み途中のファイルのパスを払い出す"""
+        return os.path.join(self.temp_dir, f"{uuid.uuid4().hex}.part")
+
+    def put_file(self, src_path: str, content_hash: Optional[str] = None, suffix: str = "") -> Tuple[str, str, bool]:
+        """ファイルをストアへ移動する（同じ内容が保存済みの場合は移動せずに削除する）
+
+        Args:
+            src_path: 取り込むファイルのパス（ストアと同じファイルシステム上にあること）
+            content_hash: ファイルのSHA-256ハッシュ（省略時は計算する）
+            suffix: ブロブの拡張子
+
+        Returns:
+            (ハッシュ, ブロブのパス, 新たに保存したか) のタプル
+        """
+        if content_hash is None:
+            content_hash = compute_file_hash(src_path)
+        path = self.blob_path(content_hash, suffix)
+
+        with self._ref_lock:
+            created = not os.path.isfile(path)
+            if created:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # 同じ内容を同時に取り込んだ場合も、置き換えは原子的で内容も同じため問題ない
+                os.replace(src_path, path)
+                self._shared.discard(path)
+            else:
+                self._shared.add(path)
+
+        if not created:
+            size = os.path.getsize(src_path)
+            os.remove(src_path)
+            with self._lock:
+                self.deduplicated += 1
+                self.bytes_saved += size
+            logger.info(f"同じ内容のファイルが保存済みのため共有します: {content_hash}")
+            return content_hash, path, False
+
+        with self._lock:
+            self.stored += 1
+        return content_hash, path, True
+
+    async def ingest_upload(self, upload_file: UploadFile, max_bytes: Optional[int] = None) -> Tuple[str, str, int, bool]:
+        """アップロードをハッシュを計算しながら書き込み、ストアへ取り込む
+
+        Args:
+            upload_file: アップロードされたファイル
+            max_bytes: サイズ上限（バイト、Noneの場合は設定値）
+
+        Returns:
+            (SHA-256ハッシュ, ブロブのパス, サイズ, 新たに保存したか) のタプル
+
+        Raises:
+            UploadTooLargeError: サイズ上限を超えた場合
+        """
+        temp_path = self.new_temp_path()
+        size, content_hash = await stream_upload_to_file(upload_file, temp_path, max_bytes=max_bytes)
+        _, path, created = await run_fs(self.put_file, temp_path, content_hash, normalize_suffix(upload_file.filename))
+        return content_hash, path, size, created
+
+    def stats(self) -> Dict[str, Any]:
+        """取り込みの状況"""
+        with self._lock:
+            return {
+                "stored": self.stored,
+                "deduplicated": self.deduplicated,
+                "bytes_saved": self.bytes_saved
+            }
+
+def find_referenced_blobs(conn, paths: Iterable[str]) -> Set[str]:
+    """ジョブまたはファイルから参照されているブロブのパスを返す
+
+    Args:
+        conn: データベース接続（セッションの場合は db.connection()）
+        paths: 確認するブロブのパス
+
+    Returns:
+        参照が残っているパスの集合
+    """
+    paths = list(set(paths))
+    if not paths:
+        return set()
+    referenced = {row[0] for row in conn.execute(select(Job.file_path).where(Job.file_path.in_(paths)))}
+    referenced.update(row[0] for row in conn.execute(select(File.file_path).where(File.file_path.in_(paths))))
+    return referenced
+
+def remove_unreferenced_blob(db: Session, path: Optional[str], created: bool = True) -> bool:
+    """どのジョブ・ファイルからも参照されていないブロブを削除する
+
+    ジョブの作成に失敗した場合など、取り込んだブロブを破棄する際に使う。
+    保存済みのブロブを共有しただけの場合や、保存後に別の取り込みが共有した場合は、
+    まだジョブを記録していないその取り込みのために削除しない。同じ内容の別のジョブが
+    参照している場合も削除しない。
+
+    Args:
+        db: データベースセッション
+        path: ブロブのパス
+        created: この取り込みでブロブを新たに保存した場合はTrue（put_file の戻り値）
+
+    Returns:
+        削除した場合はTrue
+    """
+    blob_store = get_blob_store()
+    if not created or not blob_store.contains(path):
+        return False
+    # 存在確認から削除までの間に別の取り込みが共有しないよう、取り込みと直列化する
+    with blob_store._ref_lock:
+        if path in blob_store._shared or find_referenced_blobs(db.connection(), [path]):
+            return False
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+def get_blob_store() -> BlobStore:
+    """ブロブストアのシングルトンインスタンスを取得"""
+    global _blob_store
+
+    with _blob_store_lock:
+        if _blob_store is None:
+            _blob_store = BlobStore(settings.BLOB_STORE_DIR)
+        return _blob_store
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import zipfile
+import logging
+import asyncio
+import datetime
+from typing import IO, Optional, Dict, Any, Iterator, AsyncIterator, Tuple
+
+from backend.config.settings import settings
+from backend.models.database import Job, DatasetMetadata
+from backend.services.job_events import get_job_event_bus, TERMINAL_STATUSES
+from backend.services.shot_service import query_shots, query_new_shots, resolve_shot_job_id, DATASET_ARCHIVE_DIR
+from backend.utils.async_db import run_in_session
+from backend.utils.async_fs import run_fs
+from backend.utils.streaming import STREAM_PAGE_SIZE, iter_keyset_rows
+from backend.utils.zip_stream import ZipStreamWriter
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# データセットZIP内のメタデータファイル
+METADATA_MEMBER = f"{DATASET_ARCHIVE_DIR}/metadata.json"
+
+# 撮影中のデータセットの内容を記したマニフェスト
+MANIFEST_MEMBER = f"{DATASET_ARCHIVE_DIR}/manifest.json"
+
+# 新しいショットを問い合わせる際に登録時刻をさかのぼる幅（コミット順と登録時刻のずれを吸収する）
+FOLLOW_GRACE = datetime.timedelta(seconds=5)
+
+# 新しいショットを1回に取得する上限
+FOLLOW_PAGE_SIZE = 200
+
+# メタデータの shots に含めるショットの属性
+METADATA_SHOT_FIELDS = ("file_name", "expression", "lighting", "camera_distance", "angle", "width", "height")
+
+def iter_matching_shots(job_id: str, filters: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """ジョブのショットのうち条件に一致するものを少しずつ取得する（撮影時のファイルパスを含む）
+
+    Args:
+        job_id: ジョブID
+        filters: query_shots に渡す絞り込み条件
+
+    Yields:
+        ショット情報の辞書
+    """
+    def fetch_page(db, cursor):
+        return query_shots(db, job_id=job_id, limit=STREAM_PAGE_SIZE, cursor=cursor, include_file_path=True, **filters)
+
+    return iter_keyset_rows(fetch_page, lambda shot: shot)
+
+def _read_archive_metadata(archive: Optional[zipfile.ZipFile]) -> Dict[str, Any]:
+    """元のデータセットZIPのメタデータを読み込む（ない場合は空の辞書）"""
+    if archive is None:
+        return {}
+    try:
+        with archive.open(METADATA_MEMBER) as f:
+            return json.load(f)
+    except (KeyError, ValueError) as e:
+        logger.warning(f"データセットのメタデータを読み込めません: {str(e)}")
+        return {}
+
+def _open_archive(archive_path: Optional[str]) -> Optional[zipfile.ZipFile]:
+    """元のデータセットZIPを開く（ない場合はNone）"""
+    if not archive_path or not os.path.exists(archive_path):
+        return None
+    try:
+        return zipfile.ZipFile(archive_path)
+    except (OSError, zipfile.BadZipFile) as e:
+        logger.warning(f"データセットZIPを開けません ({archive_path}): {str(e)}")
+        return None
+
+def _open_shot_source(shot: Dict[str, Any], archive: Optional[zipfile.ZipFile]) -> Optional[Tuple[IO[bytes], int]]:
+    """ショット画像を開く（撮影時のファイルを優先し、なければ元のデータセットZIPから読む）
+
+    Returns:
+        (ファイルオブジェクト, サイズ) のタプル。どちらにもない場合はNone
+    """
+    file_path = shot.get("file_path")
+    if file_path:
+        try:
+            f = open(file_path, "rb")
+            return f, os.fstat(f.fileno()).st_size
+        except OSError:
+            pass
+    arcname = f"{DATASET_ARCHIVE_DIR}/{shot['file_name']}"
+    if archive is not None and arcname in archive.NameToInfo:
+        return archive.open(arcname), archive.getinfo(arcname).file_size
+    return None
+
+def _iter_metadata_entry(writer: ZipStreamWriter, job_id: str, filters: Dict[str, Any],
+                         base: Dict[str, Any], skipped: set, extra: Dict[str, Any]) -> Iterator[bytes]:
+    """絞り込んだ metadata.json を書き込む
+
+    ショットの一覧はデータベースから読み直しながら書き出すため、ショット数によらずメモリは一定になる。
+    """
+    header = {key: value for key, value in base.items() if key not in ("screenshots", "shots")}
+    header.setdefault("job_id", job_id)
+    header["filters"] = {key: value for key, value in filters.items() if value is not None}
+    header.update(extra)
+
+    with writer.open(METADATA_MEMBER) as entry:
+        # 先頭のフィールドを書いた後、閉じ括弧の代わりに配列を続ける
+        entry.write(json.dumps(header, ensure_ascii=False, default=str)[:-1].encode("utf-8"))
+        for key, to_value in (("screenshots", lambda shot: shot["file_name"]),
+                              ("shots", lambda shot: {field: shot.get(field) for field in METADATA_SHOT_FIELDS})):
+            entry.write(f', "{key}": ['.encode("utf-8"))
+            first = True
+            for shot in iter_matching_shots(job_id, filters):
+                if shot["shot_id"] in skipped:
+                    continue
+                separator = "" if first else ", "
+                first = False
+                entry.write((separator + json.dumps(to_value(shot), ensure_ascii=False)).encode("utf-8"))
+                data = writer.drain()
+                if data:
+                    yield data
+            entry.write(b"]")
+        entry.write(b"}")
+    yield writer.drain()
+
+def iter_subset_archive(job_id: str, archive_path: Optional[str], filters: Dict[str, Any],
+                        extra_metadata: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """条件に一致するショットだけを含むデータセットZIPを組み立てながら出力する
+
+    画像は撮影時のファイルが残っていればそこから、なければ元のデータセットZIPから読み出す。
+    どちらにもない画像は飛ばし、metadata.json にも含めない。ZIPはストリーミング形式
+    （データディスクリプタ付き）で書き出すため、一時ファイルも全体分のメモリも使わない。
+
+    Args:
+        job_id: ジョブID
+        archive_path: 元のデータセットZIPのパス（まだ作成されていない場合はNone）
+        filters: query_shots に渡す絞り込み条件
+        extra_metadata: metadata.json に追加するフィールド
+
+    Yields:
+        ZIPファイルのバイト列
+    """
+    writer = ZipStreamWriter()
+    archive = _open_archive(archive_path)
+    skipped = set()
+    count = 0
+    try:
+        base = _read_archive_metadata(archive)
+        for shot in iter_matching_shots(job_id, filters):
+            source = _open_shot_source(shot, archive)
+            if source is None:
+                logger.warning(f"ショット画像が見つからないため除外します: {job_id}/{shot['file_name']}")
+                skipped.add(shot["shot_id"])
+                continue
+            with source[0] as f:
+                yield from writer.write_stream(f"{DATASET_ARCHIVE_DIR}/{shot['file_name']}", f, source[1])
+            count += 1
+
+        yield from _iter_metadata_entry(writer, job_id, filters, base, skipped, extra_metadata or {})
+        yield writer.close()
+        logger.info(f"部分データセットを出力しました: {job_id}（{count}件, 除外 {len(skipped)}件）")
+    except Exception as e:
+        # ヘッダー送信後のためステータスコードは変えられない。ログに残して打ち切る
+        logger.error(f"部分データセットの出力中にエラーが発生しました ({job_id}, {count}件出力済み): {str(e)}")
+        raise
+    finally:
+        if archive is not None:
+            archive.close()
+
+def _load_partial_state(db, job_id: str, since: Optional[datetime.datetime], filters: Dict[str, Any]) -> Dict[str, Any]:
+    """撮影中のジョブの状態と、since 以降に登録されたショットを取得する
+
+    実行中のジョブに合流したジョブは、撮影している元ジョブ（shot_job_id）の進捗とショットを返す。
+    終了の判定は指定されたジョブの状態で行う（元ジョブの終了時に同じ結果が反映される）。
+    状態を先に読むため、終了状態を読んだ時点でコミット済みのショットはすべて shots に含まれる。
+    """
+    job = db.query(Job.status, Job.progress, Job.result_path).filter(Job.job_id == job_id).first()
+    shot_job_id = resolve_shot_job_id(db, job_id)
+    if shot_job_id != job_id:
+        source = db.query(Job.progress).filter(Job.job_id == shot_job_id).first()
+        progress = source.progress if source else None
+    else:
+        progress = job.progress if job else None
+    metadata = db.query(DatasetMetadata.total_shots).filter(DatasetMetadata.job_id == shot_job_id).first()
+    return {
+        "status": job.status if job else None,
+        "progress": progress,
+        "result_path": job.result_path if job else None,
+        "total_shots": metadata.total_shots if metadata else None,
+        "shot_job_id": shot_job_id,
+        "shots": query_new_shots(db, shot_job_id, since=since, limit=FOLLOW_PAGE_SIZE, **filters)
+    }
+
+def _write_shot_entry(writer: ZipStreamWriter, shot: Dict[str, Any], archive_path: Optional[str]) -> Optional[bytes]:
+    """ショット画像を1件書き込み、出力するバイト列を返す（画像がない場合はNone）"""
+    archive = _open_archive(archive_path) if not shot.get("file_path") or not os.path.exists(shot["file_path"]) else None
+    try:
+        source = _open_shot_source(shot, archive)
+        if source is None:
+            return None
+        with source[0] as f:
+            return b"".join(writer.write_stream(f"{DATASET_ARCHIVE_DIR}/{shot['file_name']}", f, source[1]))
+    finally:
+        if archive is not None:
+            archive.close()
+
+async def iter_partial_archive(job_id: str, filters: Dict[str, Any], follow: bool = False) -> AsyncIterator[bytes]:
+    """撮影中のジョブのショットを、撮影済みの分だけZIPとして出力する
+
+    follow=True の場合は、ジョブが終了するまで新しく登録されたショットを追加し続ける。
+    新しいショットはジョブのイベント（進捗の更新）を契機に、イベントがなくても
+    DATASET_FOLLOW_POLL_SECONDS ごとに確認する。実行中のジョブに合流したジョブは、
+    撮影している元ジョブのショットとイベントを追う。最後に dataset/manifest.json を書き込み、
+    partial（撮影途中の内容か）とジョブの状態・ショット数を記録する。
+
+    画像は1件ずつスレッドプールで読み込むため、イベントループはブロックしない。
+    保持するのは出力済みショットの属性（マニフェスト用）だけで、画像の内容は保持しない。
+
+    Args:
+        job_id: ジョブID
+        filters: query_shots に渡す絞り込み条件
+        follow: ジョブの終了まで新しいショットを待ち続けるか
+
+    Yields:
+        ZIPファイルのバイト列
+    """
+    bus = get_job_event_bus()
+    # イベントは撮影しているジョブのものを受け取る（元ジョブのキャンセルで引き継いだ場合は付け替える）
+    subscribed_job_id = await run_in_session(resolve_shot_job_id, job_id) if follow else None
+    queue = bus.subscribe(subscribed_job_id)[0] if follow else None
+    writer = ZipStreamWriter()
+    included: Dict[str, Dict[str, Any]] = {}
+    skipped = set()
+    since = None
+    try:
+        while True:
+            state = await run_in_session(_load_partial_state, job_id, since, filters)
+            new_shots = [shot for shot in state["shots"]
+                         if shot["file_name"] not in included and shot["file_name"] not in skipped]
+            for shot in new_shots:
+                data = await run_fs(_write_shot_entry, writer, shot, state["result_path"])
+                if data is None:
+                    skipped.add(shot["file_name"])
+                    continue
+                included[shot["file_name"]] = {field: shot.get(field) for field in METADATA_SHOT_FIELDS}
+                yield data
+            if state["shots"]:
+                latest = max(shot["created_at"] for shot in state["shots"])
+                if len(state["shots"]) < FOLLOW_PAGE_SIZE:
+                    since = latest - FOLLOW_GRACE
+                elif since is None or latest > since:
+                    # 取得上限に達した場合は待たずに続きを取得する（終了の判定は最後まで読んでから行う）
+                    since = latest
+                    continue
+            if not follow or state["status"] in TERMINAL_STATUSES or state["status"] is None:
+                break
+            if state["shot_job_id"] != subscribed_job_id:
+                bus.unsubscribe(subscribed_job_id, queue)
+                subscribed_job_id = state["shot_job_id"]
+                queue = bus.subscribe(subscribed_job_id)[0]
+
+            try:
+                await asyncio.wait_for(queue.get(), timeout=settings.DATASET_FOLLOW_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            # まとめて届いたイベントは1回の確認で済ませる
+            while not queue.empty():
+                queue.get_nowait()
+
+        manifest = {
+            "job_id": job_id,
+            "partial": state["status"] != "completed",
+            "job_status": state["status"],
+            "progress": state["progress"],
+            "total_shots": state["total_shots"],
+            "included_shots": len(included),
+            "skipped_shots": len(skipped),
+            "filters": {key: value for key, value in filters.items() if value is not None},
+            "follow": follow,
+            "generated_at": datetime.datetime.utcnow().isoformat(),
+            "screenshots": list(included),
+            "shots": list(included.values())
+        }
+        yield writer.write_bytes(MANIFEST_MEMBER, json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+        yield writer.close()
+        logger.info(f"撮影中のデータセットを出力しました: {job_id}（{len(included)}件, 状態: {state['status']}）")
+    finally:
+        if queue is not None:
+            bus.unsubscribe(subscribed_job_id, queue)
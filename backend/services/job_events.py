@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Optional, Dict, Any, List, Tuple
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import event
+from sqlalchemy import inspect as sa_inspect
+
+from backend.config.settings import settings
+from backend.models.database import SessionLocal, Job
+from backend.utils.async_db import run_in_session
+from backend.utils.streaming import SSE_MEDIA_TYPE, format_sse
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# グローバル変数
+_job_event_bus = None
+_job_event_bus_lock = threading.Lock()
+
+# 終了状態のステータス（このイベントを送ったらストリームを閉じる）
+TERMINAL_STATUSES = ("completed", "error", "cancelled")
+
+# 変更されたらイベントを発行するジョブの列
+EVENT_ATTRIBUTES = ("status", "progress", "message", "error_message", "result_path", "source_job_id")
+
+# セッションの info に未発行のイベントを溜めるキー
+_PENDING_KEY = "pending_job_events"
+
+def job_event_snapshot(job: Job) -> Dict[str, Any]:
+    """イベントとして送るジョブの状態"""
+    return {
+        "job_id": job.job_id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "progress": job.progress,
+        "message": job.message,
+        "error_message": job.error_message,
+        "source_job_id": job.source_job_id,
+        "start_time": job.start_time.isoformat() if job.start_time else None,
+        "end_time": job.end_time.isoformat() if job.end_time else None
+    }
+
+class JobEventBus:
+    """ジョブの状態変化をプロセス内で配信するイベントバス
+
+    ジョブごとに直近のイベントをリングバッファに保持し、Last-Event-ID 以降のイベントを
+    再送できるようにする。イベントIDは起動時刻（ミリ秒）から始まる連番で、再起動後も増加する。
+    発行はジョブ処理スレッドから行われるため、購読者のイベントループへはスレッドセーフに渡す。
+    """
+
+    def __init__(self, buffer_size: int, max_jobs: int):
+        self.buffer_size = buffer_size
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._next_id = int(time.time() * 1000)
+        self._buffers: "OrderedDict[str, deque]" = OrderedDict()  # job_id -> deque[(event_id, data)]
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self.published = 0
+
+    def publish(self, job_id: str, data: Dict[str, Any]) -> int:
+        """ジョブのイベントを発行する
+
+        Args:
+            job_id: ジョブID
+            data: ジョブの状態
+
+        Returns:
+            イベントID
+        """
+        with self._lock:
+            self._next_id += 1
+            event_id = self._next_id
+            buffer = self._buffers.get(job_id)
+            if buffer is None:
+                buffer = self._buffers[job_id] = deque(maxlen=self.buffer_size)
+                # 古いジョブのバッファから破棄する
+                while len(self._buffers) > self.max_jobs:
+                    self._buffers.popitem(last=False)
+            else:
+                self._buffers.move_to_end(job_id)
+            buffer.append((event_id, data))
+            subscribers = list(self._subscribers.get(job_id, []))
+            self.published += 1
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (event_id, data))
+            except RuntimeError:
+                # 購読者のイベントループが終了している
+                pass
+        return event_id
+
+    def subscribe(self, job_id: str, last_event_id: Optional[int] = None) -> Tuple[asyncio.Queue, List[Tuple[int, Dict[str, Any]]], bool]:
+        """ジョブのイベントを購読する（イベントループ上で呼ぶ）
+
+        Args:
+            job_id: ジョブID
+            last_event_id: クライアントが最後に受信したイベントID
+
+        Returns:
+            (新しいイベントを受け取るキュー, 再送するイベント, バッファだけで状態を復元できたか) のタプル。
+            最後の値がFalseの場合、呼び出し元は現在の状態を別途取得して送ること
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append((asyncio.get_running_loop(), queue))
+            buffered = list(self._buffers.get(job_id, ()))
+
+        if last_event_id is None:
+            # 初回接続は最新の状態だけを送る
+            return queue, buffered[-1:], bool(buffered)
+
+        # 各イベントはジョブ全体の状態を持つため、取りこぼしがあっても最後のイベントで最新の状態に追いつける。
+        # バッファがない（再起動後・破棄済み）場合だけ状態を別途取得する
+        replay = [(event_id, data) for event_id, data in buffered if event_id > last_event_id]
+        return queue, replay, bool(buffered)
+
+    def has_job(self, job_id: str) -> bool:
+        """ジョブのイベントを保持しているか"""
+        with self._lock:
+            return job_id in self._buffers
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        """購読を解除する"""
+        with self._lock:
+            subscribers = [entry for entry in self._subscribers.get(job_id, []) if entry[1] is not queue]
+            if subscribers:
+                self._subscribers[job_id] = subscribers
+            else:
+                self._subscribers.pop(job_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """イベントバスの状況"""
+        with self._lock:
+            return {
+                "published": self.published,
+                "buffered_jobs": len(self._buffers),
+                "subscribers": sum(len(entries) for entries in self._subscribers.values())
+            }
+
+def get_job_event_bus() -> JobEventBus:
+    """ジョブイベントバスのシングルトンインスタンスを取得"""
+    global _job_event_bus
+
+    with _job_event_bus_lock:
+        if _job_event_bus is None:
+            _job_event_bus = JobEventBus(settings.JOB_EVENT_BUFFER_SIZE, settings.JOB_EVENT_MAX_JOBS)
+        return _job_event_bus
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    """Last-Event-ID の値を解析する（不正な値は指定なしとして扱う）"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+def _load_job_event_snapshot(db, job_id: str) -> Optional[Dict[str, Any]]:
+    """イベントバスに状態がないジョブの現在の状態をデータベースから取得する"""
+    job = db.query(Job).filter(Job.job_id == job_id).first()
+    return job_event_snapshot(job) if job else None
+
+async def _iter_job_events(job_id: str, last_event_id: Optional[int],
+                           initial_snapshot: Optional[Dict[str, Any]]):
+    """ジョブのイベントを Server-Sent Events として送り続ける"""
+    bus = get_job_event_bus()
+    queue, replay, restored = bus.subscribe(job_id, last_event_id)
+    try:
+        yield f"retry: {settings.JOB_EVENT_RETRY_MS}\n\n".encode("ascii")
+
+        # バッファから復元できない場合は取得済みの状態を送る（IDを付けないので再接続時の位置は変わらない）
+        if not restored and initial_snapshot is not None:
+            yield format_sse(initial_snapshot)
+            if initial_snapshot.get("status") in TERMINAL_STATUSES:
+                return
+
+        sent_id = last_event_id or 0
+        for event_id, data in replay:
+            sent_id = event_id
+            yield format_sse(data, event_id)
+            if data.get("status") in TERMINAL_STATUSES:
+                return
+
+        while True:
+            try:
+                event_id, data = await asyncio.wait_for(queue.get(), timeout=settings.JOB_EVENT_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # プロキシに切断されないよう定期的にコメント行を送る
+                yield b": keep-alive\n\n"
+                continue
+
+            if event_id <= sent_id:
+                continue
+            sent_id = event_id
+            yield format_sse(data, event_id)
+            if data.get("status") in TERMINAL_STATUSES:
+                return
+    finally:
+        bus.unsubscribe(job_id, queue)
+
+async def job_event_response(job_id: str, last_event_id: Optional[str] = None) -> Optional[StreamingResponse]:
+    """ジョブの進捗を配信する Server-Sent Events のレスポンスを作成する
+
+    進捗の更新はイベントバスから受け取るため、配信中にデータベースは読まない。
+    イベントバスに状態がないジョブに限り、接続時に一度だけデータベースから現在の状態を取得する。
+    ジョブが終了状態になったイベントを送るとストリームを閉じる。
+
+    Args:
+        job_id: ジョブID
+        last_event_id: Last-Event-ID ヘッダーの値（再接続時にブラウザが送る）
+
+    Returns:
+        ストリーミングレスポンス。ジョブが存在しない場合はNone
+    """
+    initial_snapshot = None
+    if not get_job_event_bus().has_job(job_id):
+        initial_snapshot = await run_in_session(_load_job_event_snapshot, job_id)
+        if initial_snapshot is None:
+            return None
+
+    return StreamingResponse(
+        _iter_job_events(job_id, parse_last_event_id(last_event_id), initial_snapshot),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_job_events(session, flush_context) -> None:
+    """フラッシュされたジョブの状態変化を記録する（コミット後に発行する）"""
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Job):
+            continue
+        if obj in session.dirty:
+            attrs = sa_inspect(obj).attrs
+            if not any(attrs[name].history.has_changes() for name in EVENT_ATTRIBUTES):
+                continue
+        pending[obj.job_id] = job_event_snapshot(obj)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_job_events(session) -> None:
+    """コミットされたジョブの状態変化を発行する"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    bus = get_job_event_bus()
+    for job_id, data in pending.items():
+        bus.publish(job_id, data)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_job_events(session) -> None:
+    """ロールバックされた変更のイベントは発行しない"""
+    session.info.pop(_PENDING_KEY, None)
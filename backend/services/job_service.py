@@ -1,21 +1,25 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from datetime import datetime
 import uuid
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 
-from backend.models.database import Job, File, EvaluationReport
+from backend.models.database import Job, File, EvaluationReport, JobStatusCounter, DatasetMetadata
 from backend.models.schemas import JobCreate, JobResponse, JobStatus
+from backend.utils.pagination import paginate_keyset
 
-def create_job(db: Session, job_id: Optional[str] = None, job_parameters: Optional[Dict[str, Any]] = None) -> Job:
+def create_job(db: Session, job_id: Optional[str] = None, job_parameters: Optional[Dict[str, Any]] = None,
+               file_path: Optional[str] = None, content_hash: Optional[str] = None) -> Job:
     """新しいジョブを作成する
     
     Args:
         db: データベースセッション
         job_id: ジョブID（指定がない場合は自動生成）
         job_parameters: ジョブパラメーター
+        file_path: 入力ファイル（ブロブ）のパス
+        content_hash: 入力ファイルのSHA-256ハッシュ
         
     Returns:
         作成されたジョブ
@@ -26,7 +30,9 @@ def create_job(db: Session, job_id: Optional[str] = None, job_parameters: Option
     db_job = Job(
         job_id=job_id,
         status="queued",
-        job_parameters=job_parameters
+        job_parameters=job_parameters,
+        file_path=file_path,
+        content_hash=content_hash
     )
     db.add(db_job)
     db.commit()
@@ -45,6 +51,80 @@ def get_job(db: Session, job_id: str) -> Optional[Job]:
     """
     return db.query(Job).filter(Job.job_id == job_id).first()
 
+def get_job_with_relations(db: Session, job_id: str) -> Optional[Job]:
+    """ファイル・評価レポート・データセットメタデータを含めてジョブを取得する
+    
+    1対1の関連は JOIN で、ファイル一覧は IN 句の一括取得でロードし、
+    関連へのアクセスごとにクエリが発行されないようにする。
+    
+    Args:
+        db: データベースセッション
+        job_id: ジョブID
+        
+    Returns:
+        ジョブ（存在しない場合はNone）
+    """
+    return (
+        db.query(Job)
+        .options(
+            joinedload(Job.report),
+            joinedload(Job.dataset_metadata),
+            selectinload(Job.files)
+        )
+        .filter(Job.job_id == job_id)
+        .first()
+    )
+
+def build_job_detail(job: Job) -> Dict[str, Any]:
+    """関連をロード済みのジョブから詳細レスポンスを組み立てる
+    
+    Args:
+        job: get_job_with_relations で取得したジョブ
+        
+    Returns:
+        ジョブの詳細情報
+    """
+    return {
+        "job_id": job.job_id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "submission_time": job.submission_time.isoformat(),
+        "start_time": job.start_time.isoformat() if job.start_time else None,
+        "end_time": job.end_time.isoformat() if job.end_time else None,
+        "error_message": job.error_message,
+        "files": [
+            {
+                "file_id": file.file_id,
+                "file_type": file.file_type,
+                "file_path": file.file_path,
+                "created_at": file.created_at.isoformat(),
+            }
+            for file in job.files
+        ],
+        "report": {
+            "report_id": job.report.report_id,
+            "evaluation_score": job.report.evaluation_score,
+            "report_data": job.report.report_data,
+            "created_at": job.report.created_at.isoformat(),
+        } if job.report else None,
+        "metadata": job.dataset_metadata.to_dict() if job.dataset_metadata else None,
+    }
+
+def get_job_detail(db: Session, job_id: str) -> Optional[Dict[str, Any]]:
+    """ジョブの詳細レスポンスを取得する
+    
+    Args:
+        db: データベースセッション
+        job_id: ジョブID
+        
+    Returns:
+        ジョブの詳細情報（存在しない場合はNone）
+    """
+    job = get_job_with_relations(db, job_id)
+    if job is None:
+        return None
+    return build_job_detail(job)
+
 def get_all_jobs(db: Session, skip: int = 0, limit: int = 100) -> List[Job]:
     """ジョブの一覧を取得する
     
@@ -58,6 +138,183 @@ def get_all_jobs(db: Session, skip: int = 0, limit: int = 100) -> List[Job]:
     """
     return db.query(Job).order_by(Job.submission_time.desc()).offset(skip).limit(limit).all()
 
+def get_jobs_page(
+    db: Session,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    job_type: Optional[str] = None
+) -> Tuple[List[Job], Optional[str]]:
+    """ジョブの一覧を (submission_time, job_id) の降順でカーソル単位に取得する
+    
+    Args:
+        db: データベースセッション
+        limit: 取得する上限数
+        cursor: 前ページの next_cursor（先頭ページはNone）
+        status: ステータスで絞り込む場合に指定
+        job_type: ジョブタイプで絞り込む場合に指定
+        
+    Returns:
+        (ジョブのリスト, 次ページのカーソル) のタプル
+        
+    Raises:
+        InvalidCursorError: カーソルの形式が不正な場合
+    """
+    query = db.query(Job)
+    if status:
+        query = query.filter(Job.status == status)
+    if job_type:
+        query = query.filter(Job.job_type == job_type)
+    
+    return paginate_keyset(query, Job.submission_time, Job.job_id, cursor=cursor, limit=limit)
+
+# 一覧表示用に取得するジョブの列（ORMオブジェクトを組み立てずに済むよう列単位で取得する）
+JOB_SUMMARY_COLUMNS = (
+    Job.job_id,
+    Job.job_type,
+    Job.status,
+    Job.submission_time,
+    Job.start_time,
+    Job.end_time,
+    Job.error_message,
+)
+
+def get_job_summaries_page(
+    db: Session,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    job_type: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """ジョブ一覧の1ページ分を一覧表示用の列だけで取得する
+    
+    日時は datetime のまま返す（シリアライズはレスポンスモデルまたは NDJSON の出力に任せる）。
+    
+    Args:
+        db: データベースセッション
+        limit: 取得する上限数
+        cursor: 前ページの next_cursor（先頭ページはNone）
+        status: ステータスで絞り込む場合に指定
+        job_type: ジョブタイプで絞り込む場合に指定
+        
+    Returns:
+        (ジョブ情報の辞書のリスト, 次ページのカーソル) のタプル
+        
+    Raises:
+        InvalidCursorError: カーソルの形式が不正な場合
+    """
+    query = db.query(*JOB_SUMMARY_COLUMNS)
+    if status:
+        query = query.filter(Job.status == status)
+    if job_type:
+        query = query.filter(Job.job_type == job_type)
+    
+    rows, next_cursor = paginate_keyset(query, Job.submission_time, Job.job_id, cursor=cursor, limit=limit)
+    return [dict(row._mapping) for row in rows], next_cursor
+
+# データセットジョブ一覧で返す列（パラメータや結果パスは返さない）
+DATASET_JOB_LIST_COLUMNS = (
+    Job.job_id,
+    Job.status,
+    Job.progress,
+    Job.message,
+    Job.submission_time,
+    Job.start_time,
+    Job.end_time,
+    Job.error_message,
+    DatasetMetadata.total_shots,
+    DatasetMetadata.completed_shots,
+)
+
+def get_dataset_jobs_page(
+    db: Session,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """データセットジョブ一覧の1ページ分を一覧表示用の列だけで取得する
+    
+    ジョブタイプ（とステータス）の絞り込みと並び順は (job_type, [status,] submission_time, job_id)
+    のインデックスで解決し、ショット数はデータセットメタデータを1ページ分だけ結合して取得する。
+    
+    Args:
+        db: データベースセッション
+        limit: 取得する上限数
+        cursor: 前ページの next_cursor（先頭ページはNone）
+        status: ステータスで絞り込む場合に指定
+        
+    Returns:
+        (ジョブ情報の辞書のリスト, 次ページのカーソル) のタプル
+        
+    Raises:
+        InvalidCursorError: カーソルの形式が不正な場合
+    """
+    query = (
+        db.query(*DATASET_JOB_LIST_COLUMNS)
+        .outerjoin(DatasetMetadata, DatasetMetadata.job_id == Job.job_id)
+        .filter(Job.job_type == "dataset")
+    )
+    if status:
+        query = query.filter(Job.status == status)
+    
+    rows, next_cursor = paginate_keyset(query, Job.submission_time, Job.job_id, cursor=cursor, limit=limit)
+    return [dict(row._mapping) for row in rows], next_cursor
+
+def get_job_counters(db: Session, job_type: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    """ジョブタイプ・ステータス別のジョブ件数を集計テーブルから取得する
+    
+    Args:
+        db: データベースセッション
+        job_type: ジョブタイプで絞り込む場合に指定
+        
+    Returns:
+        ジョブタイプ -> (ステータス -> 件数) の辞書
+    """
+    query = db.query(JobStatusCounter)
+    if job_type:
+        query = query.filter(JobStatusCounter.job_type == job_type)
+    
+    counters: Dict[str, Dict[str, int]] = {}
+    for counter in query.all():
+        if counter.count:
+            counters.setdefault(counter.job_type, {})[counter.status] = counter.count
+    return counters
+
+def get_status_counts(db: Session, job_type: Optional[str] = None) -> Dict[str, int]:
+    """ステータス別のジョブ件数を取得する
+    
+    jobs テーブルを COUNT(*) せず、更新と同じトランザクションで
+    維持している集計テーブルを参照する。
+    
+    Args:
+        db: データベースセッション
+        job_type: ジョブタイプで絞り込む場合に指定
+        
+    Returns:
+        ステータス -> 件数 の辞書
+    """
+    counts: Dict[str, int] = {}
+    for statuses in get_job_counters(db, job_type).values():
+        for status, count in statuses.items():
+            counts[status] = counts.get(status, 0) + count
+    return counts
+
+def count_jobs(db: Session, status: Optional[str] = None, job_type: Optional[str] = None) -> int:
+    """集計テーブルのステータス別件数からジョブの総数を求める
+    
+    Args:
+        db: データベースセッション
+        status: ステータスで絞り込む場合に指定
+        job_type: ジョブタイプで絞り込む場合に指定
+        
+    Returns:
+        ジョブの件数
+    """
+    counts = get_status_counts(db, job_type)
+    if status:
+        return counts.get(status, 0)
+    return sum(counts.values())
+
 def update_job_status(db: Session, job_id: str, status: str, error_message: Optional[str] = None) -> Optional[Job]:
     """ジョブのステータスを更新する
     
@@ -107,7 +364,9 @@ def delete_job(db: Session, job_id: str) -> bool:
     db.commit()
     return True
 
-def add_file_to_job(db: Session, job_id: str, file_type: str, file_path: str) -> Optional[File]:
+def add_file_to_job(db: Session, job_id: str, file_type: str, file_path: str,
+                    file_name: Optional[str] = None, file_size: Optional[int] = None,
+                    content_hash: Optional[str] = None) -> Optional[File]:
     """ジョブにファイルを追加する
     
     Args:
@@ -115,6 +374,9 @@ def add_file_to_job(db: Session, job_id: str, file_type: str, file_path: str) ->
         job_id: ジョブID
         file_type: ファイルタイプ
         file_path: ファイルパス
+        file_name: オリジナルのファイル名
+        file_size: ファイルサイズ（バイト）
+        content_hash: ファイルのSHA-256ハッシュ
         
     Returns:
         作成されたファイルオブジェクト（ジョブが存在しない場合はNone）
@@ -127,7 +389,10 @@ def add_file_to_job(db: Session, job_id: str, file_type: str, file_path: str) ->
         file_id=str(uuid.uuid4()),
         job_id=job_id,
         file_type=file_type,
-        file_path=file_path
+        file_path=file_path,
+        file_name=file_name,
+        file_size=file_size,
+        content_hash=content_hash
     )
     db.add(db_file)
     db.commit()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import signal
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable
+
+from backend.config.settings import settings
+
+try:
+    import psutil
+except ImportError:  # psutil がない環境では /proc を直接参照する
+    psutil = None
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# グローバル変数
+_watchdog = None
+_watchdog_lock = threading.Lock()
+
+# 期限切れの理由
+EXPIRED_TIMEOUT = "timeout"  # 実行時間の上限を超えた
+EXPIRED_STALLED = "stalled"  # 一定時間進捗がない
+
+class JobWatchdog:
+    """実行中ジョブの経過時間と最終進捗時刻を監視するウォッチドッグ
+
+    JOB_TIMEOUT_SECONDS を超えたジョブ、または JOB_STALL_TIMEOUT_SECONDS の間
+    進捗がないジョブを検出すると、そのジョブが起動したブラウザのプロセスツリーを
+    強制終了し、登録されたコールバックに後処理（エラー化・再キューイング）を任せる。
+    """
+
+    def __init__(self, timeout_seconds: int, stall_seconds: int, interval_seconds: int):
+        self.timeout_seconds = timeout_seconds
+        self.stall_seconds = stall_seconds
+        self.interval_seconds = interval_seconds
+        self._jobs: Dict[str, Dict[str, Any]] = {}  # job_id -> 監視情報
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._on_expired: Optional[Callable[[str, str, float], None]] = None
+
+    def start(self, on_expired: Callable[[str, str, float], None]) -> None:
+        """監視スレッドを開始
+
+        Args:
+            on_expired: 期限切れのジョブを処理するコールバック (job_id, 理由, 監視開始時刻)
+        """
+        self._on_expired = on_expired
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info(f"ジョブウォッチドッグを開始しました: タイムアウト {self.timeout_seconds}秒, 無応答 {self.stall_seconds}秒")
+
+    def stop(self) -> None:
+        """監視スレッドを停止"""
+        self._stop_event.set()
+
+    def track_job(self, job_id: str, started_at: Optional[float] = None) -> None:
+        """ジョブの監視を開始
+
+        Args:
+            job_id: ジョブID
+            started_at: 再実行するジョブの最初の開始時刻（time.monotonic）。
+                指定した場合、実行時間の上限は再実行をまたいで数える
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._jobs[job_id] = {
+                "started_at": started_at if started_at is not None else now,
+                "last_progress_at": now,
+                "browser_pids": set()
+            }
+
+    def touch(self, job_id: str) -> None:
+        """ジョブの最終進捗時刻を更新"""
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry:
+                entry["last_progress_at"] = time.monotonic()
+
+    def register_browser(self, job_id: str, pid: int) -> None:
+        """ジョブが起動したブラウザのプロセスIDを登録"""
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry:
+                entry["browser_pids"].add(pid)
+
+    def untrack_job(self, job_id: str) -> None:
+        """ジョブの監視を終了"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """監視中ジョブの経過時間一覧を返す"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "job_id": job_id,
+                    "elapsed_seconds": round(now - entry["started_at"], 1),
+                    "idle_seconds": round(now - entry["last_progress_at"], 1),
+                    "browser_pids": sorted(entry["browser_pids"])
+                }
+                for job_id, entry in self._jobs.items()
+            ]
+
+    def check(self) -> None:
+        """期限切れのジョブを検出して回収する"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for job_id, entry in list(self._jobs.items()):
+                if now - entry["started_at"] > self.timeout_seconds:
+                    expired.append((job_id, EXPIRED_TIMEOUT, entry))
+                elif now - entry["last_progress_at"] > self.stall_seconds:
+                    expired.append((job_id, EXPIRED_STALLED, entry))
+                else:
+                    continue
+                del self._jobs[job_id]
+
+        for job_id, reason, entry in expired:
+            logger.warning(f"ジョブが期限切れになりました: {job_id}, 理由: {reason}")
+            for pid in entry["browser_pids"]:
+                kill_process_tree(pid)
+            if self._on_expired:
+                try:
+                    self._on_expired(job_id, reason, entry["started_at"])
+                except Exception as e:
+                    logger.error(f"期限切れジョブの回収中にエラーが発生しました: {job_id} - {str(e)}")
+
+    def _run(self) -> None:
+        """監視ループ"""
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"ジョブウォッチドッグでエラーが発生しました: {str(e)}")
+
+def _list_descendant_pids(pid: int) -> List[int]:
+    """/proc を参照して子孫プロセスのIDを取得（psutil がない場合）"""
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+
+    for name in entries:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "r") as f:
+                # comm にスペースや括弧が含まれる場合に備えて最後の ')' 以降を解析
+                fields = f.read().rsplit(")", 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(name))
+        except (OSError, IndexError, ValueError):
+            continue
+
+    descendants = []
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            descendants.append(child)
+            stack.append(child)
+    return descendants
+
+def kill_process_tree(pid: int) -> None:
+    """プロセスとその子孫を強制終了する
+
+    Args:
+        pid: ルートとなるプロセスID
+    """
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            processes = root.children(recursive=True) + [root]
+        except psutil.NoSuchProcess:
+            return
+        for process in processes:
+            try:
+                process.kill()
+            except psutil.NoSuchProcess:
+                pass
+        psutil.wait_procs(processes, timeout=5)
+    else:
+        for target in _list_descendant_pids(pid) + [pid]:
+            try:
+                os.kill(target, getattr(signal, "SIGKILL", signal.SIGTERM))
+            except (ProcessLookupError, PermissionError):
+                pass
+    logger.info(f"ブラウザのプロセスツリーを終了しました: {pid}")
+
+def get_job_watchdog() -> JobWatchdog:
+    """プロセス共通のジョブウォッチドッグを取得"""
+    global _watchdog
+    with _watchdog_lock:
+        if _watchdog is None:
+            _watchdog = JobWatchdog(
+                timeout_seconds=settings.JOB_TIMEOUT_SECONDS,
+                stall_seconds=settings.JOB_STALL_TIMEOUT_SECONDS,
+                interval_seconds=settings.WATCHDOG_INTERVAL_SECONDS
+            )
+        return _watchdog
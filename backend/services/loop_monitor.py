@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+from backend.config.settings import settings
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# グローバル変数
+_loop_lag_monitor = None
+_loop_lag_monitor_lock = threading.Lock()
+
+# 警告ログを出す最短の間隔（秒）。負荷が続く間にログが溢れないようにする
+WARNING_INTERVAL_SECONDS = 10.0
+
+class EventLoopLagMonitor:
+    """イベントループの遅延を計測するモニター
+
+    interval_seconds ごとに sleep し、予定より何ミリ秒遅れて再開したかを記録する。
+    ハンドラーの中でブロッキングI/OやCPU処理を実行するとその間ループが止まり、
+    この遅延として現れるため、非同期化の抜けや性能の劣化を検出できる。
+    直近 window 件の計測値を保持し、health エンドポイントでパーセンタイルを返す。
+    """
+
+    def __init__(self, interval_seconds: float, warn_ms: float, window: int = 600):
+        self.interval_seconds = interval_seconds
+        self.warn_ms = warn_ms
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._last_warning_at = 0.0
+        self.max_lag_ms = 0.0
+        self.stalls = 0
+
+    def start(self) -> None:
+        """計測を開始する（イベントループ上から呼び出す）"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"イベントループの遅延の計測を開始しました: 間隔 {self.interval_seconds}秒, 警告 {self.warn_ms}ms")
+
+    def stop(self) -> None:
+        """計測を停止する"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        """一定間隔で sleep し、再開の遅れを記録する"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval_seconds)
+            self.record((loop.time() - started - self.interval_seconds) * 1000)
+
+    def record(self, lag_ms: float) -> None:
+        """遅延の計測値を記録し、閾値を超えた場合は警告する"""
+        lag_ms = max(lag_ms, 0.0)
+        with self._lock:
+            self._samples.append(lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if lag_ms < self.warn_ms:
+                return
+            self.stalls += 1
+            now = time.monotonic()
+            if now - self._last_warning_at < WARNING_INTERVAL_SECONDS:
+                return
+            self._last_warning_at = now
+        logger.warning(f"イベントループが {lag_ms:.0f}ms 停止しました（ハンドラー内のブロッキング処理の可能性があります）")
+
+    def stats(self) -> Dict[str, Any]:
+        """直近の遅延の統計（ミリ秒）"""
+        with self._lock:
+            samples = sorted(self._samples)
+            current = self._samples[-1] if self._samples else None
+
+        def percentile(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))], 2)
+
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "samples": len(samples),
+            "current_ms": round(current, 2) if current is not None else None,
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(self.max_lag_ms, 2),
+            "stalls": self.stalls,
+            "warn_ms": self.warn_ms
+        }
+
+def get_loop_lag_monitor() -> EventLoopLagMonitor:
+    """イベントループ遅延モニターのシングルトンインスタンスを取得"""
+    global _loop_lag_monitor
+
+    with _loop_lag_monitor_lock:
+        if _loop_lag_monitor is None:
+            _loop_lag_monitor = EventLoopLagMonitor(
+                settings.LOOP_LAG_INTERVAL_SECONDS,
+                settings.LOOP_LAG_WARN_MS
+            )
+        return _loop_lag_monitor
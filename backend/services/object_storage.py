@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Iterable, Set
+from urllib.parse import quote
+
+from sqlalchemy import select
+
+from backend.config.settings import settings
+from backend.models.database import SessionLocal, File
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# グローバル変数
+_storage_backend = None
+_storage_backend_lock = threading.Lock()
+_publish_executor = None
+_publish_executor_lock = threading.Lock()
+_publish_stats = {"published": 0, "reused": 0, "failed": 0}
+
+# ストレージの種類
+BACKEND_LOCAL = "local"
+BACKEND_S3 = "s3"
+
+# GCS の S3 互換（XML API）エンドポイント。HMAC キーを S3_ACCESS_KEY_ID / S3_SECRET_ACCESS_KEY に設定する
+GCS_ENDPOINT_URL = "https://storage.googleapis.com"
+
+class StorageError(RuntimeError):
+    """オブジェクトストレージの操作に失敗した場合のエラー"""
+    pass
+
+def _content_disposition(filename: Optional[str]) -> Optional[str]:
+    """ダウンロード時のファイル名を指定する Content-Disposition を作成する"""
+    if not filename:
+        return None
+    return f"attachment; filename*=utf-8''{quote(filename)}"
+
+class LocalStorageBackend:
+    """ローカルディスク上のオブジェクトストレージ
+
+    キーを root 配下のパスとして保存する。アップロードはハードリンク（できない場合はコピー）で行い、
+    成果物のディスク使用量を増やさない。署名付きURLは発行できないため、ダウンロードはAPIが配信する。
+    """
+
+    name = BACKEND_LOCAL
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def local_path(self, key: str) -> str:
+        """キーに対応するファイルのパス"""
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise StorageError(f"不正なキーです: {key}")
+        return path
+
+    def upload_file(self, local_path: str, key: str, content_type: Optional[str] = None) -> None:
+        """ファイルを保存する（同じキーのオブジェクトは置き換える）"""
+        dest_path = self.local_path(key)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        temp_path = f"{dest_path}.{threading.get_ident()}.tmp"
+        try:
+            try:
+                os.link(local_path, temp_path)
+            except OSError:
+                shutil.copyfile(local_path, temp_path)
+            os.replace(temp_path, dest_path)
+        except OSError as e:
+            raise StorageError(f"オブジェクトの保存に失敗しました ({key}): {str(e)}")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def download_file(self, key: str, local_path: str) -> None:
+        """オブジェクトをファイルに書き出す"""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+            shutil.copyfile(self.local_path(key), local_path)
+        except OSError as e:
+            raise StorageError(f"オブジェクトの取得に失敗しました ({key}): {str(e)}")
+
+    def exists(self, key: str) -> bool:
+        """オブジェクトが存在するか"""
+        return os.path.isfile(self.local_path(key))
+
+    def delete(self, key: str) -> None:
+        """オブジェクトを削除する（存在しない場合は何もしない）"""
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def presigned_url(self, key: str, filename: Optional[str] = None, expires_in: Optional[int] = None) -> Optional[str]:
+        """署名付きURLは発行できないためNoneを返す（APIが local_path から配信する）"""
+        return None
+
+class S3StorageBackend:
+    """S3互換のオブジェクトストレージ（AWS S3、MinIO、GCS の XML API など）
+
+    大きなファイルは multipart_threshold を超えるとマルチパートに分割し、max_concurrency 本の
+    スレッドで並列にアップロードする。ダウンロードは署名付きURLを発行し、クライアントが
+    ストレージから直接取得する（APIサーバーは成果物の転送を行わない）。
+    boto3 は STORAGE_BACKEND=s3 の場合だけ必要になる。
+    """
+
+    name = BACKEND_S3
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, access_key_id: Optional[str] = None,
+                 secret_access_key: Optional[str] = None, force_path_style: bool = False,
+                 multipart_threshold: int = 16 * 1024 * 1024, multipart_chunksize: int = 8 * 1024 * 1024,
+                 max_concurrency: int = 8, presign_seconds: int = 900):
+        if not bucket:
+            raise StorageError("S3_BUCKET が設定されていません")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.force_path_style = force_path_style
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        self.max_concurrency = max_concurrency
+        self.presign_seconds = presign_seconds
+        self._client = None
+        self._transfer_config = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        """S3クライアントを作成する（boto3 は初回の利用時に読み込む）"""
+        with self._lock:
+            if self._client is not None:
+                return self._client
+            try:
+                import boto3
+                from boto3.s3.transfer import TransferConfig
+                from botocore.config import Config
+            except ImportError:
+                raise StorageError("STORAGE_BACKEND=s3 には boto3 が必要です（pip install boto3）")
+
+            config = Config(
+                signature_version="s3v4",
+                s3={"addressing_style": "path" if self.force_path_style else "auto"},
+                max_pool_connections=max(10, self.max_concurrency * 2)
+            )
+            self._client = boto3.client(
+                "s3",
+                endpoint_url=self.endpoint_url,
+                region_name=self.region,
+                aws_access_key_id=self.access_key_id,
+                aws_secret_access_key=self.secret_access_key,
+                config=config
+            )
+            self._transfer_config = TransferConfig(
+                multipart_threshold=self.multipart_threshold,
+                multipart_chunksize=self.multipart_chunksize,
+                max_concurrency=self.max_concurrency,
+                use_threads=True
+            )
+            return self._client
+
+    def _object_key(self, key: str) -> str:
+        """プレフィックスを付けたオブジェクトキー"""
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    @staticmethod
+    def _is_not_found(error: Exception) -> bool:
+        """存在しないオブジェクトへの操作によるエラーか"""
+        response = getattr(error, "response", None) or {}
+        return str(response.get("Error", {}).get("Code")) in ("404", "NoSuchKey", "NotFound")
+
+    def upload_file(self, local_path: str, key: str, content_type: Optional[str] = None) -> None:
+        """ファイルをアップロードする（大きなファイルはマルチパートで並列に送信する）"""
+        client = self._get_client()
+        extra_args = {"ContentType": content_type} if content_type else None
+        try:
+            client.upload_file(local_path, self.bucket, self._object_key(key),
+                               ExtraArgs=extra_args, Config=self._transfer_config)
+        except Exception as e:
+            raise StorageError(f"オブジェクトのアップロードに失敗しました ({key}): {str(e)}")
+
+    def download_file(self, key: str, local_path: str) -> None:
+        """オブジェクトをファイルに書き出す（大きなファイルは範囲ごとに並列に取得する）"""
+        client = self._get_client()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+            client.download_file(self.bucket, self._object_key(key), local_path, Config=self._transfer_config)
+        except Exception as e:
+            raise StorageError(f"オブジェクトの取得に失敗しました ({key}): {str(e)}")
+
+    def exists(self, key: str) -> bool:
+        """オブジェクトが存在するか"""
+        client = self._get_client()
+        try:
+            client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except Exception as e:
+            if self._is_not_found(e):
+                return False
+            raise StorageError(f"オブジェクトの確認に失敗しました ({key}): {str(e)}")
+
+    def delete(self, key: str) -> None:
+        """オブジェクトを削除する（存在しない場合は何もしない）"""
+        client = self._get_client()
+        try:
+            client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        except Exception as e:
+            if not self._is_not_found(e):
+                raise StorageError(f"オブジェクトの削除に失敗しました ({key}): {str(e)}")
+
+    def presigned_url(self, key: str, filename: Optional[str] = None, expires_in: Optional[int] = None) -> Optional[str]:
+        """ダウンロード用の署名付きURLを発行する"""
+        client = self._get_client()
+        params = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        disposition = _content_disposition(filename)
+        if disposition:
+            params["ResponseContentDisposition"] = disposition
+        try:
+            return client.generate_presigned_url(
+                "get_object", Params=params, ExpiresIn=expires_in or self.presign_seconds
+            )
+        except Exception as e:
+            raise StorageError(f"署名付きURLの発行に失敗しました ({key}): {str(e)}")
+
+def create_storage_backend():
+    """設定に応じたストレージを作成する
+
+    USE_GCP=True の場合は GCP_BUCKET_NAME のバケットを GCS の S3 互換エンドポイントで利用する。
+    """
+    backend = settings.STORAGE_BACKEND.lower()
+    if settings.USE_GCP and settings.GCP_BUCKET_NAME:
+        backend = BACKEND_S3
+
+    if backend == BACKEND_LOCAL:
+        return LocalStorageBackend(settings.OBJECT_STORAGE_DIR)
+    if backend == BACKEND_S3:
+        use_gcs = settings.USE_GCP and settings.GCP_BUCKET_NAME
+        return S3StorageBackend(
+            settings.GCP_BUCKET_NAME if use_gcs else settings.S3_BUCKET,
+            prefix=settings.S3_PREFIX,
+            endpoint_url=settings.S3_ENDPOINT_URL or (GCS_ENDPOINT_URL if use_gcs else None),
+            region=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            force_path_style=settings.S3_FORCE_PATH_STYLE,
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNK_MB * 1024 * 1024,
+            max_concurrency=settings.S3_MAX_CONCURRENCY,
+            presign_seconds=settings.S3_PRESIGN_SECONDS
+        )
+    raise StorageError(f"未対応のストレージです: {settings.STORAGE_BACKEND}")
+
+def get_storage_backend():
+    """ストレージのシングルトンインスタンスを取得"""
+    global _storage_backend
+
+    with _storage_backend_lock:
+        if _storage_backend is None:
+            _storage_backend = create_storage_backend()
+            logger.info(f"オブジェクトストレージ: {_storage_backend.name}")
+        return _storage_backend
+
+def result_object_key(result_path: str, content_hash: Optional[str], job_id: str) -> str:
+    """成果物のオブジェクトキー
+
+    ハッシュが分かる場合は内容ごとのキーにし、結果を共有するジョブで同じオブジェクトを使う。
+    """
+    return f"results/{content_hash or job_id}/{os.path.basename(result_path)}"
+
+def publish_result(job_id: str, result_path: str, content_hash: Optional[str] = None) -> Optional[str]:
+    """成果物をオブジェクトストレージにアップロードし、結果ファイルの行にキーを記録する
+
+    同じ成果物を共有するジョブの行（同じ file_path）にも同じキーを記録する。
+    アップロード済みのオブジェクトは送り直さない。
+
+    Args:
+        job_id: ジョブID
+        result_path: 成果物のパス
+        content_hash: 成果物のSHA-256ハッシュ
+
+    Returns:
+        オブジェクトキー。アップロードできなかった場合はNone
+    """
+    if not result_path or not os.path.exists(result_path):
+        return None
+
+    backend = get_storage_backend()
+    key = result_object_key(result_path, content_hash, job_id)
+    try:
+        if backend.exists(key):
+            outcome = "reused"
+        else:
+            backend.upload_file(result_path, key, content_type="application/zip")
+            outcome = "published"
+            logger.info(f"成果物をアップロードしました: {job_id} -> {key}")
+    except StorageError as e:
+        with _publish_executor_lock:
+            _publish_stats["failed"] += 1
+        logger.error(f"成果物のアップロードに失敗しました（ローカルから配信します）: {str(e)}")
+        return None
+    with _publish_executor_lock:
+        _publish_stats[outcome] += 1
+
+    db = SessionLocal()
+    try:
+        db.query(File).filter(File.file_path == result_path, File.file_type == "result").update(
+            {File.storage_key: key}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+    return key
+
+def _get_publish_executor() -> ThreadPoolExecutor:
+    """成果物のアップロード用のスレッドプール"""
+    global _publish_executor
+
+    with _publish_executor_lock:
+        if _publish_executor is None:
+            _publish_executor = ThreadPoolExecutor(
+                max_workers=settings.STORAGE_PUBLISH_WORKERS, thread_name_prefix="publish"
+            )
+        return _publish_executor
+
+def publish_result_async(job_id: str, result_path: str, content_hash: Optional[str] = None) -> None:
+    """成果物のアップロードをバックグラウンドで実行する（完了を待たない）
+
+    アップロードが終わるまでのダウンロードはローカルの成果物から配信される。
+    """
+    try:
+        _get_publish_executor().submit(publish_result, job_id, result_path, content_hash)
+    except RuntimeError:
+        # シャットダウン中は行わない（次回のダウンロードもローカルから配信される）
+        pass
+
+def find_referenced_objects(conn, keys: Iterable[str]) -> Set[str]:
+    """ファイルの行から参照されているオブジェクトキーを返す
+
+    Args:
+        conn: データベース接続（セッションの場合は db.connection()）
+        keys: 確認するオブジェクトキー
+
+    Returns:
+        参照が残っているキーの集合
+    """
+    keys = list(set(keys))
+    if not keys:
+        return set()
+    return {row[0] for row in conn.execute(select(File.storage_key).where(File.storage_key.in_(keys)))}
+
+def delete_objects(keys: Iterable[str]) -> int:
+    """オブジェクトを削除する（失敗したものはログに残して続ける）
+
+    Returns:
+        削除したオブジェクト数
+    """
+    backend = get_storage_backend()
+    deleted = 0
+    for key in keys:
+        try:
+            backend.delete(key)
+            deleted += 1
+        except StorageError as e:
+            logger.warning(str(e))
+    return deleted
+
+def shutdown_publisher() -> None:
+    """成果物のアップロード用スレッドプールを停止する（実行中のアップロードは待たない）"""
+    with _publish_executor_lock:
+        if _publish_executor is not None:
+            _publish_executor.shutdown(wait=False)
+
+def storage_stats() -> Dict[str, Any]:
+    """オブジェクトストレージの利用状況"""
+    with _publish_executor_lock:
+        stats = dict(_publish_stats)
+    stats["backend"] = settings.STORAGE_BACKEND if _storage_backend is None else _storage_backend.name
+    return stats
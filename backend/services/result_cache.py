@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+from typing import Dict, Any, Optional
+
+# ファイルハッシュ計算時の読み込みサイズ
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+def compute_bytes_hash(content: bytes) -> str:
+    """バイト列のSHA-256ハッシュを計算する
+
+    Args:
+        content: 対象のバイト列
+
+    Returns:
+        16進数表記のSHA-256ハッシュ
+    """
+    return hashlib.sha256(content).hexdigest()
+
+def compute_file_hash(file_path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """ファイルのSHA-256ハッシュをチャンク単位で計算する
+
+    Args:
+        file_path: 対象ファイルのパス
+        chunk_size: 1回に読み込むバイト数
+
+    Returns:
+        16進数表記のSHA-256ハッシュ
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def canonicalize_params(parameters: Optional[Dict[str, Any]]) -> str:
+    """パラメータを正規化したJSON文字列に変換する
+
+    キー順序や空白の違いで別の結果とみなされないよう、
+    キーをソートし区切り文字を固定してシリアライズする。
+
+    Args:
+        parameters: ジョブパラメータ
+
+    Returns:
+        正規化されたJSON文字列
+    """
+    return json.dumps(
+        parameters or {},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+
+def make_result_key(job_type: str, content_hash: str, parameters: Optional[Dict[str, Any]]) -> str:
+    """結果キャッシュのキーを生成する
+
+    Args:
+        job_type: ジョブタイプ
+        content_hash: 入力ファイルのSHA-256ハッシュ
+        parameters: マージ済みのジョブパラメータ
+
+    Returns:
+        結果キャッシュキー（SHA-256）
+    """
+    source = f"{job_type}\n{content_hash}\n{canonicalize_params(parameters)}"
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import logging
+import datetime
+import threading
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from sqlalchemy import MetaData, Column, DateTime, create_engine, exists, func, inspect, select, text
+from sqlalchemy.orm import aliased
+
+from backend.config.settings import settings
+from backend.models.database import (
+    engine, DB_DIR, Job, File, EvaluationReport, DatasetMetadata, DatasetShot,
+    apply_job_status_deltas
+)
+from backend.services.thumbnails import get_thumbnail_service
+from backend.services.blob_store import get_blob_store, find_referenced_blobs
+from backend.services.object_storage import find_referenced_objects, delete_objects
+from backend.services.upload_sessions import get_upload_session_manager
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# グローバル変数
+_retention_service = None
+_retention_service_lock = threading.Lock()
+
+# アーカイブ対象となる終了済みのステータス
+TERMINAL_STATUSES = ["completed", "error", "cancelled"]
+
+# アーカイブするテーブル（削除時の外部キー制約に合わせて子テーブルから順に処理する）
+ARCHIVE_TABLES = [
+    DatasetShot.__table__,
+    DatasetMetadata.__table__,
+    EvaluationReport.__table__,
+    File.__table__,
+    Job.__table__,
+]
+
+# 成果物の扱い
+ARTIFACT_ACTION_DELETE = "delete"
+ARTIFACT_ACTION_ARCHIVE = "archive"
+
+# 起動後に最初の処理を行うまでの待ち時間（秒）
+INITIAL_DELAY_SECONDS = 60
+
+# アーカイブDBへのコピー時に一度に書き込む行数
+COPY_CHUNK_SIZE = 1000
+
+def select_expired_job_ids(conn, cutoff: datetime.datetime, limit: int) -> List[str]:
+    """保持期間を過ぎた終了済みジョブのIDを取得
+
+    submission_time の条件で (status, submission_time) のインデックスを使って
+    候補を絞り、終了日時が保持期間内のものを除外する。結果を再利用している
+    残りのジョブから source_job_id で参照されているジョブは、ショットや
+    サムネイルを共有しているため対象外とする（参照元が先にアーカイブされた後で対象になる）。
+
+    Args:
+        conn: データベース接続
+        cutoff: この日時より前に終了したジョブを対象とする
+        limit: 取得する上限数
+
+    Returns:
+        ジョブIDのリスト
+    """
+    reuser = aliased(Job)
+    query = (
+        select(Job.job_id)
+        .where(
+            Job.status.in_(TERMINAL_STATUSES),
+            Job.submission_time < cutoff,
+            func.coalesce(Job.end_time, Job.submission_time) < cutoff,
+            ~exists(select(1).where(reuser.source_job_id == Job.job_id))
+        )
+        .limit(limit)
+    )
+    return [row[0] for row in conn.execute(query)]
+
+def find_referenced_source_jobs(conn, job_ids: List[str]) -> Set[str]:
+    """残りのジョブから source_job_id で参照されているジョブIDを取得
+
+    Args:
+        conn: データベース接続
+        job_ids: 確認するジョブIDのリスト
+
+    Returns:
+        参照されているジョブIDの集合
+    """
+    if not job_ids:
+        return set()
+    return {
+        row[0] for row in conn.execute(
+            select(Job.source_job_id).where(Job.source_job_id.in_(job_ids)).distinct()
+        )
+    }
+
+class RetentionService:
+    """終了済みジョブのアーカイブとデータベースの保守を定期実行するサービス
+
+    保持期間を過ぎたジョブとその関連行をアーカイブDBにコピーしてから
+    メインDBから削除し、成果物は削除または退避する。あわせて増分VACUUMと
+    統計情報の更新を行い、メインDBの作業領域を小さく保つ。
+    """
+
+    def __init__(self, retention_days: int, interval_seconds: int, batch_size: int,
+                 artifact_action: str, archive_dir: str, archive_db_path: str):
+        self.retention_days = retention_days
+        self.interval_seconds = interval_seconds
+        self.batch_size = max(1, batch_size)
+        self.artifact_action = artifact_action
+        self.archive_dir = archive_dir
+        self.archive_db_path = archive_db_path
+        self._archive_engine = None
+        self._archive_tables: Dict[str, Any] = {}
+        self._run_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._last_run: Optional[Dict[str, Any]] = None
+
+    def start(self) -> None:
+        """定期実行スレッドを開始"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info(f"保持期間の処理を開始しました: 保持日数 {self.retention_days}日, 間隔 {self.interval_seconds}秒")
+
+    def stop(self) -> None:
+        """定期実行スレッドを停止"""
+        self._stop_event.set()
+
+    def _run(self) -> None:
+        """定期実行ループ"""
+        wait_seconds = min(INITIAL_DELAY_SECONDS, self.interval_seconds)
+        while not self._stop_event.wait(wait_seconds):
+            wait_seconds = self.interval_seconds
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"保持期間の処理中にエラーが発生しました: {str(e)}")
+
+    def run_once(self) -> Dict[str, Any]:
+        """アーカイブ、期限切れの分割アップロードの破棄、保守処理を1回実行する
+
+        Returns:
+            アーカイブしたジョブ数、破棄した分割アップロード数と保守処理の結果
+        """
+        with self._run_lock:
+            started_at = datetime.datetime.now()
+            archived = self.archive_expired_jobs()
+            # 完了も中止もされないまま期限を過ぎた分割アップロードを破棄する
+            expired_uploads = get_upload_session_manager().cleanup_expired(include_orphans=True)
+            maintenance = self.run_maintenance(analyze=archived > 0)
+            self._last_run = {
+                "started_at": started_at.isoformat(),
+                "duration_seconds": round((datetime.datetime.now() - started_at).total_seconds(), 2),
+                "archived_jobs": archived,
+                "expired_uploads": expired_uploads,
+                "maintenance": maintenance
+            }
+            return dict(self._last_run)
+
+    def archive_expired_jobs(self) -> int:
+        """保持期間を過ぎた終了済みジョブをバッチ単位でアーカイブする
+
+        Returns:
+            アーカイブしたジョブ数
+        """
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=self.retention_days)
+        total = 0
+        while not self._stop_event.is_set():
+            archived = self._archive_batch(cutoff)
+            total += archived
+            if archived < self.batch_size:
+                break
+
+        if total:
+            logger.info(f"保持期間を過ぎたジョブをアーカイブしました: {total}件")
+        return total
+
+    def _get_archive_engine(self):
+        """アーカイブDBのエンジンとテーブルを準備"""
+        if self._archive_engine is not None:
+            return self._archive_engine
+
+        os.makedirs(os.path.dirname(self.archive_db_path), exist_ok=True)
+        archive_engine = create_engine(f"sqlite:///{self.archive_db_path}")
+
+        # メインDBと同じ定義のテーブルに、アーカイブ日時のカラムを加える
+        archive_metadata = MetaData()
+        for table in ARCHIVE_TABLES:
+            archive_table = table.to_metadata(archive_metadata)
+            archive_table.append_column(Column("archived_at", DateTime, nullable=True))
+            self._archive_tables[table.name] = archive_table
+        archive_metadata.create_all(bind=archive_engine)
+
+        # 後からメインDBに追加されたカラムをアーカイブDBにも追加
+        inspector = inspect(archive_engine)
+        with archive_engine.begin() as conn:
+            for name, archive_table in self._archive_tables.items():
+                existing = {col["name"] for col in inspector.get_columns(name)}
+                for column in archive_table.columns:
+                    if column.name not in existing:
+                        column_type = column.type.compile(dialect=archive_engine.dialect)
+                        conn.execute(text(f"ALTER TABLE {name} ADD COLUMN {column.name} {column_type}"))
+                        logger.info(f"アーカイブDBの {name} テーブルに {column.name} カラムを追加しました")
+
+        self._archive_engine = archive_engine
+        return archive_engine
+
+    def _archive_batch(self, cutoff: datetime.datetime) -> int:
+        """1バッチ分のジョブをアーカイブDBにコピーしてメインDBから削除する
+
+        コピーは主キーで上書きするため、削除前に中断しても再実行で重複しない。
+        """
+        with engine.connect() as conn:
+            job_ids = select_expired_job_ids(conn, cutoff, self.batch_size)
+        if not job_ids:
+            return 0
+
+        # アーカイブDBにコピー
+        archive_engine = self._get_archive_engine()
+        archived_at = datetime.datetime.now()
+        with engine.connect() as src, archive_engine.begin() as dst:
+            for table in ARCHIVE_TABLES:
+                archive_table = self._archive_tables[table.name]
+                result = src.execute(select(table).where(table.c.job_id.in_(job_ids)))
+                for rows in result.partitions(COPY_CHUNK_SIZE):
+                    dst.execute(
+                        archive_table.insert().prefix_with("OR REPLACE"),
+                        [dict(row._mapping, archived_at=archived_at) for row in rows]
+                    )
+
+        # メインDBから削除（集計テーブルも同じトランザクションで更新）
+        with engine.begin() as conn:
+            # 選択後に結果の再利用元になったジョブは、ショットとサムネイルを残すため今回は削除しない
+            referenced = find_referenced_source_jobs(conn, job_ids)
+            if referenced:
+                job_ids = [job_id for job_id in job_ids if job_id not in referenced]
+                if not job_ids:
+                    return 0
+            artifacts = self._collect_artifacts(conn, job_ids)
+            storage_keys = {
+                row[0] for row in conn.execute(
+                    select(File.storage_key).where(File.job_id.in_(job_ids), File.storage_key.isnot(None))
+                )
+            }
+            result_keys = [
+                row[0] for row in conn.execute(
+                    select(Job.result_key).where(Job.job_id.in_(job_ids), Job.result_key.isnot(None))
+                )
+            ]
+            counts = conn.execute(
+                select(Job.job_type, Job.status, func.count())
+                .where(Job.job_id.in_(job_ids))
+                .group_by(Job.job_type, Job.status)
+            ).fetchall()
+
+            for table in ARCHIVE_TABLES:
+                conn.execute(table.delete().where(table.c.job_id.in_(job_ids)))
+
+            apply_job_status_deltas(conn, {
+                (job_type or "lora", status): -count for job_type, status, count in counts
+            })
+
+            # 結果を再利用している残りのジョブが参照する成果物は残す
+            protected: Set[str] = set()
+            if result_keys:
+                protected = {
+                    row[0] for row in conn.execute(
+                        select(Job.result_path).where(Job.result_key.in_(result_keys), Job.result_path.isnot(None))
+                    )
+                }
+            # 同じ内容の入力ファイル（ブロブ）を共有する残りのジョブが参照するものも残す
+            blob_store = get_blob_store()
+            protected |= find_referenced_blobs(conn, [path for _, path in artifacts if blob_store.contains(path)])
+            # オブジェクトストレージ上の成果物も、結果を共有する残りのジョブが参照するものは残す
+            storage_keys -= find_referenced_objects(conn, storage_keys)
+
+        self._dispose_artifacts([(job_id, path) for job_id, path in artifacts if path not in protected])
+        if storage_keys and self.artifact_action != ARTIFACT_ACTION_ARCHIVE:
+            delete_objects(sorted(storage_keys))
+        # サムネイルとコンタクトシートは再作成できるため、退避せずに削除する
+        thumbnail_service = get_thumbnail_service()
+        for job_id in job_ids:
+            thumbnail_service.remove_job(job_id)
+        return len(job_ids)
+
+    def _collect_artifacts(self, conn, job_ids: List[str]) -> Set[Tuple[str, str]]:
+        """ジョブに関連するファイルのパスを収集"""
+        artifacts: Set[Tuple[str, str]] = set()
+        for job_id, file_path, result_path in conn.execute(
+            select(Job.job_id, Job.file_path, Job.result_path).where(Job.job_id.in_(job_ids))
+        ):
+            artifacts.update((job_id, path) for path in (file_path, result_path) if path)
+        for model in (File, DatasetShot):
+            for job_id, file_path in conn.execute(
+                select(model.job_id, model.file_path).where(model.job_id.in_(job_ids))
+            ):
+                if file_path:
+                    artifacts.add((job_id, file_path))
+        return artifacts
+
+    def _dispose_artifacts(self, artifacts: List[Tuple[str, str]]) -> None:
+        """成果物を削除または退避する"""
+        for job_id, path in sorted(artifacts):
+            if not os.path.exists(path):
+                continue
+            try:
+                if self.artifact_action == ARTIFACT_ACTION_ARCHIVE:
+                    dest_dir = os.path.join(self.archive_dir, job_id)
+                    os.makedirs(dest_dir, exist_ok=True)
+                    shutil.move(path, os.path.join(dest_dir, os.path.basename(path)))
+                elif os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+
+                # ジョブ専用のディレクトリが空になった場合は削除
+                parent = os.path.dirname(path)
+                if os.path.basename(parent) == job_id and not os.listdir(parent):
+                    os.rmdir(parent)
+            except OSError as e:
+                logger.warning(f"成果物の整理に失敗しました: {path} - {str(e)}")
+
+    def run_maintenance(self, analyze: bool = False) -> Dict[str, Any]:
+        """増分VACUUMと統計情報の更新を行う
+
+        auto_vacuum が INCREMENTAL でない既存DBは、一度だけ VACUUM して切り替える。
+
+        Args:
+            analyze: 大量の行を削除した後など、ANALYZE で統計情報を取り直す場合はTrue
+
+        Returns:
+            保守処理の結果
+        """
+        if engine.dialect.name != "sqlite":
+            return {}
+
+        result: Dict[str, Any] = {}
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            auto_vacuum = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            if auto_vacuum != 2:  # 2 = INCREMENTAL
+                logger.info("auto_vacuum を INCREMENTAL に切り替えるため VACUUM を実行します")
+                conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.exec_driver_sql("VACUUM")
+                result["full_vacuum"] = True
+            else:
+                free_pages = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+                if free_pages:
+                    conn.exec_driver_sql(f"PRAGMA incremental_vacuum({int(settings.VACUUM_PAGES_PER_RUN)})").fetchall()
+                result["freed_pages"] = min(free_pages, settings.VACUUM_PAGES_PER_RUN)
+
+            if analyze:
+                conn.exec_driver_sql("ANALYZE")
+            else:
+                conn.exec_driver_sql("PRAGMA optimize")
+            result["analyzed"] = analyze
+
+            # 削除で膨らんだWALファイルを切り詰める
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+        logger.info(f"データベースの保守処理が完了しました: {result}")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """保持期間の処理の設定と直近の実行結果を返す"""
+        return {
+            "retention_days": self.retention_days,
+            "interval_seconds": self.interval_seconds,
+            "artifact_action": self.artifact_action,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "last_run": self._last_run
+        }
+
+def get_retention_service() -> RetentionService:
+    """プロセス共通の保持期間サービスを取得"""
+    global _retention_service
+    with _retention_service_lock:
+        if _retention_service is None:
+            _retention_service = RetentionService(
+                retention_days=settings.RETENTION_DAYS,
+                interval_seconds=settings.RETENTION_INTERVAL_SECONDS,
+                batch_size=settings.RETENTION_BATCH_SIZE,
+                artifact_action=settings.RETENTION_ARTIFACT_ACTION,
+                archive_dir=settings.ARCHIVE_DIR,
+                archive_db_path=settings.ARCHIVE_DATABASE_PATH or os.path.join(DB_DIR, "lora_platform_archive.db")
+            )
+        return _retention_service
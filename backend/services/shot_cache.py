@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+from backend.config.settings import settings
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# グローバル変数
+_shot_cache = None
+_shot_cache_lock = threading.Lock()
+
+class ShotCache:
+    """ジョブ間で共有するショット単位のレンダリングキャッシュ
+
+    VRMのハッシュと撮影条件から生成したキーでPNGを保存し、
+    合計サイズが上限を超えた場合は最も古く使われたものから削除する（LRU）。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: Optional[OrderedDict] = None  # key -> ファイルサイズ（古い順）
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(vrm_hash: str, expression: str, lighting: str, distance: str,
+                 angle: int, resolution: str, renderer_version: str) -> str:
+        """ショットのキャッシュキーを生成
+
+        Args:
+            vrm_hash: VRMファイルのSHA-256ハッシュ
+            expression: 表情
+            lighting: ライティング
+            distance: カメラ距離
+            angle: 角度
+            resolution: 出力解像度
+            renderer_version: レンダラーのバージョン
+
+        Returns:
+            キャッシュキー（SHA-256）
+        """
+        source = "\n".join([vrm_hash, expression, lighting, distance, str(angle), resolution, renderer_version])
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        """キーに対応するキャッシュファイルのパス"""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    def _ensure_index(self) -> None:
+        """キャッシュディレクトリを走査してLRUインデックスを構築（ロック取得済みで呼ぶ）"""
+        if self._entries is not None:
+            return
+
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for file_name in files:
+                if not file_name.endswith(".png"):
+                    continue
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, file_name[:-4], stat.st_size))
+
+        # 最終使用時刻（mtime）の古い順に並べる
+        found.sort()
+        self._entries = OrderedDict((key, size) for _, key, size in found)
+        self._total_bytes = sum(size for _, _, size in found)
+        logger.info(f"ショットキャッシュを読み込みました: {len(self._entries)}件, {self._total_bytes / (1024 * 1024):.1f}MB")
+
+    def get(self, key: str, dest_path: str) -> bool:
+        """キャッシュ済みのショットを dest_path に配置する
+
+        Args:
+            key: キャッシュキー
+            dest_path: 配置先のパス
+
+        Returns:
+            キャッシュにヒットした場合はTrue
+        """
+        with self._lock:
+            self._ensure_index()
+            if key not in self._entries:
+                self.misses += 1
+                return False
+
+            path = self._path(key)
+            try:
+                _link_or_copy(path, dest_path)
+                # 使用時刻を更新して再起動後もLRU順序を保つ
+                os.utime(path, None)
+            except OSError as e:
+                logger.warning(f"ショットキャッシュの読み込みに失敗しました: {key} - {str(e)}")
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return False
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def put(self, key: str, src_path: str) -> None:
+        """ショットをキャッシュに追加する
+
+        Args:
+            key: キャッシュキー
+            src_path: 追加するPNGファイルのパス
+        """
+        with self._lock:
+            self._ensure_index()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+
+            path = self._path(key)
+            temp_path = f"{path}.tmp"
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                shutil.copyfile(src_path, temp_path)
+                os.replace(temp_path, path)
+                size = os.path.getsize(path)
+            except OSError as e:
+                logger.warning(f"ショットキャッシュへの追加に失敗しました: {key} - {str(e)}")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                return
+
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self) -> None:
+        """上限サイズを超えた分を古いものから削除（ロック取得済みで呼ぶ）"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            logger.debug(f"ショットキャッシュから削除しました: {key}")
+
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュの統計情報を返す"""
+        with self._lock:
+            self._ensure_index()
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+def _link_or_copy(src_path: str, dest_path: str) -> None:
+    """ハードリンクで配置し、できない場合はコピーする"""
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    try:
+        os.link(src_path, dest_path)
+    except OSError:
+        shutil.copyfile(src_path, dest_path)
+
+def get_shot_cache() -> ShotCache:
+    """プロセス共通のショットキャッシュを取得"""
+    global _shot_cache
+    with _shot_cache_lock:
+        if _shot_cache is None:
+            _shot_cache = ShotCache(settings.SHOT_CACHE_DIR, settings.SHOT_CACHE_MAX_MB * 1024 * 1024)
+        return _shot_cache
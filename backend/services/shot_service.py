@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+from typing import List, Optional, Dict, Any, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from backend.models.database import Job, DatasetShot
+from backend.utils.pagination import paginate_keyset
+
+# データセットZIP内で画像が格納されているディレクトリ
+DATASET_ARCHIVE_DIR = "dataset"
+
+# ショット一覧で返す列（ファイルの保存先パスは返さない）
+SHOT_SUMMARY_COLUMNS = (
+    DatasetShot.shot_id,
+    DatasetShot.job_id,
+    DatasetShot.file_name,
+    DatasetShot.expression,
+    DatasetShot.lighting,
+    DatasetShot.camera_distance,
+    DatasetShot.angle,
+    DatasetShot.width,
+    DatasetShot.height,
+    DatasetShot.created_at,
+)
+
+def shot_image_url(shot_id: str) -> str:
+    """ショット画像を取得するURLを返す"""
+    return f"/dataset/shots/{shot_id}/image"
+
+def shot_thumbnail_url(shot_id: str) -> str:
+    """ショットのサムネイルを取得するURLを返す"""
+    return f"/dataset/shots/{shot_id}/thumbnail"
+
+def resolve_shot_job_id(db: Session, job_id: str) -> str:
+    """ショットを所有するジョブのIDを返す
+
+    結果を再利用したジョブや実行中のジョブに合流したジョブは自身のショットを持たず、
+    source_job_id が撮影した元ジョブを指す。以前のバージョンで連鎖して記録された
+    参照もたどり、元ジョブまで解決する。
+
+    Args:
+        db: データベースセッション
+        job_id: ジョブID
+
+    Returns:
+        ショットを所有するジョブのID（ジョブが見つからない場合は job_id のまま）
+    """
+    visited = {job_id}
+    while True:
+        source_job_id = db.query(Job.source_job_id).filter(Job.job_id == job_id).scalar()
+        if not source_job_id or source_job_id in visited:
+            return job_id
+        visited.add(source_job_id)
+        job_id = source_job_id
+
+def _filter_shots(query, expression: Optional[str], lighting: Optional[str], camera_distance: Optional[str],
+                  angle_min: Optional[int], angle_max: Optional[int]):
+    """ショットの属性による絞り込み条件をクエリに追加する"""
+    if expression:
+        query = query.filter(DatasetShot.expression == expression)
+    if lighting:
+        query = query.filter(DatasetShot.lighting == lighting)
+    if camera_distance:
+        query = query.filter(DatasetShot.camera_distance == camera_distance)
+
+    if angle_min is not None and angle_max is not None and angle_min > angle_max:
+        query = query.filter(or_(DatasetShot.angle >= angle_min, DatasetShot.angle <= angle_max))
+    else:
+        if angle_min is not None:
+            query = query.filter(DatasetShot.angle >= angle_min)
+        if angle_max is not None:
+            query = query.filter(DatasetShot.angle <= angle_max)
+    return query
+
+def query_shots(
+    db: Session,
+    job_id: Optional[str] = None,
+    expression: Optional[str] = None,
+    lighting: Optional[str] = None,
+    camera_distance: Optional[str] = None,
+    angle_min: Optional[int] = None,
+    angle_max: Optional[int] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_file_path: bool = False
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """条件に一致するショットを (created_at, shot_id) の降順でカーソル単位に取得する
+
+    angle_min が angle_max より大きい場合は 0° をまたぐ範囲（例: 315°〜45°）として扱う。
+
+    Args:
+        db: データベースセッション
+        job_id: ジョブIDで絞り込む場合に指定（結果を再利用したジョブは元ジョブのショットを返す）
+        expression: 表情で絞り込む場合に指定
+        lighting: ライティングで絞り込む場合に指定
+        camera_distance: カメラ距離で絞り込む場合に指定
+        angle_min: 角度の下限（両端を含む）
+        angle_max: 角度の上限（両端を含む）
+        limit: 取得する上限数
+        cursor: 前ページの next_cursor（先頭ページはNone）
+        include_file_path: 撮影時のファイルパス（file_path）も返す場合はTrue（サーバー内部での利用のみ）
+
+    Returns:
+        (ショット情報の辞書のリスト, 次ページのカーソル) のタプル
+
+    Raises:
+        InvalidCursorError: カーソルの形式が不正な場合
+    """
+    columns = SHOT_SUMMARY_COLUMNS + (DatasetShot.file_path,) if include_file_path else SHOT_SUMMARY_COLUMNS
+    query = db.query(*columns)
+    if job_id:
+        # 結果を再利用したジョブは撮影した元ジョブのショットを返す
+        query = query.filter(DatasetShot.job_id == resolve_shot_job_id(db, job_id))
+    query = _filter_shots(query, expression, lighting, camera_distance, angle_min, angle_max)
+
+    rows, next_cursor = paginate_keyset(query, DatasetShot.created_at, DatasetShot.shot_id, cursor=cursor, limit=limit)
+
+    shots = []
+    for row in rows:
+        shot = dict(row._mapping)
+        shot["image_url"] = shot_image_url(shot["shot_id"])
+        shot["thumbnail_url"] = shot_thumbnail_url(shot["shot_id"])
+        shots.append(shot)
+    return shots, next_cursor
+
+def query_new_shots(
+    db: Session,
+    job_id: str,
+    since: Optional[datetime.datetime] = None,
+    limit: int = 500,
+    **filters: Any
+) -> List[Dict[str, Any]]:
+    """ジョブのショットのうち、指定時刻以降に登録されたものを古い順に取得する（撮影中の追跡用）
+
+    実行中のジョブに合流したジョブは、元ジョブが撮影中のショットを返す。
+    登録時刻とコミットの順序は前後しうるため、呼び出し元は since を少し前に戻して問い合わせ、
+    ファイル名で重複を除くこと。
+
+    Args:
+        db: データベースセッション
+        job_id: ジョブID
+        since: この時刻以降（この時刻を含む）に登録されたショットを取得する（Noneは全件）
+        limit: 取得する上限数
+        **filters: query_shots と同じ絞り込み条件
+
+    Returns:
+        撮影時のファイルパスを含むショット情報の辞書のリスト
+    """
+    query = db.query(*SHOT_SUMMARY_COLUMNS, DatasetShot.file_path).filter(
+        DatasetShot.job_id == resolve_shot_job_id(db, job_id)
+    )
+    query = _filter_shots(query, filters.get("expression"), filters.get("lighting"), filters.get("camera_distance"),
+                          filters.get("angle_min"), filters.get("angle_max"))
+    if since is not None:
+        query = query.filter(DatasetShot.created_at >= since)
+    rows = query.order_by(DatasetShot.created_at.asc(), DatasetShot.shot_id.asc()).limit(limit).all()
+    return [dict(row._mapping) for row in rows]
+
+def get_shot_image_source(db: Session, shot_id: str) -> Optional[Dict[str, Any]]:
+    """ショット画像の取得元を返す
+
+    撮影時のファイルが残っていればそのパスを、なければデータセットZIP内のメンバー名を返す。
+
+    Args:
+        db: データベースセッション
+        shot_id: ショットID
+
+    Returns:
+        file_name, file_path, archive_path, archive_member を含む辞書。ショットがなければNone
+    """
+    row = (
+        db.query(DatasetShot.file_name, DatasetShot.file_path, Job.result_path)
+        .join(Job, Job.job_id == DatasetShot.job_id)
+        .filter(DatasetShot.shot_id == shot_id)
+        .first()
+    )
+    if not row:
+        return None
+
+    return {
+        "file_name": row.file_name,
+        "file_path": row.file_path,
+        "archive_path": row.result_path,
+        "archive_member": f"{DATASET_ARCHIVE_DIR}/{row.file_name}"
+    }
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import json
+import math
+import shutil
+import zipfile
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+from sqlalchemy import func
+
+from backend.config.settings import settings
+from backend.models.database import SessionLocal, Job, DatasetShot
+from backend.services.job_events import TERMINAL_STATUSES
+from backend.services.shot_service import get_shot_image_source, resolve_shot_job_id
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow がない環境ではサムネイルを作成しない
+    Image = None
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# グローバル変数
+_thumbnail_service = None
+_thumbnail_service_lock = threading.Lock()
+
+# サムネイルとコンタクトシートの形式
+THUMBNAIL_MEDIA_TYPE = "image/jpeg"
+THUMBNAIL_EXTENSION = ".jpg"
+
+# コンタクトシートのファイル名
+CONTACT_SHEET_NAME = "contact_sheet.jpg"
+CONTACT_SHEET_INDEX_NAME = "contact_sheet.json"
+
+# サムネイルとコンタクトシートの背景色（透過PNGの合成先）
+BACKGROUND_COLOR = (255, 255, 255)
+
+class ThumbnailUnavailableError(RuntimeError):
+    """サムネイルを作成できない場合のエラー（元画像がない、Pillow がないなど）"""
+    pass
+
+def thumbnail_job_dir(job_id: str) -> str:
+    """ジョブのサムネイルを保存するディレクトリ"""
+    return os.path.join(settings.THUMBNAIL_DIR, job_id)
+
+def thumbnail_path(job_id: str, shot_id: str) -> str:
+    """ショットのサムネイルのパス"""
+    return os.path.join(thumbnail_job_dir(job_id), f"{shot_id}{THUMBNAIL_EXTENSION}")
+
+def _open_source_image(source: Dict[str, Any]):
+    """ショットの元画像を開く（撮影時のファイルを優先し、なければデータセットZIPから読む）"""
+    if source.get("file_path") and os.path.exists(source["file_path"]):
+        return Image.open(source["file_path"])
+    archive_path = source.get("archive_path")
+    if archive_path and os.path.exists(archive_path):
+        try:
+            with zipfile.ZipFile(archive_path) as zf:
+                return Image.open(io.BytesIO(zf.read(source["archive_member"])))
+        except (KeyError, zipfile.BadZipFile):
+            pass
+    raise ThumbnailUnavailableError(f"ショット画像が見つかりません: {source.get('file_name')}")
+
+def _flatten(image):
+    """透過を背景色に合成してRGBにする（JPEGは透過を持てないため）"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, BACKGROUND_COLOR)
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+def _save_atomic(image, path: str, quality: int) -> None:
+    """一時ファイルに書き込んでから置き換える（読み込み中のクライアントに書きかけを見せない）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        image.save(temp_path, "JPEG", quality=quality, optimize=True)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+class ThumbnailService:
+    """撮影したショットのサムネイルとジョブごとのコンタクトシートを作成するサービス
+
+    撮影済みのショットが登録されるとバックグラウンドのスレッドプールでサムネイルを作成し、
+    続けてジョブのコンタクトシート（全ショットを並べた1枚の画像と、各ショットの位置を記した索引）を
+    作り直す。撮影中はショットが次々に登録されるため、コンタクトシートの作り直しはジョブごとに
+    1件だけ予約し、実行中に届いた登録はまとめて次の1回で反映する。
+    """
+
+    def __init__(self, thumbnail_dir: str, max_workers: int, size: int, tile_size: int,
+                 columns: int, quality: int):
+        self.thumbnail_dir = thumbnail_dir
+        self.size = size
+        self.tile_size = tile_size
+        self.columns = columns
+        self.quality = quality
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+        self._lock = threading.Lock()
+        self._sheet_pending: Dict[str, bool] = {}  # job_id -> 実行中に再作成の要求があったか
+        self.generated = 0
+        self.failed = 0
+        self.sheets_built = 0
+
+        os.makedirs(self.thumbnail_dir, exist_ok=True)
+
+    @property
+    def available(self) -> bool:
+        """サムネイルを作成できるか（Pillow がインストールされているか）"""
+        return Image is not None
+
+    def create_thumbnail(self, job_id: str, shot_id: str, source: Dict[str, Any]) -> str:
+        """ショットのサムネイルを作成する（作成済みの場合は何もしない）
+
+        Args:
+            job_id: ジョブID
+            shot_id: ショットID
+            source: get_shot_image_source が返す元画像の取得元
+
+        Returns:
+            サムネイルのパス
+
+        Raises:
+            ThumbnailUnavailableError: 元画像がない、または Pillow がない場合
+        """
+        path = thumbnail_path(job_id, shot_id)
+        if os.path.exists(path):
+            return path
+        if not self.available:
+            raise ThumbnailUnavailableError("Pillow がインストールされていないためサムネイルを作成できません")
+
+        with _open_source_image(source) as image:
+            # PNG は縮小しながら読み込めないため、先に目的のサイズ付近まで縮める
+            image.draft("RGB", (self.size, self.size))
+            thumbnail = _flatten(image)
+        thumbnail.thumbnail((self.size, self.size), Image.LANCZOS)
+        _save_atomic(thumbnail, path, self.quality)
+        with self._lock:
+            self.generated += 1
+        return path
+
+    def get_thumbnail(self, shot_id: str) -> Optional[str]:
+        """ショットのサムネイルのパスを返す（まだない場合はその場で作成する）
+
+        Args:
+            shot_id: ショットID
+
+        Returns:
+            サムネイルのパス。ショットが存在しない場合はNone
+
+        Raises:
+            ThumbnailUnavailableError: サムネイルを作成できない場合
+        """
+        db = SessionLocal()
+        try:
+            job_id = db.query(DatasetShot.job_id).filter(DatasetShot.shot_id == shot_id).scalar()
+            if job_id is None:
+                return None
+            path = thumbnail_path(job_id, shot_id)
+            if os.path.exists(path):
+                return path
+            source = get_shot_image_source(db, shot_id)
+        finally:
+            db.close()
+        return self.create_thumbnail(job_id, shot_id, source)
+
+    def enqueue_shots(self, job_id: str, shot_ids: Iterable[str]) -> None:
+        """登録されたショットのサムネイル作成とコンタクトシートの更新を予約する
+
+        Args:
+            job_id: ジョブID
+            shot_ids: 新たに登録された（または元画像が補完された）ショットID
+        """
+        shot_ids = list(shot_ids)
+        if not shot_ids or not self.available:
+            return
+        try:
+            self._executor.submit(self._process_shots, job_id, shot_ids)
+        except RuntimeError:
+            # シャットダウン中は予約しない（表示時にその場で作成される）
+            pass
+
+    def _process_shots(self, job_id: str, shot_ids: List[str]) -> None:
+        """ショットのサムネイルを作成し、コンタクトシートの更新を予約する"""
+        db = SessionLocal()
+        try:
+            sources = [(shot_id, get_shot_image_source(db, shot_id)) for shot_id in shot_ids]
+        finally:
+            db.close()
+
+        for shot_id, source in sources:
+            if source is None:
+                continue
+            try:
+                self.create_thumbnail(job_id, shot_id, source)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                logger.warning(f"サムネイルの作成に失敗しました ({job_id}/{shot_id}): {str(e)}")
+
+        self._schedule_sheet(job_id)
+
+    def _schedule_sheet(self, job_id: str) -> None:
+        """コンタクトシートの作り直しを予約する（予約済み・実行中の場合はまとめる）"""
+        with self._lock:
+            if job_id in self._sheet_pending:
+                self._sheet_pending[job_id] = True
+                return
+            self._sheet_pending[job_id] = False
+        try:
+            self._executor.submit(self._run_sheet, job_id)
+        except RuntimeError:
+            with self._lock:
+                self._sheet_pending.pop(job_id, None)
+
+    def _run_sheet(self, job_id: str) -> None:
+        """コンタクトシートを作り直す（実行中に要求があればもう一度作り直す）"""
+        while True:
+            try:
+                self.build_contact_sheet(job_id)
+            except Exception as e:
+                logger.warning(f"コンタクトシートの作成に失敗しました ({job_id}): {str(e)}")
+            with self._lock:
+                if not self._sheet_pending.get(job_id):
+                    self._sheet_pending.pop(job_id, None)
+                    return
+                self._sheet_pending[job_id] = False
+
+    def _list_job_shots(self, job_id: str) -> Tuple[List[Tuple[str, str]], bool]:
+        """ジョブのショットを登録順に返す（コンタクトシート上の位置を撮影中も変えないため）
+
+        Returns:
+            ((shot_id, file_name) のリスト, 撮影が終わっているか) のタプル。
+            状態を先に読むため、終了済みの場合はすべてのショットが含まれる
+        """
+        db = SessionLocal()
+        try:
+            status = db.query(Job.status).filter(Job.job_id == job_id).scalar()
+            rows = (
+                db.query(DatasetShot.shot_id, DatasetShot.file_name)
+                .filter(DatasetShot.job_id == job_id)
+                .order_by(DatasetShot.created_at.asc(), DatasetShot.shot_id.asc())
+                .all()
+            )
+            return [(row.shot_id, row.file_name) for row in rows], status in TERMINAL_STATUSES
+        finally:
+            db.close()
+
+    def _load_sheet_state(self, job_id: str) -> Tuple[str, bool, int]:
+        """コンタクトシートの鮮度の確認に使う情報を返す
+
+        Returns:
+            (ショットを所有するジョブのID, 撮影が終わっているか, 登録済みのショット数) のタプル。
+            撮影が終わっている場合、ショット数は数えずに -1 を返す
+        """
+        db = SessionLocal()
+        try:
+            shot_job_id = resolve_shot_job_id(db, job_id)
+            status = db.query(Job.status).filter(Job.job_id == shot_job_id).scalar()
+            if status in TERMINAL_STATUSES:
+                return shot_job_id, True, -1
+            count = db.query(func.count(DatasetShot.shot_id)).filter(DatasetShot.job_id == shot_job_id).scalar()
+            return shot_job_id, False, count
+        finally:
+            db.close()
+
+    def build_contact_sheet(self, job_id: str, generate_missing: bool = False) -> Optional[Dict[str, Any]]:
+        """ジョブのコンタクトシートと索引を作成する
+
+        各ショットはサムネイルを縮小したタイルとして登録順に並べる。索引にはショットごとの
+        タイルの位置（x, y, width, height）を記録し、CSSスプライトとして使えるようにする。
+
+        Args:
+            job_id: ジョブID
+            generate_missing: サムネイルがないショットをその場で作成する場合はTrue
+
+        Returns:
+            索引の辞書。ショットがない場合はNone
+
+        Raises:
+            ThumbnailUnavailableError: Pillow がない場合
+        """
+        if not self.available:
+            raise ThumbnailUnavailableError("Pillow がインストールされていないためコンタクトシートを作成できません")
+
+        shots, finished = self._list_job_shots(job_id)
+        if not shots:
+            return None
+
+        columns = min(self.columns, len(shots))
+        rows = math.ceil(len(shots) / columns)
+        sheet = Image.new("RGB", (columns * self.tile_size, rows * self.tile_size), BACKGROUND_COLOR)
+        tiles = {}
+        for position, (shot_id, file_name) in enumerate(shots):
+            path = thumbnail_path(job_id, shot_id)
+            if not os.path.exists(path):
+                if not generate_missing:
+                    continue
+                try:
+                    path = self.get_thumbnail(shot_id)
+                except ThumbnailUnavailableError:
+                    continue
+                if path is None:
+                    continue
+            try:
+                with Image.open(path) as thumbnail:
+                    thumbnail.draft("RGB", (self.tile_size, self.tile_size))
+                    tile = thumbnail.convert("RGB")
+            except OSError as e:
+                logger.warning(f"サムネイルを読み込めません ({path}): {str(e)}")
+                continue
+            tile.thumbnail((self.tile_size, self.tile_size), Image.LANCZOS)
+
+            # タイルの中央に配置する
+            x = (position % columns) * self.tile_size
+            y = (position // columns) * self.tile_size
+            offset_x = (self.tile_size - tile.width) // 2
+            offset_y = (self.tile_size - tile.height) // 2
+            sheet.paste(tile, (x + offset_x, y + offset_y))
+            tiles[shot_id] = {
+                "file_name": file_name,
+                "x": x + offset_x,
+                "y": y + offset_y,
+                "width": tile.width,
+                "height": tile.height
+            }
+
+        index = {
+            "job_id": job_id,
+            "tile_size": self.tile_size,
+            "columns": columns,
+            "rows": rows,
+            "width": sheet.width,
+            "height": sheet.height,
+            "total_shots": len(shots),
+            "included_shots": len(tiles),
+            "finished": finished,
+            "tiles": tiles
+        }
+
+        sheet_dir = thumbnail_job_dir(job_id)
+        _save_atomic(sheet, os.path.join(sheet_dir, CONTACT_SHEET_NAME), self.quality)
+        index_path = os.path.join(sheet_dir, CONTACT_SHEET_INDEX_NAME)
+        temp_path = f"{index_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(temp_path, index_path)
+
+        with self._lock:
+            self.sheets_built += 1
+        return index
+
+    def get_contact_sheet(self, job_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """ジョブのコンタクトシートを返す
+
+        結果を再利用したジョブや合流したジョブは、撮影した元ジョブのコンタクトシートを返す。
+        撮影が終わった後に作成したコンタクトシートはそのまま返す。作成されていない場合や、
+        撮影中で登録済みのショット数と一致しない場合、撮影中に作成したまま終了した場合は、
+        その場で不足するサムネイルを作成して作り直す。画像を読めないショットがあっても
+        total_shots で比較するため、要求のたびに作り直すことはない。
+
+        Args:
+            job_id: ジョブID
+
+        Returns:
+            (コンタクトシートのパス, 索引) のタプル。ジョブにショットがない場合はNone
+        """
+        shot_job_id, finished, shot_count = self._load_sheet_state(job_id)
+        sheet_dir = thumbnail_job_dir(shot_job_id)
+        sheet_path = os.path.join(sheet_dir, CONTACT_SHEET_NAME)
+        index = None
+        try:
+            with open(os.path.join(sheet_dir, CONTACT_SHEET_INDEX_NAME), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        if index is not None and os.path.exists(sheet_path):
+            if index.get("finished") or (not finished and index.get("total_shots") == shot_count):
+                return sheet_path, index
+
+        index = self.build_contact_sheet(shot_job_id, generate_missing=True)
+        if index is None:
+            return None
+        return sheet_path, index
+
+    def remove_job(self, job_id: str) -> None:
+        """ジョブのサムネイルとコンタクトシートを削除する"""
+        shutil.rmtree(thumbnail_job_dir(job_id), ignore_errors=True)
+
+    def shutdown(self) -> None:
+        """スレッドプールを停止する（予約済みの処理は破棄する）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """サムネイル作成の状況"""
+        with self._lock:
+            return {
+                "available": self.available,
+                "generated": self.generated,
+                "failed": self.failed,
+                "sheets_built": self.sheets_built,
+                "pending_sheets": len(self._sheet_pending)
+            }
+
+def get_thumbnail_service() -> ThumbnailService:
+    """サムネイルサービスのシングルトンインスタンスを取得"""
+    global _thumbnail_service
+
+    with _thumbnail_service_lock:
+        if _thumbnail_service is None:
+            _thumbnail_service = ThumbnailService(
+                settings.THUMBNAIL_DIR,
+                settings.THUMBNAIL_WORKERS,
+                settings.THUMBNAIL_SIZE,
+                settings.CONTACT_SHEET_TILE_SIZE,
+                settings.CONTACT_SHEET_COLUMNS,
+                settings.THUMBNAIL_QUALITY
+            )
+        return _thumbnail_service
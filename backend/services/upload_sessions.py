@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+from backend.config.settings import settings
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# グローバル変数
+_upload_session_manager = None
+_upload_session_manager_lock = threading.Lock()
+
+# クライアントが指定できるチャンクサイズの範囲（バイト）
+MIN_CHUNK_SIZE = 256 * 1024  # 256KB
+MAX_CHUNK_SIZE = 64 * 1024 * 1024  # 64MB
+
+# Content-Range ヘッダー（bytes 開始-終了/全体）
+CONTENT_RANGE_PATTERN = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+class UploadSessionNotFoundError(KeyError):
+    """アップロードセッションが存在しない（期限切れを含む）場合の例外"""
+    pass
+
+class InvalidChunkRangeError(ValueError):
+    """チャンクの範囲が不正な場合の例外"""
+    pass
+
+class UploadIncompleteError(ValueError):
+    """未受信のチャンクが残っている状態で完了しようとした場合の例外"""
+
+    def __init__(self, missing_chunks: List[int]):
+        self.missing_chunks = missing_chunks
+        super().__init__(f"未受信のチャンクがあります: {len(missing_chunks)}件")
+
+class ChecksumMismatchError(ValueError):
+    """組み立てたファイルのチェックサムが一致しない場合の例外"""
+    pass
+
+def parse_content_range(header: Optional[str]) -> Tuple[int, int, int]:
+    """Content-Range ヘッダーを解析する
+
+    Args:
+        header: "bytes 開始-終了/全体" 形式のヘッダー値（終了位置を含む）
+
+    Returns:
+        (開始位置, 終了位置（含まない）, 全体サイズ) のタプル
+
+    Raises:
+        InvalidChunkRangeError: 形式が不正な場合
+    """
+    match = CONTENT_RANGE_PATTERN.match((header or "").strip())
+    if not match:
+        raise InvalidChunkRangeError(f"Content-Range ヘッダーの形式が不正です: {header}")
+    start, last, total = (int(value) for value in match.groups())
+    if last < start or last >= total:
+        raise InvalidChunkRangeError(f"Content-Range の範囲が不正です: {header}")
+    return start, last + 1, total
+
+class UploadSession:
+    """1ファイル分の分割アップロードの状態
+
+    受信したチャンクはあらかじめ全体サイズに確保したファイルの該当位置へ直接書き込むため、
+    完了時に連結し直す必要がない。SHA-256は先頭から連続して受信済みの範囲まで逐次計算し、
+    順番どおりに届いたチャンクは受信時のデータからそのまま計算する。
+    """
+
+    def __init__(self, upload_id: str, filename: str, size: int, chunk_size: int,
+                 part_path: str, metadata: Optional[Dict[str, Any]] = None):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.chunk_size = chunk_size
+        self.total_chunks = max(1, (size + chunk_size - 1) // chunk_size)
+        self.part_path = part_path
+        self.metadata = metadata or {}
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.received: Set[int] = set()
+        self.completed = False
+        self._digest = hashlib.sha256()
+        self._hashed_chunks = 0  # 先頭から何チャンク目までハッシュに反映したか
+        self._lock = threading.Lock()
+
+    def chunk_range(self, index: int) -> Tuple[int, int]:
+        """チャンク番号に対応する (開始位置, 終了位置（含まない）)"""
+        start = index * self.chunk_size
+        return start, min(start + self.chunk_size, self.size)
+
+    def chunk_index(self, start: int, end: int) -> int:
+        """バイト範囲に対応するチャンク番号を返す
+
+        Raises:
+            InvalidChunkRangeError: 範囲がチャンクの境界と一致しない場合
+        """
+        index = start // self.chunk_size
+        if start % self.chunk_size or index >= self.total_chunks or self.chunk_range(index) != (start, end):
+            raise InvalidChunkRangeError(
+                f"範囲はチャンクの境界（{self.chunk_size}バイト単位）に合わせてください: {start}-{end - 1}"
+            )
+        return index
+
+    def missing_chunks(self) -> List[int]:
+        """未受信のチャンク番号"""
+        return [index for index in range(self.total_chunks) if index not in self.received]
+
+    def write_chunk(self, index: int, data: bytes) -> bool:
+        """チャンクをファイルの該当位置に書き込む（スレッドプール上で実行）
+
+        Args:
+            index: チャンク番号
+            data: チャンクのデータ
+
+        Returns:
+            新たに受信したチャンクの場合はTrue（受信済みのチャンクは書き込まない）
+        """
+        start, end = self.chunk_range(index)
+        if len(data) != end - start:
+            raise InvalidChunkRangeError(f"チャンク{index}のサイズが一致しません: {len(data)}バイト（期待値: {end - start}バイト）")
+
+        with self._lock:
+            if index in self.received:
+                return False
+
+        # 並列に届いたチャンクも互いに別の位置へ書き込むため、ファイルハンドルを分けて同時に書ける
+        with open(self.part_path, "r+b") as f:
+            f.seek(start)
+            f.write(data)
+
+        with self._lock:
+            if index in self.received:
+                return False
+            self.received.add(index)
+            self.updated_at = time.time()
+            self._advance_digest(index, data)
+        return True
+
+    def _advance_digest(self, index: int, data: bytes) -> None:
+        """先頭から連続して受信済みの範囲までハッシュを進める（ロック取得済みで呼ぶ）"""
+        while self._hashed_chunks in self.received:
+            if self._hashed_chunks == index:
+                self._digest.update(data)
+            else:
+                # 先に届いていたチャンクはファイルから読み直す（書き込み直後のためページキャッシュに載っている）
+                start, end = self.chunk_range(self._hashed_chunks)
+                with open(self.part_path, "rb") as f:
+                    f.seek(start)
+                    self._digest.update(f.read(end - start))
+            self._hashed_chunks += 1
+
+    def hexdigest(self) -> str:
+        """全チャンク受信後のSHA-256"""
+        with self._lock:
+            return self._digest.hexdigest()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """セッション情報を辞書として返す"""
+        with self._lock:
+            missing = self.missing_chunks()
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "total_chunks": self.total_chunks,
+            "received_chunks": self.total_chunks - len(missing),
+            "missing_chunks": missing,
+            "complete": not missing,
+            "expires_at": self.updated_at + settings.UPLOAD_SESSION_TTL_SECONDS
+        }
+
+class UploadSessionManager:
+    """分割アップロードのセッションを管理する
+
+    セッションはメモリ上で管理し、最後にチャンクを受信してから
+    ttl_seconds を過ぎたものは書きかけのファイルごと破棄する。
+    再起動で管理から外れた書きかけのファイルも、同じ期間を過ぎたら削除する。
+    """
+
+    def __init__(self, session_dir: str, ttl_seconds: int, default_chunk_size: int):
+        self.session_dir = session_dir
+        self.ttl_seconds = ttl_seconds
+        self.default_chunk_size = default_chunk_size
+        self._sessions: Dict[str, UploadSession] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(self.session_dir, exist_ok=True)
+        self._remove_stale_part_files()
+
+    def _remove_stale_part_files(self) -> int:
+        """どのセッションにも属さず、期限を過ぎた書きかけのファイルを削除する
+
+        Returns:
+            削除したファイル数
+        """
+        threshold = time.time() - self.ttl_seconds
+        with self._lock:
+            active_paths = {session.part_path for session in self._sessions.values()}
+        removed = 0
+        for entry in os.scandir(self.session_dir):
+            if not entry.name.endswith(".part") or entry.path in active_paths:
+                continue
+            try:
+                if entry.is_file() and entry.stat().st_mtime < threshold:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info(f"残っていた書きかけのアップロードファイルを削除しました: {removed}件")
+        return removed
+
+    def create(self, filename: str, size: int, max_bytes: int, chunk_size: Optional[int] = None,
+               metadata: Optional[Dict[str, Any]] = None) -> UploadSession:
+        """アップロードセッションを作成し、全体サイズ分のファイルを確保する
+
+        Args:
+            filename: アップロードするファイル名
+            size: ファイルの全体サイズ（バイト）
+            max_bytes: サイズ上限（バイト）
+            chunk_size: チャンクサイズ（省略時は設定値）
+            metadata: 完了時に使用する任意の情報（ジョブパラメータなど）
+
+        Returns:
+            作成したセッション
+
+        Raises:
+            InvalidChunkRangeError: サイズやチャンクサイズが不正な場合
+        """
+        if size <= 0:
+            raise InvalidChunkRangeError("ファイルサイズは1バイト以上にしてください")
+        if size > max_bytes:
+            raise InvalidChunkRangeError(f"ファイルサイズは{max_bytes / (1024 * 1024):.0f}MB以下にしてください")
+
+        chunk_size = chunk_size or self.default_chunk_size
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise InvalidChunkRangeError(
+                f"チャンクサイズは{MIN_CHUNK_SIZE}〜{MAX_CHUNK_SIZE}バイトの範囲で指定してください"
+            )
+
+        self.cleanup_expired()
+
+        upload_id = str(uuid.uuid4())
+        part_path = os.path.join(self.session_dir, f"{upload_id}.part")
+        with open(part_path, "wb") as f:
+            f.truncate(size)
+
+        session = UploadSession(upload_id, os.path.basename(filename), size, chunk_size, part_path, metadata)
+        with self._lock:
+            self._sessions[upload_id] = session
+
+        logger.info(f"分割アップロードを開始しました: {upload_id}, ファイル: {session.filename}, "
+                    f"サイズ: {size}バイト, チャンク数: {session.total_chunks}")
+        return session
+
+    def get(self, upload_id: str) -> UploadSession:
+        """アップロードセッションを取得する
+
+        Raises:
+            UploadSessionNotFoundError: セッションが存在しない、または期限切れの場合
+        """
+        with self._lock:
+            session = self._sessions.get(upload_id)
+        if session is None or self._is_expired(session):
+            if session is not None:
+                self.discard(upload_id)
+            raise UploadSessionNotFoundError(upload_id)
+        return session
+
+    def finalize(self, upload_id: str, target_path: str, expected_sha256: Optional[str] = None) -> Tuple[UploadSession, str]:
+        """全チャンクの受信を確認し、チェックサムを検証してファイルを保存先へ移動する
+
+        同じセッションを二重に完了できないよう、移動後にセッションを削除する。
+
+        Args:
+            upload_id: アップロードID
+            target_path: 保存先のパス
+            expected_sha256: クライアントが計算したSHA-256（省略時は検証しない）
+
+        Returns:
+            (セッション, 16進数表記のSHA-256ハッシュ) のタプル
+
+        Raises:
+            UploadSessionNotFoundError: セッションが存在しない場合
+            UploadIncompleteError: 未受信のチャンクがある場合
+            ChecksumMismatchError: チェックサムが一致しない場合（セッションは破棄される）
+        """
+        session = self.get(upload_id)
+        with session._lock:
+            if session.completed:
+                raise UploadSessionNotFoundError(upload_id)
+            missing = session.missing_chunks()
+            if missing:
+                raise UploadIncompleteError(missing)
+            content_hash = session._digest.hexdigest()
+            session.completed = True
+
+        if expected_sha256 and expected_sha256.lower() != content_hash:
+            self.discard(upload_id)
+            raise ChecksumMismatchError(f"チェックサムが一致しません（受信データ: {content_hash}）")
+
+        # 確保済みのファイルをそのまま保存先へ移動する（データの再読み込みや連結は不要）
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(target_path)), exist_ok=True)
+            os.replace(session.part_path, target_path)
+        except OSError:
+            with session._lock:
+                session.completed = False
+            raise
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+
+        logger.info(f"分割アップロードが完了しました: {upload_id}, 保存先: {target_path}")
+        return session, content_hash
+
+    def discard(self, upload_id: str) -> bool:
+        """アップロードセッションと書きかけのファイルを破棄する
+
+        Returns:
+            セッションが存在した場合はTrue
+        """
+        with self._lock:
+            session = self._sessions.pop(upload_id, None)
+        if session is None:
+            return False
+        try:
+            if os.path.exists(session.part_path):
+                os.remove(session.part_path)
+        except OSError as e:
+            logger.warning(f"書きかけのアップロードファイルを削除できませんでした: {session.part_path}, {str(e)}")
+        return True
+
+    def cleanup_expired(self, include_orphans: bool = False) -> int:
+        """期限切れのセッションを破棄する
+
+        Args:
+            include_orphans: どのセッションにも属さない期限切れのファイルも削除する場合はTrue
+
+        Returns:
+            破棄したセッション数（削除した書きかけのファイル数を含む）
+        """
+        with self._lock:
+            expired = [upload_id for upload_id, session in self._sessions.items() if self._is_expired(session)]
+        for upload_id in expired:
+            self.discard(upload_id)
+        if expired:
+            logger.info(f"期限切れの分割アップロードを破棄しました: {len(expired)}件")
+        if include_orphans:
+            return len(expired) + self._remove_stale_part_files()
+        return len(expired)
+
+    def _is_expired(self, session: UploadSession) -> bool:
+        """最後の受信から期限を過ぎているか"""
+        return time.time() - session.updated_at > self.ttl_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """分割アップロードの状況"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "active_sessions": len(sessions),
+            "pending_bytes": sum(session.size for session in sessions)
+        }
+
+def get_upload_session_manager() -> UploadSessionManager:
+    """分割アップロードのセッション管理のシングルトンインスタンスを取得"""
+    global _upload_session_manager
+
+    with _upload_session_manager_lock:
+        if _upload_session_manager is None:
+            _upload_session_manager = UploadSessionManager(
+                settings.UPLOAD_SESSION_DIR,
+                settings.UPLOAD_SESSION_TTL_SECONDS,
+                settings.UPLOAD_CHUNK_SIZE_MB * 1024 * 1024
+            )
+        return _upload_session_manager
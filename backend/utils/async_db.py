@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from backend.config.settings import settings
+from backend.models.database import SessionLocal
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# データベースアクセス専用のスレッドプール
+# コネクションプールを使い切らないよう、同時実行数をプールサイズ以下に制限する
+_db_executor = ThreadPoolExecutor(
+    max_workers=min(settings.DB_EXECUTOR_WORKERS, settings.DB_POOL_SIZE),
+    thread_name_prefix="db"
+)
+
+async def run_db(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """同期的なデータベース処理をスレッドプールで実行する
+
+    非同期ハンドラーからSQLAlchemyのセッションを使う処理を呼び出す際に使用し、
+    ブロッキングI/Oでイベントループを止めないようにする。
+
+    Args:
+        func: 実行する関数
+        *args: 関数の位置引数
+        **kwargs: 関数のキーワード引数
+
+    Returns:
+        関数の戻り値
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+async def run_in_session(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """新しいセッションを開いて関数をスレッドプールで実行する
+
+    func の第1引数にセッションを渡す。セッションは実行スレッド内で作成・
+    クローズされるため、遅延ロードが必要な属性は func の中で参照すること。
+
+    Args:
+        func: セッションを第1引数に受け取る関数
+        *args: 関数の位置引数
+        **kwargs: 関数のキーワード引数
+
+    Returns:
+        関数の戻り値
+    """
+    def _call():
+        db = SessionLocal()
+        try:
+            return func(db, *args, **kwargs)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    return await run_db(_call)
+
+def shutdown_db_executor() -> None:
+    """データベース用スレッドプールを停止"""
+    _db_executor.shutdown(wait=False)
+    logger.info("データベース用スレッドプールを停止しました")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional
+
+import aiofiles
+
+from backend.config.settings import settings
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# ファイル操作専用のスレッドプール
+# 遅いディスクでファイル操作が詰まっても、データベース処理やイベントループ既定のスレッドプールを巻き込まない
+_fs_executor = ThreadPoolExecutor(max_workers=settings.FS_EXECUTOR_WORKERS, thread_name_prefix="fs")
+
+async def run_fs(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """同期的なファイル操作（または画像処理などのCPU処理）をスレッドプールで実行する
+
+    非同期ハンドラーから os / shutil / open などのブロッキングI/Oを呼び出す際に使用し、
+    イベントループを止めないようにする。複数の操作はまとめて1つの関数にし、
+    スレッドの切り替えを1回で済ませること。
+
+    Args:
+        func: 実行する関数
+        *args: 関数の位置引数
+        **kwargs: 関数のキーワード引数
+
+    Returns:
+        関数の戻り値
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_fs_executor, functools.partial(func, *args, **kwargs))
+
+def open_async(path: str, mode: str = "rb", **kwargs):
+    """ファイル操作用のスレッドプールで読み書きする aiofiles のファイルを開く"""
+    return aiofiles.open(path, mode, executor=_fs_executor, **kwargs)
+
+async def path_exists(path: Optional[str]) -> bool:
+    """パスが存在するか（Noneや空文字の場合はFalse）"""
+    if not path:
+        return False
+    return await run_fs(os.path.exists, path)
+
+async def stat_file(path: Optional[str]) -> Optional[os.stat_result]:
+    """ファイルの情報を返す（存在しない場合はNone）"""
+    if not path:
+        return None
+
+    def _stat():
+        try:
+            return os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    return await run_fs(_stat)
+
+def find_first_existing(paths: Iterable[str]) -> Optional[str]:
+    """候補のうち最初に存在するファイルのパスを返す（run_fs から呼び出す）"""
+    for path in paths:
+        if os.path.isfile(path):
+            return path
+    return None
+
+def remove_if_exists(path: str) -> bool:
+    """ファイルが存在すれば削除し、削除した場合はTrueを返す（run_fs から呼び出す）"""
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def write_file_atomic(path: str, data: bytes) -> None:
+    """ディレクトリを作成し、一時ファイル経由でファイルを書き込む（run_fs から呼び出す）
+
+    書き込み途中のファイルを読み込み側に見せないよう、書き終えてから置き換える。
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{id(data):x}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def shutdown_fs_executor() -> None:
+    """ファイル操作用スレッドプールを停止"""
+    _fs_executor.shutdown(wait=False)
+    logger.info("ファイル操作用スレッドプールを停止しました")
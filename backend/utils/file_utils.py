@@ -3,12 +3,16 @@
 
 import os
 import shutil
+import hashlib
+import struct
 import uuid
 from fastapi import UploadFile
-import aiofiles
 from typing import Optional, List, Tuple
 import logging
 
+from backend.config.settings import settings
+from backend.utils.async_fs import run_fs, open_async
+
 # ディレクトリ設定
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 UPLOAD_DIR = os.path.join(BASE_DIR, "storage", "uploads")
@@ -19,30 +23,82 @@ LOG_DIR = os.path.join(BASE_DIR, "storage", "logs")
 for directory in [UPLOAD_DIR, RESULT_DIR, LOG_DIR]:
     os.makedirs(directory, exist_ok=True)
 
-async def save_upload_file(upload_file: UploadFile, job_id: str) -> str:
-    """アップロードされたファイルを保存する非同期関数
+# アップロードを書き込む単位（バイト）
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+class UploadTooLargeError(ValueError):
+    """アップロードがサイズ上限を超えた場合の例外"""
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"ファイルサイズは{max_bytes / (1024 * 1024):.0f}MB以下にしてください")
+
+def max_upload_bytes() -> int:
+    """設定されたアップロードサイズの上限（バイト）"""
+    return settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+
+def _ensure_dir(target_dir: str) -> bool:
+    """ディレクトリを作成し、新たに作成した場合はTrueを返す"""
+    created = not os.path.isdir(target_dir)
+    os.makedirs(target_dir, exist_ok=True)
+    return created
+
+def _remove_partial_upload(file_path: str, created_dir: Optional[str]) -> None:
+    """書きかけのファイルと、そのために作成した空のディレクトリを削除する"""
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    if created_dir and not os.listdir(created_dir):
+        os.rmdir(created_dir)
+
+async def stream_upload_to_file(upload_file: UploadFile, file_path: str,
+                                max_bytes: Optional[int] = None,
+                                chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[int, str]:
+    """アップロードをチャンク単位でファイルに書き込み、同時にSHA-256を計算する
+    
+    全体をメモリに読み込まず、上限を超えた時点で書き込みを中断して途中のファイルを削除する。
     
     Args:
         upload_file: アップロードされたファイル
-        job_id: ジョブID
+        file_path: 保存先のパス
+        max_bytes: サイズ上限（バイト、Noneの場合は設定値）
+        chunk_size: 1回に読み込むバイト数
         
     Returns:
-        保存されたファイルの絶対パス
+        (書き込んだバイト数, 16進数表記のSHA-256ハッシュ) のタプル
+        
+    Raises:
+        UploadTooLargeError: サイズ上限を超えた場合
     """
-    # ジョブごとのディレクトリを作成
-    job_upload_dir = os.path.join(UPLOAD_DIR, job_id)
-    os.makedirs(job_upload_dir, exist_ok=True)
+    if max_bytes is None:
+        max_bytes = max_upload_bytes()
     
-    # ファイル名から安全なファイル名を作成
-    file_name = os.path.basename(upload_file.filename)
-    file_path = os.path.join(job_upload_dir, file_name)
+    # サイズが分かっている場合は書き込む前に拒否する
+    declared_size = getattr(upload_file, "size", None)
+    if declared_size is not None and declared_size > max_bytes:
+        raise UploadTooLargeError(max_bytes)
     
-    # 非同期でファイルを保存
-    async with aiofiles.open(file_path, 'wb') as out_file:
-        content = await upload_file.read()
-        await out_file.write(content)
+    target_dir = os.path.dirname(file_path)
+    created_dir = await run_fs(_ensure_dir, target_dir)
+    digest = hashlib.sha256()
+    size = 0
     
-    return file_path
+    try:
+        async with open_async(file_path, 'wb') as out_file:
+            while True:
+                chunk = await upload_file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                digest.update(chunk)
+                await out_file.write(chunk)
+    except BaseException:
+        # 上限超過・切断時は書きかけのファイルを残さない
+        await run_fs(_remove_partial_upload, file_path, target_dir if created_dir else None)
+        raise
+    
+    return size, digest.hexdigest()
 
 def save_result_file(content: bytes, job_id: str, file_name: str) -> str:
     """生成結果ファイルを保存する関数
@@ -117,4 +173,28 @@ def delete_job_files(job_id: str) -> bool:
         return True
     except Exception as e:
         logging.error(f"ファイル削除エラー: {e}")
-        return False 
\ No newline at end of file
+        return False
+
+def read_png_size(source) -> Optional[Tuple[int, int]]:
+    """PNGのヘッダー（IHDRチャンク）から画像サイズを読み取る関数
+    
+    画像全体をデコードせずに先頭24バイトだけを読む。
+    
+    Args:
+        source: PNGのバイト列、またはファイルパス
+        
+    Returns:
+        (幅, 高さ) のタプル。PNGでない場合はNone
+    """
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            header = bytes(source[:24])
+        else:
+            with open(source, 'rb') as f:
+                header = f.read(24)
+    except OSError:
+        return None
+    
+    if len(header) < 24 or header[:8] != b'\x89PNG\r\n\x1a\n' or header[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', header[16:24])
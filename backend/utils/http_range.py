@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import uuid
+import logging
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, List, Tuple, Dict
+from urllib.parse import quote
+
+from starlette.responses import Response
+from starlette.types import Scope, Receive, Send
+
+from backend.utils.async_fs import run_fs
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# 1つのリクエストで受け付ける範囲の最大数（これを超える Range ヘッダーは無視して全体を返す）
+MAX_RANGES = 16
+
+# ゼロコピー送信が使えない場合に1回で読み込むバイト数
+RANGE_CHUNK_SIZE = 256 * 1024
+
+class RangeNotSatisfiableError(ValueError):
+    """Range ヘッダーの範囲がどれもファイル内にない場合のエラー"""
+
+    def __init__(self, size: int):
+        super().__init__(f"要求された範囲はファイルサイズ（{size}バイト）の外です")
+        self.size = size
+
+def make_etag(content_hash: str) -> str:
+    """成果物のハッシュから強いETagを作成する"""
+    return f'"{content_hash}"'
+
+def http_date(timestamp: float) -> str:
+    """Last-Modified 形式の日時文字列を作成する"""
+    return formatdate(timestamp, usegmt=True)
+
+def _split_etags(header: str) -> List[str]:
+    """カンマ区切りのETagの一覧を分割する"""
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match が現在のETagに一致するか（弱い比較）
+
+    Args:
+        if_none_match: If-None-Match ヘッダーの値
+        etag: 現在のETag
+
+    Returns:
+        一致する場合はTrue（304を返してよい）
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag[2:] if etag.startswith("W/") else etag
+    for tag in _split_etags(if_none_match):
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == current:
+            return True
+    return False
+
+def if_range_matches(if_range: Optional[str], etag: str, mtime: float) -> bool:
+    """If-Range の条件を満たすか（満たさない場合は範囲を無視して全体を返す）
+
+    ETag は強い比較で照合する。日付の場合は Last-Modified と秒単位で一致するときだけ範囲を返す。
+
+    Args:
+        if_range: If-Range ヘッダーの値
+        etag: 現在のETag
+        mtime: ファイルの更新時刻
+
+    Returns:
+        範囲リクエストとして応答してよい場合はTrue
+    """
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith("W/"):
+        return False
+    if if_range.startswith('"'):
+        return if_range == etag
+    try:
+        return int(parsedate_to_datetime(if_range).timestamp()) == int(mtime)
+    except (TypeError, ValueError):
+        return False
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    """Range ヘッダーを解析する
+
+    重なり合う・隣接する範囲は1つにまとめる。解釈できないヘッダーや範囲が多すぎるヘッダーは
+    RFC 9110 に従って無視する（全体を返す）。
+
+    Args:
+        header: Range ヘッダーの値
+        size: ファイルサイズ
+
+    Returns:
+        (開始, 終了) のリスト（終了は含まない）。全体を返すべき場合はNone
+
+    Raises:
+        RangeNotSatisfiableError: どの範囲もファイル内にない場合
+    """
+    if not header or "=" not in header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+
+    parts = [part.strip() for part in spec.split(",") if part.strip()]
+    if not parts or len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+        first, last = first.strip(), last.strip()
+        try:
+            if first:
+                start = int(first)
+                end = int(last) + 1 if last else size
+                if start < 0 or (last and end <= start):
+                    return None
+            else:
+                # bytes=-N は末尾Nバイト
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start, end = max(size - suffix, 0), size
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size)))
+
+    if not ranges:
+        raise RangeNotSatisfiableError(size)
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+class FileRangeResponse(Response):
+    """範囲リクエストに対応したファイルレスポンス
+
+    単一範囲は 206 と Content-Range、複数範囲は multipart/byteranges で返す。
+    サーバーが ASGI の http.response.zerocopysend 拡張に対応していれば sendfile で送信し、
+    全体を返す場合は http.response.pathsend 拡張も利用する。どちらもない場合はスレッドで読み込んで送る。
+    """
+
+    def __init__(self, path: str, size: int, mtime: float, etag: str,
+                 ranges: Optional[List[Tuple[int, int]]] = None,
+                 media_type: str = "application/octet-stream",
+                 filename: Optional[str] = None,
+                 headers: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.size = size
+        self.ranges = ranges or None
+        self.media_type = media_type
+        self.part_type = media_type  # multipart の各パートの Content-Type
+        self.background = None
+        self.boundary = uuid.uuid4().hex if self.ranges and len(self.ranges) > 1 else None
+        self.status_code = 206 if self.ranges else 200
+
+        response_headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": http_date(mtime)
+        }
+        if filename:
+            quoted = quote(filename)
+            if quoted != filename:
+                response_headers["content-disposition"] = f"attachment; filename*=utf-8''{quoted}"
+            else:
+                response_headers["content-disposition"] = f'attachment; filename="{filename}"'
+        response_headers.update(headers or {})
+
+        if self.boundary:
+            self.media_type = f"multipart/byteranges; boundary={self.boundary}"
+            response_headers["content-length"] = str(
+                sum(len(self._part_header(start, end)) + (end - start) + 2 for start, end in self.ranges)
+                + len(self._closing())
+            )
+        elif self.ranges:
+            start, end = self.ranges[0]
+            response_headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+            response_headers["content-length"] = str(end - start)
+        else:
+            response_headers["content-length"] = str(size)
+        self.init_headers(response_headers)
+
+    def _part_header(self, start: int, end: int) -> bytes:
+        return (
+            f"--{self.boundary}\r\n"
+            f"Content-Type: {self.part_type}\r\n"
+            f"Content-Range: bytes {start}-{end - 1}/{self.size}\r\n\r\n"
+        ).encode("latin-1")
+
+    def _closing(self) -> bytes:
+        return f"--{self.boundary}--\r\n".encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method", "GET").upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if not self.ranges and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+            return
+
+        spans = self.ranges or [(0, self.size)]
+        zerocopy = "http.response.zerocopysend" in extensions
+        with await run_fs(open, self.path, "rb") as f:
+            for start, end in spans:
+                if self.boundary:
+                    await send({"type": "http.response.body", "body": self._part_header(start, end), "more_body": True})
+                if zerocopy:
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": f,
+                        "offset": start,
+                        "count": end - start,
+                        "more_body": True
+                    })
+                else:
+                    position = start
+                    while position < end:
+                        length = min(RANGE_CHUNK_SIZE, end - position)
+                        chunk = await run_fs(os.pread, f.fileno(), length, position)
+                        if not chunk:
+                            raise RuntimeError(f"ファイルが想定より短くなっています: {self.path}")
+                        position += len(chunk)
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                if self.boundary:
+                    await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+
+        closing = self._closing() if self.boundary else b""
+        await send({"type": "http.response.body", "body": closing, "more_body": False})
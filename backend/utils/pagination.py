@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+# 1ページあたりの取得件数の上限
+MAX_PAGE_SIZE = 500
+
+class InvalidCursorError(ValueError):
+    """カーソルの形式が不正な場合の例外"""
+    pass
+
+def encode_cursor(submission_time: datetime, job_id: str) -> str:
+    """(submission_time, job_id) から不透明なカーソル文字列を生成する
+
+    Args:
+        submission_time: 最後に返したジョブの投入日時
+        job_id: 最後に返したジョブのID
+
+    Returns:
+        URLセーフなカーソル文字列
+    """
+    payload = json.dumps([submission_time.isoformat(), job_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """カーソル文字列を (submission_time, job_id) に復元する
+
+    Args:
+        cursor: encode_cursor で生成したカーソル文字列
+
+    Returns:
+        (submission_time, job_id) のタプル
+
+    Raises:
+        InvalidCursorError: カーソルの形式が不正な場合
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        submission_time, job_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(submission_time), str(job_id)
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise InvalidCursorError(f"カーソルの形式が不正です: {cursor}") from e
+
+def clamp_page_size(limit: int) -> int:
+    """取得件数を 1〜MAX_PAGE_SIZE の範囲に収める"""
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def paginate_keyset(query: Query, time_column: Any, id_column: Any,
+                    cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[Any], Optional[str]]:
+    """(time_column, id_column) の降順でキーセットページネーションを行う
+
+    OFFSET を使わず、前ページの最後の行より後ろの行だけを取得するため、
+    ページの深さに関わらずインデックスの範囲走査で済む。
+
+    Args:
+        query: フィルタ済みのクエリ（並び順は指定しないこと）
+        time_column: 並び順の第1キー（投入日時）
+        id_column: 同時刻の行を区別する第2キー（ジョブID）
+        cursor: 前ページの next_cursor（先頭ページはNone）
+        limit: 取得件数
+
+    Returns:
+        (行のリスト, 次ページのカーソル) のタプル。最終ページのカーソルはNone
+
+    Raises:
+        InvalidCursorError: カーソルの形式が不正な場合
+    """
+    limit = clamp_page_size(limit)
+
+    if cursor:
+        last_time, last_id = decode_cursor(cursor)
+        # 先頭の条件は OR をインデックスの範囲検索で解決させるためのもの
+        query = query.filter(
+            time_column <= last_time,
+            or_(
+                time_column < last_time,
+                and_(time_column == last_time, id_column < last_id)
+            )
+        )
+
+    # 1件多く取得して次ページの有無を判定
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            getattr(last, time_column.key),
+            getattr(last, id_column.key)
+        )
+
+    return rows, next_cursor
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import yaml
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+class CachedYamlFile:
+    """更新されたときだけ読み直すYAMLファイル（プロセス内で共有する）
+
+    ファイルの更新時刻とサイズを check_interval 秒に1回だけ確認し、変わっていれば読み直す。
+    返す辞書は共有されるため、呼び出し元で変更しないこと。
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._data: Dict[str, Any] = {}
+        self._signature: Optional[Tuple[int, int]] = None  # (更新時刻ns, サイズ)
+        self._checked_at: Optional[float] = None
+        self.loads = 0
+
+    def _stat_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat_result = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat_result.st_mtime_ns, stat_result.st_size
+
+    def load(self) -> Tuple[Dict[str, Any], Optional[Tuple[int, int]]]:
+        """ファイルの内容を返す
+
+        Returns:
+            (内容の辞書, 版) のタプル。版はファイルが更新されると変わる（ファイルがない場合はNone）
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return self._data, self._signature
+            self._checked_at = now
+
+            signature = self._stat_signature()
+            if signature == self._signature and self.loads:
+                return self._data, self._signature
+
+            if signature is None:
+                logger.warning(f"設定ファイルが見つかりません: {self.path}")
+                data = {}
+            else:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        data = yaml.safe_load(f) or {}
+                except (OSError, yaml.YAMLError) as e:
+                    # 読み込めない場合は前回の内容を使い続け、次回の確認で読み直す
+                    logger.error(f"設定ファイルの読み込みエラー ({self.path}): {str(e)}")
+                    return self._data, self._signature
+
+            self._data = data
+            self._signature = signature
+            self.loads += 1
+            logger.info(f"設定ファイルを読み込みました: {self.path}")
+            return self._data, self._signature
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import datetime
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from backend.models.database import SessionLocal
+
+try:
+    import orjson
+except ImportError:  # orjson がない環境では標準の json を使う
+    orjson = None
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# NDJSON のメディアタイプ
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Server-Sent Events のメディアタイプ
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# ストリーミング時に1回のクエリで取得する行数
+STREAM_PAGE_SIZE = 500
+
+def _json_default(value: Any) -> Any:
+    """標準の json でシリアライズできない値の変換（orjson がない場合）"""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+def dumps_line(item: Any) -> bytes:
+    """1件分のデータを改行付きのJSONバイト列に変換する
+
+    Args:
+        item: シリアライズするデータ（datetime はそのまま渡してよい）
+
+    Returns:
+        末尾に改行を含むJSONバイト列
+    """
+    if orjson is not None:
+        return orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+    return (json.dumps(item, ensure_ascii=False, default=_json_default) + "\n").encode("utf-8")
+
+def iter_keyset_rows(
+    fetch_page: Callable[[Session, Optional[str]], Tuple[List[Any], Optional[str]]],
+    to_item: Callable[[Any], Dict[str, Any]],
+    cursor: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """キーセットページネーションで全件を少しずつ取得するジェネレータ
+
+    ページごとにセッションを開閉するため、ストリーミング中に接続を占有しない。
+
+    Args:
+        fetch_page: (セッション, カーソル) を受け取り (行のリスト, 次のカーソル) を返す関数
+        to_item: 行をレスポンス用の辞書に変換する関数
+        cursor: 開始位置のカーソル（先頭からの場合はNone）
+
+    Yields:
+        レスポンス用の辞書
+    """
+    while True:
+        db = SessionLocal()
+        try:
+            rows, cursor = fetch_page(db, cursor)
+            items = [to_item(row) for row in rows]
+        finally:
+            db.close()
+
+        yield from items
+        if not cursor:
+            break
+
+def ndjson_response(items: Iterable[Any], headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """データを1行1件のNDJSONとしてストリーミングするレスポンスを作成する
+
+    同期イテレータはスレッドプール上で消費されるため、
+    データベースを読みながら返してもイベントループをブロックしない。
+
+    Args:
+        items: 出力するデータのイテレータ
+        headers: 追加のレスポンスヘッダー
+
+    Returns:
+        ストリーミングレスポンス
+    """
+    def _generate() -> Iterator[bytes]:
+        count = 0
+        try:
+            for item in items:
+                count += 1
+                yield dumps_line(item)
+        except Exception as e:
+            # ヘッダー送信後のためステータスコードは変えられない。ログに残して打ち切る
+            logger.error(f"NDJSONのストリーミング中にエラーが発生しました（{count}件出力済み）: {str(e)}")
+            raise
+
+    return StreamingResponse(_generate(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+def format_sse(data: Any, event_id: Optional[int] = None) -> bytes:
+    """1件分のデータを Server-Sent Events の形式に変換する
+
+    Args:
+        data: 送信するデータ（1行のJSONとして送る）
+        event_id: イベントID（Last-Event-ID による再開に使われる）
+
+    Returns:
+        空行で終わるイベントのバイト列
+    """
+    prefix = f"id: {event_id}\n".encode("ascii") if event_id is not None else b""
+    return prefix + b"data: " + dumps_line(data) + b"\n"
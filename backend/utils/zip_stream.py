@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import zipfile
+import logging
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# 元ファイルから1回に読み込むバイト数
+ZIP_STREAM_CHUNK_SIZE = 64 * 1024
+
+class _ChunkSink:
+    """ZipFile の書き込み先（書き込まれたバイト列を取り出されるまで保持する）
+
+    seek/tell を持たないため、ZipFile はデータディスクリプタ付きのストリーミング形式で書き込む。
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        """保持しているバイト列を取り出す"""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+class ZipStreamWriter:
+    """ZIPファイルをメモリに溜めずに少しずつ出力するライター
+
+    各メソッドは出力すべきバイト列を返す（またはyieldする）ため、呼び出し元のジェネレータから
+    そのままレスポンスとして送信できる。保持するのは書き込み中のチャンクと中央ディレクトリ用の
+    エントリ情報だけで、ファイル本体の大きさにはよらない。
+
+    Example:
+        writer = ZipStreamWriter()
+        with open(path, "rb") as f:
+            yield from writer.write_stream("dataset/a.png", f)
+        yield writer.close()
+    """
+
+    def __init__(self, compression: int = zipfile.ZIP_STORED):
+        self.compression = compression
+        self._sink = _ChunkSink()
+        self._zip = zipfile.ZipFile(self._sink, "w", compression=compression, allowZip64=True)
+
+    def _zip_info(self, arcname: str, size: Optional[int] = None) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(arcname, date_time=time.localtime(time.time())[:6])
+        info.compress_type = self.compression
+        info.external_attr = 0o644 << 16
+        if size is not None:
+            # サイズが分かっていれば ZIP64 が必要かどうかを ZipFile が判断できる
+            info.file_size = size
+        return info
+
+    @contextmanager
+    def open(self, arcname: str, size: Optional[int] = None):
+        """エントリを書き込み用に開く（書き込みの合間に drain() で出力を取り出す）"""
+        with self._zip.open(self._zip_info(arcname, size), "w", force_zip64=size is None) as entry:
+            yield entry
+
+    def drain(self) -> bytes:
+        """書き込み済みで未出力のバイト列を取り出す"""
+        return self._sink.drain()
+
+    def write_stream(self, arcname: str, source: IO[bytes], size: Optional[int] = None,
+                     chunk_size: int = ZIP_STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """ファイルオブジェクトの内容をエントリとして書き込む
+
+        Args:
+            arcname: ZIP内のパス
+            source: 読み込み元のバイナリファイルオブジェクト
+            size: 内容のサイズ（分かっている場合）
+            chunk_size: 1回に読み込むバイト数
+
+        Yields:
+            出力するバイト列
+        """
+        with self.open(arcname, size) as entry:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                entry.write(chunk)
+                data = self.drain()
+                if data:
+                    yield data
+        data = self.drain()
+        if data:
+            yield data
+
+    def write_bytes(self, arcname: str, data: bytes) -> bytes:
+        """小さなデータをエントリとして書き込み、出力するバイト列を返す"""
+        with self.open(arcname, len(data)) as entry:
+            entry.write(data)
+        return self.drain()
+
+    def close(self) -> bytes:
+        """中央ディレクトリを書き込んでZIPを閉じ、最後に出力するバイト列を返す"""
+        self._zip.close()
+        return self.drain()
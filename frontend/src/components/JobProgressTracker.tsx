@@ -2,7 +2,13 @@ import React, { useState, useEffect } from 'react';
 import { Progress, Card, Text, Badge, Box, Flex, Heading, VStack, HStack, Spinner } from '@chakra-ui/react';
 
 // ジョブステータスの型定義
-type JobStatus = 'queued' | 'processing' | 'completed' | 'error' | 'not_found';
+type JobStatus = 'queued' | 'processing' | 'completed' | 'error' | 'cancelled' | 'not_found';
+
+// 終了済みのステータス
+const TERMINAL_STATUSES: JobStatus[] = ['completed', 'error', 'cancelled'];
+
+// Server-Sent Events の接続エラーが続いた場合にポーリングへ切り替えるまでの回数
+const MAX_EVENT_SOURCE_ERRORS = 3;
 
 // ジョブ進捗情報の型定義
 interface JobProgress {
@@ -31,6 +37,8 @@ const getStatusColor = (status: JobStatus): string => {
       return 'green';
     case 'error':
       return 'red';
+    case 'cancelled':
+      return 'gray';
     case 'not_found':
     default:
       return 'gray';
@@ -48,6 +56,8 @@ const getStatusLabel = (status: JobStatus): string => {
       return '完了';
     case 'error':
       return 'エラー';
+    case 'cancelled':
+      return 'キャンセル';
     case 'not_found':
     default:
       return '不明';
@@ -69,6 +79,10 @@ const JobProgressTracker: React.FC<JobProgressTrackerProps> = ({
   const [loading, setLoading] = useState<boolean>(true);
   // エラー状態
   const [error, setError] = useState<string | null>(null);
+  // Server-Sent Events が使えない、または接続できない場合はポーリングで取得する
+  const [usePolling, setUsePolling] = useState<boolean>(
+    typeof window === 'undefined' || !('EventSource' in window)
+  );
 
   // ジョブ進捗の取得
   const fetchJobProgress = async () => {
@@ -93,14 +107,57 @@ const JobProgressTracker: React.FC<JobProgressTrackerProps> = ({
     }
   };
 
-  // 初期ロードとインターバル設定
+  // Server-Sent Events による進捗の受信（サーバーからの通知を受け取るためポーリング不要）
+  useEffect(() => {
+    if (usePolling) {
+      return;
+    }
+
+    // 再接続時はブラウザが Last-Event-ID を送り、取りこぼしたイベントから再開される
+    const eventSource = new EventSource(`/api/jobs/${jobId}/events`);
+    let errorCount = 0;
+    eventSource.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      errorCount = 0;
+      setJobProgress((previous) => ({ ...previous, ...data }));
+      setLoading(false);
+      setError(null);
+
+      // 終了したジョブはサーバーがストリームを閉じるため、再接続させない
+      if (TERMINAL_STATUSES.includes(data.status)) {
+        eventSource.close();
+        if (data.status !== 'cancelled' && onComplete) {
+          onComplete(jobId);
+        }
+      }
+    };
+
+    // ブラウザが再接続を諦めた場合（404 など）や接続エラーが続く場合はポーリングに切り替える
+    eventSource.onerror = () => {
+      errorCount += 1;
+      if (eventSource.readyState === EventSource.CLOSED || errorCount >= MAX_EVENT_SOURCE_ERRORS) {
+        eventSource.close();
+        setUsePolling(true);
+      }
+    };
+
+    return () => {
+      eventSource.close();
+    };
+  }, [jobId, usePolling]);
+
+  // EventSource が使えない、または接続できない場合はインターバルで取得
   useEffect(() => {
+    if (!usePolling) {
+      return;
+    }
+
     // 初回ロード
     fetchJobProgress();
 
-    // インターバルの設定（ジョブが完了またはエラーでない場合）
+    // インターバルの設定（ジョブが終了していない場合）
     const intervalId = setInterval(() => {
-      if (!jobProgress || (jobProgress.status !== 'completed' && jobProgress.status !== 'error')) {
+      if (!jobProgress || !TERMINAL_STATUSES.includes(jobProgress.status)) {
         fetchJobProgress();
       }
     }, refreshInterval);
@@ -109,7 +166,7 @@ const JobProgressTracker: React.FC<JobProgressTrackerProps> = ({
     return () => {
       clearInterval(intervalId);
     };
-  }, [jobId, refreshInterval, jobProgress?.status]);
+  }, [jobId, refreshInterval, usePolling, jobProgress?.status]);
 
   // ローディング中の表示
   if (loading && !jobProgress) {
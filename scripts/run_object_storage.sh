@@ -0,0 +1,81 @@
+#!/bin/bash
+# LoRA作成クラウドサービス ローカル用S3互換ストレージ（MinIO）起動スクリプト
+
+# 色付きの出力用関数
+print_green() {
+    echo -e "\033[0;32m$1\033[0m"
+}
+
+print_blue() {
+    echo -e "\033[0;34m$1\033[0m"
+}
+
+print_red() {
+    echo -e "\033[0;31m$1\033[0m"
+}
+
+# 現在のディレクトリを取得
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+PROJECT_ROOT="$( dirname "$SCRIPT_DIR" )"
+
+# 起動オプション
+CONTAINER_NAME=${CONTAINER_NAME:-"lora-minio"}
+PORT=${PORT:-"9000"}
+CONSOLE_PORT=${CONSOLE_PORT:-"9001"}
+BUCKET=${BUCKET:-"lora-platform"}
+ACCESS_KEY=${ACCESS_KEY:-"minioadmin"}
+SECRET_KEY=${SECRET_KEY:-"minioadmin"}
+DATA_DIR="$PROJECT_ROOT/storage/minio"
+
+if ! command -v docker &> /dev/null; then
+    print_red "docker が見つかりません。docker をインストールしてください。"
+    exit 1
+fi
+
+mkdir -p "$DATA_DIR"
+
+# 既存のコンテナがあれば再利用する
+if [ -n "$(docker ps -aq -f name=^/${CONTAINER_NAME}$)" ]; then
+    print_blue "既存のコンテナを起動しています: $CONTAINER_NAME"
+    docker start "$CONTAINER_NAME" > /dev/null
+else
+    print_blue "MinIO を起動しています: $CONTAINER_NAME"
+    docker run -d --name "$CONTAINER_NAME" \
+        -p "$PORT:9000" -p "$CONSOLE_PORT:9001" \
+        -e "MINIO_ROOT_USER=$ACCESS_KEY" \
+        -e "MINIO_ROOT_PASSWORD=$SECRET_KEY" \
+        -v "$DATA_DIR:/data" \
+        minio/minio server /data --console-address ":9001" > /dev/null
+fi
+
+if [ $? -ne 0 ]; then
+    print_red "MinIO の起動に失敗しました"
+    exit 1
+fi
+
+# MinIO の起動を待ってからバケットを作成する（既に存在する場合はそのまま使う）
+print_blue "バケットを作成しています: $BUCKET"
+BUCKET_CREATED=false
+for i in $(seq 1 30); do
+    if docker run --rm --network host --entrypoint sh minio/mc -c \
+        "mc alias set local http://localhost:$PORT '$ACCESS_KEY' '$SECRET_KEY' > /dev/null && mc mb --ignore-existing 'local/$BUCKET'" > /dev/null 2>&1; then
+        BUCKET_CREATED=true
+        break
+    fi
+    sleep 1
+done
+
+if [ "$BUCKET_CREATED" != "true" ]; then
+    print_red "バケットの作成に失敗しました: $BUCKET"
+    exit 1
+fi
+
+print_green "MinIO を起動しました (バケット: $BUCKET)"
+print_blue "コンソール: http://localhost:$CONSOLE_PORT"
+print_blue "バックエンドを起動する前に次の環境変数を設定してください:"
+echo "export STORAGE_BACKEND=s3"
+echo "export S3_ENDPOINT_URL=http://localhost:$PORT"
+echo "export S3_FORCE_PATH_STYLE=true"
+echo "export S3_BUCKET=$BUCKET"
+echo "export S3_ACCESS_KEY_ID=$ACCESS_KEY"
+echo "export S3_SECRET_ACCESS_KEY=$SECRET_KEY"